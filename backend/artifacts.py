@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from metrics import artifact_render_seconds, artifact_renders
+from render import MEDIA_TYPES as DOCUMENT_MEDIA_TYPES, RENDER_VERSION, RENDERERS, render_to_file
+
+logger = logging.getLogger(__name__)
+
+# Every format a stored artifact may be served as
+MEDIA_TYPES = {
+    **DOCUMENT_MEDIA_TYPES,
+    "svg": "image/svg+xml",
+    "png": "image/png",
+}
+
+
+class ArtifactStore:
+    """Rendered files on local disk, named by the hash of what they were rendered from.
+
+    A file is never changed once written, so identical content (e.g. an order
+    served from the generation cache) shares one file, and anything serving
+    these files can cache them forever.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    @staticmethod
+    def digest(*parts: str) -> str:
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def key(cls, fmt: str, title: str, text: str) -> str:
+        return cls.digest(RENDER_VERSION, fmt, title, text)
+
+    def relative_path(self, key: str, fmt: str) -> str:
+        return f"{key[:2]}/{key}.{fmt}"
+
+    def path(self, key: str, fmt: str) -> Path:
+        return self.directory / self.relative_path(key, fmt)
+
+
+class ArtifactRenderer:
+    """Renders documents and logo packages into an ``ArtifactStore`` on a pool of worker processes.
+
+    Rendering is CPU-bound, so it runs outside the event loop (and the GIL).
+    Each unique document or logo is rendered once: files already on disk are
+    reused, and concurrent requests for the same one wait on a single render.
+    """
+
+    def __init__(self, store: ArtifactStore, *, formats: Iterable[str], max_workers: int = 2):
+        unknown = set(formats) - set(RENDERERS)
+        if unknown:
+            raise ValueError(f"Unknown render formats: {', '.join(sorted(unknown))}")
+        self.store = store
+        self.formats = tuple(formats)
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._rendering: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned, not forked: the parent has event loop and driver threads
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def render(self, documents: Dict[str, Tuple[str, str]]) -> Dict[str, Dict[str, str]]:
+        """Render each document (name -> (title, markdown)) in every format; returns name -> {format: key}"""
+        jobs = [(name, fmt, title, text) for name, (title, text) in documents.items() for fmt in self.formats]
+        keys = await asyncio.gather(*(self.ensure(fmt, title, text) for _, fmt, title, text in jobs))
+        artifacts: Dict[str, Dict[str, str]] = {}
+        for (name, fmt, _, _), key in zip(jobs, keys):
+            artifacts.setdefault(name, {})[fmt] = key
+        return artifacts
+
+    async def ensure(self, fmt: str, title: str, text: str) -> str:
+        """The key of the document's artifact, rendering it unless it already exists"""
+        key = self.store.key(fmt, title, text)
+        path = self.store.path(key, fmt)
+        if path.exists():
+            artifact_renders.inc(1.0, fmt, "reused")
+            return key
+
+        size = await self._render_once((key, fmt), fmt, render_to_file, fmt, title, text, str(path))
+        logger.info(f"Rendered {path.name} ({size} bytes)")
+        return key
+
+    async def render_logo(self, svg: str) -> Dict[str, Any]:
+        """Build a sanitized SVG logo's package (master and PNG sizes) unless it exists; returns its manifest.
+
+        The manifest holds the artifact keys of the SVG (``svg``) and of each
+        PNG by size name (``png``), and the palette measured from the raster.
+        """
+        # Imported here so processes that never build logos do not load NumPy
+        from logo_assets import LOGO_VERSION, build_logo_package
+
+        key = self.store.digest(LOGO_VERSION, "logo", svg)
+        manifest = self.store.path(key, "json")
+        if manifest.exists():
+            artifact_renders.inc(1.0, "logo", "reused")
+            return json.loads(manifest.read_bytes())
+        return await self._render_once(
+            (key, "logo"), "logo", build_logo_package, svg, str(self.store.directory), key
+        )
+
+    async def _render_once(self, job: Tuple[str, str], label: str, function: Callable[..., Any], *args: Any) -> Any:
+        """``function(*args)`` in the pool, one run shared by concurrent callers for the same job"""
+        rendering = self._rendering.get(job)
+        if rendering is None:
+            rendering = asyncio.ensure_future(self._render(label, function, *args))
+            self._rendering[job] = rendering
+            rendering.add_done_callback(lambda _: self._rendering.pop(job, None))
+        else:
+            artifact_renders.inc(1.0, label, "joined")
+        # Shielded so one cancelled caller does not cancel the render for the others
+        return await asyncio.shield(rendering)
+
+    async def _render(self, label: str, function: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+        artifact_render_seconds.observe(time.perf_counter() - started, label)
+        artifact_renders.inc(1.0, label, "rendered")
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
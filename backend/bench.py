@@ -0,0 +1,314 @@
+"""Offline load test for the order API and generation pipeline.
+
+Starts the OpenAI and Stripe stand-ins (``llm_stub.py``, ``stripe_stub.py``)
+on local ports, points the backend at them, and drives the API in-process at
+each concurrency level:
+
+    python -m backend.bench --concurrency 1,8,32 --requests 200 --output bench.json
+
+Scenarios:
+
+* ``create``   – ``POST /api/orders``
+* ``get``      – ``GET /api/orders/{id}`` for orders created beforehand
+* ``list``     – ``GET /api/orders`` pages of one customer's orders
+* ``catalog``  – ``GET /api/services``
+* ``checkout`` – ``POST /api/create-payment-intent`` then ``POST /api/confirm-payment``
+* ``process``  – ``process_order`` end to end (LLM steps, storage, status updates)
+
+Mongo is an in-memory mock by default (``--mongo memory``, needs
+``mongomock-motor``); pass a URL to use a real instance, where a throwaway
+database is created and dropped. Results are JSON with p50/p95/p99 latencies
+and throughput per scenario and concurrency, plus the commit and settings, so
+runs can be compared across commits.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+SCENARIOS = ("create", "get", "list", "catalog", "checkout", "process")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(scenario: str, concurrency: int, latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    completed = len(ordered)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": completed + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_per_second": round(completed / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 2),
+            "p95": round(percentile(ordered, 95) * 1000, 2),
+            "p99": round(percentile(ordered, 99) * 1000, 2),
+            "mean": round(sum(ordered) / completed * 1000, 2) if completed else 0.0,
+            "max": round(ordered[-1] * 1000, 2) if completed else 0.0,
+        },
+    }
+
+
+async def run_load(call: Callable[[int], Awaitable[Any]], total: int, concurrency: int):
+    """Run ``call(i)`` for i in range(total) with ``concurrency`` callers; returns (latencies, errors, elapsed)"""
+    latencies: List[float] = []
+    errors: List[str] = []
+    next_index = iter(range(total))
+
+    async def caller():
+        for index in next_index:
+            started = time.perf_counter()
+            try:
+                await call(index)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def start_stub(app, port: int):
+    import uvicorn
+
+    stub = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(stub.serve())
+    while not stub.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return stub, task
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(args) -> Dict[str, int]:
+    """Point the backend and the stand-ins at each other; must run before they are imported"""
+    ports = {"llm": free_port(), "stripe": free_port()}
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['llm']}/v1",
+        "STRIPE_SECRET_KEY": "sk_test_bench",
+        "STRIPE_API_BASE": f"http://127.0.0.1:{ports['stripe']}",
+        "LLM_STUB_LATENCY_SECONDS": str(args.llm_latency),
+        "LLM_STUB_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "LLM_STUB_COMPLETION_TOKENS": str(args.llm_completion_tokens),
+        "STRIPE_STUB_LATENCY_SECONDS": str(args.stripe_latency),
+        "EMBEDDED_WORKER_CONCURRENCY": "0",
+        "DB_NAME": f"bench_{uuid.uuid4().hex[:8]}",
+    })
+    os.environ.pop("STRIPE_WEBHOOK_SECRET", None)
+    os.environ.pop("STRIPE_STUB_WEBHOOK_URL", None)
+    if args.mongo != "memory":
+        os.environ["MONGO_URL"] = args.mongo
+    return ports
+
+
+def measure_imports(runs: int) -> Dict[str, float]:
+    """Median seconds to import each entry point in a fresh interpreter"""
+    timings: Dict[str, float] = {}
+    for module in ("server", "worker"):
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c",
+                 f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"],
+                cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            samples.append(float(output.strip().splitlines()[-1]))
+        timings[module] = round(sorted(samples)[len(samples) // 2], 4)
+    return timings
+
+
+async def main(args) -> Dict[str, Any]:
+    ports = configure_environment(args)
+
+    import httpx
+    import llm_stub
+    import stripe_stub
+    import server
+
+    if args.mongo == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--mongo memory needs mongomock-motor; install it or pass a MongoDB URL")
+        server.services.client = AsyncMongoMockClient()
+
+    # Per-order INFO logs would dominate the run
+    logging.basicConfig(level=logging.WARNING)
+
+    stubs = [await start_stub(llm_stub.app, ports["llm"]), await start_stub(stripe_stub.app, ports["stripe"])]
+    await server.services.index_manager.ensure()
+    service_type = server.ServiceType(args.service)
+    run_id = uuid.uuid4().hex[:8]
+    order_numbers = itertools.count()
+
+    def order_body(index: int) -> Dict[str, Any]:
+        # Unique requirements so no order is served from the generation cache
+        return {
+            "service_type": service_type.value,
+            "customer_email": f"bench{index % 50}@example.com",
+            "customer_name": "Bench Customer",
+            "requirements": {"target_role": "Engineer", "bench_run": run_id, "bench_order": next(order_numbers)},
+        }
+
+    results = []
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as api:
+            async def create(index: int):
+                response = await api.post("/api/orders", json=order_body(index))
+                response.raise_for_status()
+                return response.json()["id"]
+
+            async def list_orders(index: int):
+                response = await api.get("/api/orders", params={"customer_email": "bench0@example.com"})
+                response.raise_for_status()
+
+            async def catalog(index: int):
+                response = await api.get("/api/services")
+                response.raise_for_status()
+
+            async def checkout(index: int):
+                response = await api.post("/api/create-payment-intent", json=order_body(index))
+                response.raise_for_status()
+                intent_id = response.json()["payment_intent_id"]
+                response = await api.post("/api/confirm-payment", json={"payment_intent_id": intent_id})
+                response.raise_for_status()
+
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    total = args.process_requests if scenario == "process" else args.requests
+                    if scenario == "create":
+                        call = create
+                    elif scenario == "list":
+                        call = list_orders
+                    elif scenario == "catalog":
+                        call = catalog
+                    elif scenario == "checkout":
+                        call = checkout
+                    else:
+                        # Orders to read or generate are created up front, outside the timing
+                        order_ids = [await create(index) for index in range(total + args.warmup)]
+                        if scenario == "get":
+                            async def call(index: int, order_ids=order_ids):
+                                response = await api.get(f"/api/orders/{order_ids[index]}")
+                                response.raise_for_status()
+                        else:
+                            async def call(index: int, order_ids=order_ids):
+                                await server.process_order(order_ids[index])
+
+                    if args.warmup:
+                        await run_load(call, args.warmup, min(concurrency, args.warmup))
+                        if scenario in ("get", "process"):
+                            order_ids[:] = order_ids[args.warmup:]
+
+                    latencies, errors, elapsed = await run_load(call, total, concurrency)
+                    summary = summarize(scenario, concurrency, latencies, len(errors), elapsed)
+                    if errors:
+                        summary["first_error"] = errors[0]
+                    results.append(summary)
+                    print(
+                        f"{scenario:>8} c={concurrency:<4} p50={summary['latency_ms']['p50']}ms "
+                        f"p99={summary['latency_ms']['p99']}ms {summary['throughput_per_second']}/s "
+                        f"errors={summary['errors']}",
+                        file=sys.stderr,
+                    )
+    finally:
+        if args.mongo != "memory":
+            await server.services.client.drop_database(os.environ["DB_NAME"])
+        await server.services.aclose()
+        for stub, task in stubs:
+            stub.should_exit = True
+            await task
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "service": service_type.value,
+            "mongo": "memory" if args.mongo == "memory" else "server",
+            "requests": args.requests,
+            "process_requests": args.process_requests,
+            "warmup": args.warmup,
+            "llm_latency_seconds": args.llm_latency,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+            "llm_completion_tokens": args.llm_completion_tokens,
+            "stripe_latency_seconds": args.stripe_latency,
+        },
+        "import_seconds": measure_imports(args.import_runs) if args.import_runs else None,
+        "results": results,
+    }
+
+
+def parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the order API and generation against local stand-ins")
+    parser.add_argument("--scenarios", type=parse_list, default=list(SCENARIOS),
+                        help=f"Comma-separated scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", type=lambda value: [int(item) for item in parse_list(value)],
+                        default=[1, 8, 32], help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per API scenario and level")
+    parser.add_argument("--process-requests", type=int, default=50, help="Orders generated per level")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests before each run")
+    parser.add_argument("--service", default="resume")
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URL")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=100)
+    parser.add_argument("--llm-completion-tokens", type=int, default=300)
+    parser.add_argument("--stripe-latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--import-runs", type=int, default=3,
+                        help="Fresh interpreters used to time importing server and worker (0 skips)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(main(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import re
+from typing import Any, Dict, List
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json")
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+# CSV columns holding lists, e.g. "Instagram;TikTok". Commas are left alone
+# since free-text columns use them.
+LIST_COLUMNS = frozenset({"platforms", "skills"})
+LIST_DELIMITER = ";"
+
+
+def requirement_key(column: str) -> str:
+    """Map a CSV header such as 'Target Role' onto a requirements key ('target_role')"""
+    return _NON_WORD.sub("_", column.strip().lower()).strip("_")
+
+
+def csv_value(key: str, value: str) -> Any:
+    if key not in LIST_COLUMNS:
+        return value
+    return [item.strip() for item in value.split(LIST_DELIMITER) if item.strip()]
+
+
+def parse_bulk_rows(body: bytes, content_type: str, max_rows: int) -> List[Dict[str, Any]]:
+    """Parse a CSV or NDJSON upload into one requirements dict per row.
+
+    CSV headers become requirements keys, and ``LIST_COLUMNS`` are split on
+    ``LIST_DELIMITER``; NDJSON lines are used as-is, or their
+    ``requirements`` object when present. Raises ValueError with the
+    offending row number on malformed input, including a line or
+    ``requirements`` that is valid JSON but not an object.
+    """
+    text = body.decode("utf-8-sig")
+    media_type = content_type.split(";")[0].strip().lower()
+
+    rows: List[Dict[str, Any]] = []
+    if media_type in NDJSON_TYPES:
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {line_number}: invalid JSON ({str(e)})")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {line_number}: expected a JSON object")
+            requirements = row.get("requirements", row)
+            if not isinstance(requirements, dict):
+                raise ValueError(f"Line {line_number}: requirements must be a JSON object")
+            rows.append(requirements)
+            if len(rows) > max_rows:
+                break
+    elif media_type in ("text/csv", "application/csv"):
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames:
+            raise ValueError("CSV upload has no header row")
+        keys = {column: requirement_key(column) for column in reader.fieldnames if column}
+        for row in reader:
+            rows.append({
+                keys[column]: csv_value(keys[column], value.strip())
+                for column, value in row.items()
+                if column in keys and value is not None and value.strip()
+            })
+            if len(rows) > max_rows:
+                break
+    else:
+        raise ValueError(f"Unsupported content type {media_type!r}; send text/csv or application/x-ndjson")
+
+    if not rows:
+        raise ValueError("Upload contains no rows")
+    if len(rows) > max_rows:
+        raise ValueError(f"Upload exceeds the limit of {max_rows} rows")
+    return rows
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from indexes import IndexSpec
+
+logger = logging.getLogger(__name__)
+
+
+class ContentStore:
+    """Content-addressed storage for generated order content.
+
+    Content is stored once per SHA-256 of its canonical JSON. Small payloads
+    live as documents in ``collection``; anything above ``gridfs_threshold``
+    bytes goes to a GridFS bucket. Orders keep only the returned reference.
+    """
+
+    DOCUMENT = "document"
+    GRIDFS = "gridfs"
+
+    def __init__(self, db, *, collection: str = "order_contents", bucket: str = "order_contents_fs",
+                 gridfs_threshold: int = 256 * 1024):
+        self.db = db
+        self.collection = db[collection]
+        self.bucket_name = bucket
+        self.files = db[f"{bucket}.files"]
+        self.gridfs_threshold = gridfs_threshold
+        self._bucket = None
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=self.bucket_name)
+        return self._bucket
+
+    def index_specs(self) -> List[IndexSpec]:
+        # Same index GridFS creates on first upload, declared so it is reported
+        return [IndexSpec(self.files.name, (("filename", 1), ("uploadDate", 1)))]
+
+    @staticmethod
+    def encode(content: Dict[str, Any]) -> bytes:
+        return json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+    async def save(self, content: Dict[str, Any]) -> Dict[str, Any]:
+        """Store content (if not already present) and return its reference"""
+        data = self.encode(content)
+        sha256 = hashlib.sha256(data).hexdigest()
+        storage = self.GRIDFS if len(data) > self.gridfs_threshold else self.DOCUMENT
+
+        if storage == self.DOCUMENT:
+            await self.collection.update_one(
+                {"_id": sha256},
+                {"$setOnInsert": {"content": content, "size": len(data), "created_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        elif not await self.files.find_one({"filename": sha256}, {"_id": 1}):
+            await self.bucket.upload_from_stream(sha256, data, metadata={"size": len(data)})
+
+        return {
+            "storage": storage,
+            "sha256": sha256,
+            "size": len(data),
+            "keys": {key: len(value) if isinstance(value, str) else None for key, value in content.items()},
+        }
+
+    async def load(self, ref: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if ref["storage"] == self.DOCUMENT:
+            doc = await self.collection.find_one({"_id": ref["sha256"]}, {"content": 1})
+            return doc["content"] if doc else None
+
+        stream = await self.bucket.open_download_stream_by_name(ref["sha256"])
+        return json.loads(await stream.read())
+
+    async def load_many(self, refs: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Load several references, batching document lookups; keyed by sha256"""
+        refs = list(refs)
+        contents: Dict[str, Dict[str, Any]] = {}
+        document_ids = [ref["sha256"] for ref in refs if ref["storage"] == self.DOCUMENT]
+        if document_ids:
+            async for doc in self.collection.find({"_id": {"$in": document_ids}}, {"content": 1}):
+                contents[doc["_id"]] = doc["content"]
+        for ref in refs:
+            if ref["storage"] == self.GRIDFS and ref["sha256"] not in contents:
+                contents[ref["sha256"]] = await self.load(ref)
+        return contents
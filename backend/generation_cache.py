@@ -0,0 +1,245 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from indexes import IndexSpec
+from metrics import generation_single_flight
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_requirements(value: Any) -> Any:
+    """Canonical form of a requirements value: trimmed, whitespace-collapsed strings, sorted keys"""
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {str(k).strip(): normalize_requirements(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize_requirements(v) for v in value]
+    return value
+
+
+class GenerationCache:
+    """Two-tier cache of generated content.
+
+    Entries are content-addressed: the key is a hash of everything that
+    determines the output (service, template version, model, temperature and
+    normalized requirements). Lookups hit an in-process LRU first and fall
+    back to a Mongo collection whose documents expire through a TTL index.
+    """
+
+    def __init__(
+        self,
+        collection,
+        *,
+        enabled_services: Iterable[str] = (),
+        max_entries: int = 1024,
+        ttl_seconds: int = 7 * 86400,
+    ):
+        self.collection = collection
+        self.enabled_services = set(enabled_services)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+        )
+
+    def index_specs(self) -> List[IndexSpec]:
+        return [
+            IndexSpec(self.collection.name, (("created_at", ASCENDING),), expire_after_seconds=self.ttl_seconds),
+        ]
+
+    def enabled_for(self, service_type: str) -> bool:
+        return service_type in self.enabled_services
+
+    @staticmethod
+    def key(service_type: str, requirements: Dict[str, Any], *, template_version: str, model: str, temperature: float) -> str:
+        canonical = json.dumps(
+            {
+                "service_type": service_type,
+                "template_version": template_version,
+                "model": model,
+                "temperature": temperature,
+                "requirements": normalize_requirements(requirements),
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def record_bypass(self, service_type: str):
+        self._stats[service_type]["bypassed"] += 1
+
+    async def get(self, service_type: str, key: str, *, record: bool = True) -> Optional[Dict[str, Any]]:
+        """The cached content for ``key``; ``record=False`` leaves the hit/miss counts alone (for polling)"""
+        # A throwaway dict when not recording, so lookups count the same way either way
+        stats = self._stats[service_type] if record else defaultdict(int)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            content, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                stats["memory_hits"] += 1
+                return copy.deepcopy(content)
+            del self._entries[key]
+
+        doc = await self.collection.find_one({"_id": key}, {"content": 1, "created_at": 1})
+        if doc is not None:
+            age = (datetime.utcnow() - doc["created_at"]).total_seconds()
+            if age < self.ttl_seconds:
+                self._remember(key, doc["content"], self.ttl_seconds - age)
+                stats["mongo_hits"] += 1
+                return copy.deepcopy(doc["content"])
+
+        stats["misses"] += 1
+        return None
+
+    async def set(self, service_type: str, key: str, content: Dict[str, Any]):
+        self._remember(key, copy.deepcopy(content), self.ttl_seconds)
+        await self.collection.replace_one(
+            {"_id": key},
+            {"service_type": service_type, "content": content, "created_at": datetime.utcnow()},
+            upsert=True,
+        )
+        self._stats[service_type]["stores"] += 1
+
+    def _remember(self, key: str, content: Dict[str, Any], ttl: float):
+        self._entries[key] = (content, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled_services": sorted(self.enabled_services),
+            "memory_entries": len(self._entries),
+            "services": {service: dict(counts) for service, counts in self._stats.items()},
+        }
+
+
+class GenerationLeases:
+    """Single flight for generations: one run per cache key, in this process and across workers.
+
+    Concurrent generations of the same key in this process wait on the first
+    one. Across processes, the generating one holds a lease document in Mongo
+    (renewed while it runs, and expiring if its holder dies); the others poll
+    the generation cache for its result instead of calling the model again,
+    and take the lease over if it is released or expires without a result.
+    """
+
+    def __init__(self, collection, *, lease_seconds: float = 30.0, poll_interval: float = 0.5):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = uuid.uuid4().hex
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    def index_specs(self) -> List[IndexSpec]:
+        # Leases are checked by expiry on acquire; the TTL only sweeps abandoned ones
+        return [IndexSpec(self.collection.name, (("expires_at", ASCENDING),), expire_after_seconds=0)]
+
+    async def run(self, service_type: str, key: str, generate: Callable[[], Awaitable[Dict[str, Any]]],
+                  cached: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Dict[str, Any]:
+        """``generate()`` unless another run for ``key`` is under way, then its result.
+
+        ``cached()`` looks the result up in the generation cache, where
+        ``generate`` is expected to store it. It is called repeatedly while
+        waiting on another worker, so it should not record cache stats; the
+        caller has already counted the request's own lookup.
+        """
+        while key in self._flights:
+            try:
+                content = await asyncio.shield(self._flights[key])
+            except Exception:
+                # The run we waited on failed; retry, leading if nobody else has
+                continue
+            generation_single_flight.inc(1.0, service_type, "joined")
+            return copy.deepcopy(content)
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            content = await self._lead(service_type, key, generate, cached)
+        except BaseException as e:
+            flight.set_exception(e if isinstance(e, Exception) else RuntimeError("generation was cancelled"))
+            # Retrieved here so a flight nobody joined does not log an unhandled exception
+            flight.exception()
+            raise
+        finally:
+            self._flights.pop(key, None)
+        flight.set_result(content)
+        return content
+
+    async def _lead(self, service_type: str, key: str, generate: Callable[[], Awaitable[Dict[str, Any]]],
+                    cached: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Dict[str, Any]:
+        waited = False
+        while not await self._acquire(key):
+            # Another worker is generating this; its result lands in the cache
+            if not waited:
+                logger.info(f"Waiting for another worker's {service_type} generation {key[:12]}")
+                waited = True
+            await asyncio.sleep(self.poll_interval)
+            content = await cached()
+            if content is not None:
+                generation_single_flight.inc(1.0, service_type, "waited")
+                return content
+
+        renewing = asyncio.create_task(self._renew(key))
+        try:
+            # A holder may have stored its result just before releasing the lease
+            content = await cached()
+            if content is not None:
+                generation_single_flight.inc(1.0, service_type, "waited")
+                return content
+            return await generate()
+        finally:
+            renewing.cancel()
+            await self._release(key)
+
+    async def _acquire(self, key: str) -> bool:
+        now = datetime.utcnow()
+        try:
+            # Matches only an expired lease; otherwise the upsert's insert collides with the live one
+            await self.collection.update_one(
+                {"_id": key, "expires_at": {"$lte": now}},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _renew(self, key: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.collection.update_one(
+                    {"_id": key, "owner": self.owner},
+                    {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+                )
+            except Exception as e:
+                logger.warning(f"Could not renew generation lease {key[:12]}: {str(e)}")
+
+    async def _release(self, key: str):
+        try:
+            await self.collection.delete_one({"_id": key, "owner": self.owner})
+        except Exception as e:
+            # It expires on its own
+            logger.warning(f"Could not release generation lease {key[:12]}: {str(e)}")
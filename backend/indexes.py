@@ -0,0 +1,142 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Server error codes for an existing index with the same keys but other options
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+
+class IndexCreationError(Exception):
+    """A unique index could not be created; the code relying on it would silently misbehave"""
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+    expire_after_seconds: Optional[int] = None
+    partial_filter: Optional[Dict[str, Any]] = field(default=None, hash=False, compare=False)
+
+    @property
+    def key_pattern(self) -> Dict[str, int]:
+        return dict(self.keys)
+
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {}
+        if self.unique:
+            options["unique"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        if self.partial_filter is not None:
+            options["partialFilterExpression"] = self.partial_filter
+        return options
+
+
+# Indexes behind the hot queries in server.py
+CORE_INDEXES = [
+    IndexSpec("orders", (("id", ASCENDING),), unique=True),
+    IndexSpec("orders", (("customer_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING))),
+    IndexSpec("orders", (("created_at", DESCENDING), ("id", DESCENDING))),
+    IndexSpec("orders", (("payment_intent_id", ASCENDING),)),
+    IndexSpec(
+        "orders", (("order_reference", ASCENDING),), unique=True,
+        partial_filter={"order_reference": {"$type": "string"}},
+    ),
+    IndexSpec(
+        "orders", (("idempotency_key", ASCENDING),), unique=True,
+        partial_filter={"idempotency_key": {"$type": "string"}},
+    ),
+    IndexSpec("orders", (("batch_id", ASCENDING), ("status", ASCENDING))),
+    IndexSpec("orders", (("status", ASCENDING), ("deadline", ASCENDING))),
+    IndexSpec("order_batches", (("id", ASCENDING),), unique=True),
+    IndexSpec("customers", (("id", ASCENDING),), unique=True),
+    IndexSpec("customers", (("email", ASCENDING),), unique=True),
+    IndexSpec("stripe_events", (("received_at", ASCENDING),), expire_after_seconds=30 * 86400),
+]
+
+
+class IndexManager:
+    """Declares the indexes each collection needs and creates them idempotently"""
+
+    def __init__(self, db, specs: Iterable[IndexSpec]):
+        self.db = db
+        self.specs: List[IndexSpec] = list(specs)
+        self.errors: Dict[str, str] = {}
+
+    async def ensure(self):
+        """Create every declared index.
+
+        Failures are logged and reported; once every index has been tried,
+        IndexCreationError is raised if any of them was unique. Idempotency
+        and deduplication are enforced by unique indexes, so a process must
+        not start without them.
+        """
+        self.errors = {}
+        missing_unique = []
+        for spec in self.specs:
+            collection = self.db[spec.collection]
+            try:
+                await collection.create_index(list(spec.keys), **spec.options())
+            except OperationFailure as e:
+                if e.code == INDEX_OPTIONS_CONFLICT and spec.expire_after_seconds is not None:
+                    # Only the TTL changed; update it in place instead of rebuilding
+                    await self.db.command(
+                        "collMod", spec.collection,
+                        index={"keyPattern": spec.key_pattern, "expireAfterSeconds": spec.expire_after_seconds},
+                    )
+                    continue
+                self.errors[self._label(spec)] = str(e)
+                logger.error(f"Could not create index {self._label(spec)}: {str(e)}")
+                if spec.unique:
+                    missing_unique.append(self._label(spec))
+        if missing_unique:
+            raise IndexCreationError(f"Could not create unique indexes: {', '.join(missing_unique)}")
+
+    async def report(self) -> Dict[str, Any]:
+        """Compare declared indexes with what exists and how often each is used"""
+        report: Dict[str, Any] = {}
+        for name in sorted({spec.collection for spec in self.specs}):
+            collection = self.db[name]
+            declared = [spec for spec in self.specs if spec.collection == name]
+            existing = await collection.index_information()
+            usage = {
+                stat["name"]: {"ops": stat["accesses"]["ops"], "since": stat["accesses"]["since"]}
+                async for stat in collection.aggregate([{"$indexStats": {}}])
+            }
+
+            # Key order matters, so compare patterns as ordered tuples
+            existing_patterns = {
+                index_name: tuple((key, int(direction)) for key, direction in info["key"])
+                for index_name, info in existing.items()
+            }
+            declared_patterns = [spec.keys for spec in declared]
+            missing = [self._label(spec) for spec in declared if spec.keys not in existing_patterns.values()]
+            undeclared = [
+                index_name for index_name, pattern in existing_patterns.items()
+                if index_name != "_id_" and pattern not in declared_patterns
+            ]
+            unused = [
+                index_name for index_name, stats in usage.items()
+                if index_name != "_id_" and stats["ops"] == 0
+            ]
+            report[name] = {
+                "indexes": {
+                    index_name: {"key": dict(existing_patterns[index_name]), **usage.get(index_name, {})}
+                    for index_name in existing
+                },
+                "missing": missing,
+                "undeclared": undeclared,
+                "unused": unused,
+            }
+        return {"collections": report, "errors": self.errors}
+
+    @staticmethod
+    def _label(spec: IndexSpec) -> str:
+        return f"{spec.collection}(" + ", ".join(f"{key}:{direction}" for key, direction in spec.keys) + ")"
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from indexes import IndexSpec
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus:
+    QUEUED = "queued"
+    LEASED = "leased"
+    DONE = "done"
+    DEAD = "dead"
+
+
+class JobQueue:
+    """MongoDB-backed job queue with leases.
+
+    A worker claims a job with one atomic ``find_one_and_update`` which moves
+    it from ``queued`` to ``leased`` and stamps a lease expiry. The worker keeps
+    the lease alive with heartbeats; if it dies, ``reap_expired`` hands the job
+    back to the queue (or buries it once attempts are exhausted).
+
+    Jobs may belong to a ``group`` with a ``group_limit``: after claiming a
+    grouped job the worker counts the group's leased jobs and hands the job
+    back if the group is over its limit, so a bulk batch never occupies more
+    than its share of workers.
+
+    Among available jobs of equal priority the one with the earliest
+    ``deadline`` is claimed first; a job's ``kind`` lets a worker skip kinds
+    that already hold their share of its slots.
+    """
+
+    def __init__(
+        self,
+        collection,
+        *,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 5,
+        backoff_base: float = 5.0,
+        backoff_max: float = 300.0,
+    ):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.group_retry_seconds = 1.0
+        self._saturated_groups: Dict[str, datetime] = {}
+
+    def index_specs(self) -> List[IndexSpec]:
+        name = self.collection.name
+        return [
+            IndexSpec(name, (("status", ASCENDING), ("priority", DESCENDING), ("deadline", ASCENDING))),
+            IndexSpec(name, (("status", ASCENDING), ("lease_expires_at", ASCENDING))),
+            IndexSpec(name, (("group", ASCENDING), ("status", ASCENDING))),
+        ]
+
+    def _job(self, order_id: str, now: datetime, priority: int, payload: Optional[Dict[str, Any]],
+             kind: Optional[str], deadline: Optional[datetime], group: Optional[str],
+             group_limit: Optional[int]) -> Dict[str, Any]:
+        return {
+            "_id": str(uuid.uuid4()),
+            "order_id": order_id,
+            "payload": payload or {},
+            "status": JobStatus.QUEUED,
+            "priority": priority,
+            "kind": kind,
+            # Jobs without a deadline queue in arrival order among those with one
+            "deadline": deadline or now,
+            "group": group,
+            "group_limit": group_limit,
+            "attempts": 0,
+            "available_at": now,
+            "lease_expires_at": None,
+            "worker_id": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def enqueue(self, order_id: str, *, priority: int = 0, payload: Optional[Dict[str, Any]] = None,
+                      kind: Optional[str] = None, deadline: Optional[datetime] = None,
+                      group: Optional[str] = None, group_limit: Optional[int] = None) -> str:
+        """Add a job for an order and return its id"""
+        job = self._job(order_id, datetime.utcnow(), priority, payload, kind, deadline, group, group_limit)
+        await self.collection.insert_one(job)
+        return job["_id"]
+
+    async def enqueue_many(self, order_ids: List[str], *, priority: int = 0, payload: Optional[Dict[str, Any]] = None,
+                           kind: Optional[str] = None, deadline: Optional[datetime] = None,
+                           group: Optional[str] = None, group_limit: Optional[int] = None):
+        """Add one job per order in a single insert"""
+        now = datetime.utcnow()
+        jobs = [
+            self._job(order_id, now, priority, payload, kind, deadline, group, group_limit)
+            for order_id in order_ids
+        ]
+        if jobs:
+            await self.collection.insert_many(jobs, ordered=False)
+
+    async def claim(self, worker_id: str, *, exclude_kinds: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+        """Atomically lease the most urgent available job, skipping ``exclude_kinds``"""
+        exclude_kinds = list(exclude_kinds)
+        while True:
+            now = datetime.utcnow()
+            self._saturated_groups = {g: until for g, until in self._saturated_groups.items() if until > now}
+            query: Dict[str, Any] = {"status": JobStatus.QUEUED, "available_at": {"$lte": now}}
+            if self._saturated_groups:
+                query["group"] = {"$nin": list(self._saturated_groups)}
+            if exclude_kinds:
+                query["kind"] = {"$nin": exclude_kinds}
+
+            job = await self.collection.find_one_and_update(
+                query,
+                {
+                    "$set": {
+                        "status": JobStatus.LEASED,
+                        "worker_id": worker_id,
+                        "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                        "updated_at": now,
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("priority", DESCENDING), ("deadline", ASCENDING), ("available_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None or job.get("group_limit") is None or await self._within_group_limit(job):
+                return job
+
+    async def _within_group_limit(self, job: Dict[str, Any]) -> bool:
+        """Check a freshly claimed grouped job against its limit; release it if over"""
+        leased = await self.collection.count_documents({"group": job["group"], "status": JobStatus.LEASED})
+        if leased <= job["group_limit"]:
+            return True
+
+        now = datetime.utcnow()
+        self._saturated_groups[job["group"]] = now + timedelta(seconds=self.group_retry_seconds)
+        await self.collection.update_one(
+            {"_id": job["_id"], "worker_id": job["worker_id"]},
+            {
+                "$set": {
+                    "status": JobStatus.QUEUED,
+                    "worker_id": None,
+                    "lease_expires_at": None,
+                    "available_at": now + timedelta(seconds=random.uniform(0, self.group_retry_seconds)),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": -1},
+            },
+        )
+        return False
+
+    async def heartbeat(self, job: Dict[str, Any]) -> bool:
+        """Extend a held lease; returns False if the lease was lost"""
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": job["_id"], "status": JobStatus.LEASED, "worker_id": job["worker_id"]},
+            {"$set": {
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now,
+            }},
+        )
+        return result.modified_count == 1
+
+    async def complete(self, job: Dict[str, Any]):
+        await self.collection.update_one(
+            {"_id": job["_id"], "worker_id": job["worker_id"]},
+            {"$set": {
+                "status": JobStatus.DONE,
+                "lease_expires_at": None,
+                "updated_at": datetime.utcnow(),
+            }},
+        )
+
+    async def fail(self, job: Dict[str, Any], error: str) -> bool:
+        """Record a failed attempt; returns True if the job will be retried"""
+        now = datetime.utcnow()
+        retry = job["attempts"] < self.max_attempts
+        update = {
+            "status": JobStatus.QUEUED if retry else JobStatus.DEAD,
+            "lease_expires_at": None,
+            "worker_id": None,
+            "last_error": error,
+            "updated_at": now,
+        }
+        if retry:
+            update["available_at"] = now + timedelta(seconds=self.backoff_delay(job["attempts"]))
+        await self.collection.update_one(
+            {"_id": job["_id"], "worker_id": job["worker_id"]},
+            {"$set": update},
+        )
+        return retry
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter for the given attempt count"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(attempts - 1, 0)))
+        return random.uniform(delay / 2, delay)
+
+    async def reap_expired(self) -> List[Dict[str, Any]]:
+        """Release jobs whose lease expired; returns the jobs that were buried"""
+        now = datetime.utcnow()
+        buried = []
+        expired = self.collection.find(
+            {"status": JobStatus.LEASED, "lease_expires_at": {"$lt": now}}
+        )
+        async for job in expired:
+            retry = job["attempts"] < self.max_attempts
+            result = await self.collection.update_one(
+                {"_id": job["_id"], "status": JobStatus.LEASED, "lease_expires_at": job["lease_expires_at"]},
+                {"$set": {
+                    "status": JobStatus.QUEUED if retry else JobStatus.DEAD,
+                    "available_at": now,
+                    "lease_expires_at": None,
+                    "worker_id": None,
+                    "last_error": "lease expired",
+                    "updated_at": now,
+                }},
+            )
+            if result.modified_count and not retry:
+                buried.append(job)
+            elif result.modified_count:
+                logger.warning(f"Re-queued job {job['_id']} for order {job['order_id']} after lease expiry")
+        return buried
+
+    async def depth(self) -> int:
+        return await self.collection.count_documents({"status": JobStatus.QUEUED})
+
+    async def counts(self) -> Dict[str, int]:
+        """Jobs waiting, running and dead; done jobs are left out as they only accumulate"""
+        statuses = (JobStatus.QUEUED, JobStatus.LEASED, JobStatus.DEAD)
+        totals = await asyncio.gather(*(self.collection.count_documents({"status": status}) for status in statuses))
+        return dict(zip(statuses, totals))
@@ -0,0 +1,204 @@
+"""Record and replay LLM HTTP traffic.
+
+``RecordingTransport`` sits under the gateway's HTTP client, forwards every
+request to the provider and appends the exchange (status, headers and body
+chunks with their arrival times) to a ``Cassette``. ``ReplayTransport``
+answers from the cassette instead, either instantly or with the recorded
+time to first byte and chunk pacing, so the rest of the pipeline can be
+profiled without cost or provider noise.
+
+Requests are matched by a fingerprint of method, path and JSON body (model,
+messages, sampling parameters, streaming); credentials are never stored.
+Repeated identical requests are replayed in the order they were recorded.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Server-sent event streams end with this; clients stop reading there, before EOF
+STREAM_END = b"data: [DONE]"
+
+# Recomputed on replay, or meaningless once the body has been re-chunked
+DROPPED_HEADERS = {"content-length", "transfer-encoding", "content-encoding", "set-cookie", "connection"}
+
+
+class CassetteMiss(httpx.TransportError):
+    """A replayed request was never recorded"""
+
+
+def fingerprint(request: httpx.Request) -> str:
+    try:
+        body: Any = json.loads(request.content or b"null")
+    except ValueError:
+        body = request.content.decode("latin-1")
+    canonical = json.dumps(
+        {"method": request.method, "path": request.url.path, "body": body},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded exchanges on disk, one JSON-lines file per request fingerprint"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._loaded: Dict[str, List[Dict[str, Any]]] = {}
+        self._replayed: Dict[str, int] = {}
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.jsonl"
+
+    def append(self, key: str, interaction: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.path(key).open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+    def next(self, key: str) -> Optional[Dict[str, Any]]:
+        """The next recorded exchange for a fingerprint, cycling once all have been replayed"""
+        if key not in self._loaded:
+            path = self.path(key)
+            if not path.exists():
+                return None
+            with path.open(encoding="utf-8") as handle:
+                self._loaded[key] = [json.loads(line) for line in handle if line.strip()]
+        interactions = self._loaded[key]
+        if not interactions:
+            return None
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        return interactions[index % len(interactions)]
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """Passes the provider's body through, noting when each chunk arrived"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, started: float, event_stream: bool,
+                 on_complete: Callable[[List[Tuple[float, str]]], None]):
+        self._stream = stream
+        self._started = started
+        self._event_stream = event_stream
+        self._on_complete = on_complete
+        self._chunks: List[Tuple[float, str]] = []
+        self._tail = b""
+        self._complete = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            # latin-1 maps bytes to code points one to one, so any chunk survives JSON
+            self._chunks.append((round(time.monotonic() - self._started, 4), chunk.decode("latin-1")))
+            if self._event_stream:
+                self._tail = (self._tail + chunk)[-64:]
+                self._complete = STREAM_END in self._tail
+            yield chunk
+        self._complete = True
+
+    async def aclose(self):
+        await self._stream.aclose()
+        # Bodies that were abandoned part way (e.g. a losing hedge) are not kept
+        if self._complete:
+            self._complete = False
+            self._on_complete(self._chunks)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, transport: httpx.AsyncBaseTransport):
+        self.cassette = cassette
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key = fingerprint(request)
+        # Uncompressed bodies keep cassettes readable and chunk timings meaningful
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        headers_at = round(time.monotonic() - started, 4)
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() not in DROPPED_HEADERS]
+
+        def save(chunks: List[Tuple[float, str]]):
+            self.cassette.append(key, {
+                "request": {"method": request.method, "path": request.url.path, "body": request.content.decode("utf-8")},
+                "status": response.status_code,
+                "headers": headers,
+                "headers_at": headers_at,
+                "chunks": chunks,
+                "recorded_at": time.time(),
+            })
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(
+                response.stream, started, "text/event-stream" in response.headers.get("content-type", ""), save
+            ),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[List[Any]], started: float, speed: float):
+        self._chunks = chunks
+        self._started = started
+        self._speed = speed
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for offset, text in self._chunks:
+            if self._speed:
+                delay = offset / self._speed - (time.monotonic() - self._started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield text.encode("latin-1")
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded exchanges; ``speed`` scales recorded timings (0 replays instantly)"""
+
+    def __init__(self, cassette: Cassette, *, speed: float = 1.0):
+        self.cassette = cassette
+        self.speed = speed
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        started = time.monotonic()
+        key = fingerprint(request)
+        interaction = self.cassette.next(key)
+        if interaction is None:
+            raise CassetteMiss(f"No recorded response for {request.method} {request.url.path} ({key[:12]})",
+                               request=request)
+        if self.speed:
+            await asyncio.sleep(interaction["headers_at"] / self.speed)
+        return httpx.Response(
+            status_code=interaction["status"],
+            headers=interaction["headers"],
+            stream=_ReplayStream(interaction["chunks"], started, self.speed),
+            request=request,
+        )
+
+
+def build_transport(mode: str, cassette_dir: Path, *, speed: float = 1.0
+                    ) -> Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]]:
+    """Wrapper for the gateway's HTTP transport for LLM_TRANSPORT_MODE (live, record or replay)"""
+    if mode == "live":
+        return None
+    cassette = Cassette(cassette_dir)
+    if mode == "record":
+        logger.info(f"Recording LLM traffic to {cassette_dir}")
+        return lambda transport: RecordingTransport(cassette, transport)
+    if mode == "replay":
+        logger.info(f"Replaying LLM traffic from {cassette_dir}")
+        return lambda transport: ReplayTransport(cassette, speed=speed)
+    raise ValueError(f"Unknown LLM transport mode {mode!r}; expected live, record or replay")
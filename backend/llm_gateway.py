@@ -0,0 +1,363 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from openai import APIError, AsyncOpenAI, RateLimitError
+
+from rate_limiter import RateLimiter, Reservation, estimate_prompt_tokens
+from resilience import CircuitBreaker, LatencyTracker, hedged
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LLMResponse:
+    content: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Prompt tokens the provider served from its prefix cache
+    cached_prompt_tokens: int = 0
+
+
+def cached_tokens(usage) -> int:
+    return getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+
+
+class _HedgeLost(Exception):
+    """Raised inside a streamed attempt once the other attempt produced output first"""
+
+
+class LLMGateway:
+    """Shared async gateway for chat completions.
+
+    One pooled HTTP client with keep-alive is reused by every generator, and a
+    semaphore caps how many completions may be in flight at once so bursts
+    queue on the event loop instead of on executor threads. With a
+    ``rate_limiter`` every call first reserves request and token capacity,
+    and 429 responses are retried with jittered backoff.
+
+    With ``hedge_percentile`` set, a call still unanswered after that
+    percentile of recent latencies for its key (time to first token for
+    streams) gets a duplicate request, and the first to answer wins; hedges
+    are capped at ``hedge_budget`` of all calls, and with a rate limiter are
+    only sent when capacity for the duplicate is free. A circuit breaker per model
+    fails calls fast while that model's error rate is high.
+    """
+
+    # What a failed call raises (besides CircuitOpenError), for callers that fall back
+    call_errors = (APIError, asyncio.TimeoutError)
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 32,
+        timeout: float = 120.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        keepalive_expiry: float = 60.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        rate_limit_retries: int = 4,
+        rate_limit_backoff: float = 2.0,
+        hedge_percentile: Optional[float] = None,
+        hedge_budget: float = 0.1,
+        breaker_failure_rate: float = 0.5,
+        breaker_min_calls: int = 20,
+        breaker_cooldown: float = 30.0,
+        wrap_transport: Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = None,
+    ):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.rate_limit_retries = rate_limit_retries
+        self.rate_limit_backoff = rate_limit_backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._breaker_options = {
+            "failure_rate": breaker_failure_rate,
+            "min_calls": breaker_min_calls,
+            "cooldown": breaker_cooldown,
+        }
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        if wrap_transport is not None:
+            # e.g. recording or replaying traffic (llm_cassette.py)
+            transport = wrap_transport(transport)
+        self._http_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+        self._client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self._http_client,
+            max_retries=0,
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        *,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        timeout: Optional[float] = None,
+        latency_key: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+    ) -> LLMResponse:
+        """Run one chat completion under the concurrency ceiling.
+
+        ``prompt_tokens`` is what the rate limiter reserves for the prompt
+        (e.g. a template's counted size); the messages are estimated without it.
+        """
+        key = latency_key or model
+        prompt_tokens = prompt_tokens or estimate_prompt_tokens(messages)
+
+        async def attempt(index: int) -> LLMResponse:
+            started = time.monotonic()
+            response = await self._complete(messages, model, max_tokens, temperature, timeout)
+            self.latency.record(key, time.monotonic() - started)
+            return response
+
+        return await self._call(
+            model, prompt_tokens, max_tokens,
+            lambda reservation: self._hedged(key, attempt, reservation, prompt_tokens, max_tokens),
+        )
+
+    async def _complete(self, messages, model, max_tokens, temperature, timeout) -> LLMResponse:
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                response = await self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout or self.timeout,
+                )
+            finally:
+                self._in_flight -= 1
+
+        usage = response.usage
+        return LLMResponse(
+            content=response.choices[0].message.content,
+            model=response.model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            cached_prompt_tokens=cached_tokens(usage),
+        )
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        *,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        on_delta: Callable[[str], None],
+        timeout: Optional[float] = None,
+        latency_key: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+    ) -> LLMResponse:
+        """Run one streamed chat completion, passing each text delta to ``on_delta``"""
+        key = f"{latency_key or model}:first_token"
+        prompt_tokens = prompt_tokens or estimate_prompt_tokens(messages)
+
+        async def run(reservation: Optional[Reservation]) -> LLMResponse:
+            # The first attempt to produce a token owns the stream; the other one stops
+            leader: List[int] = []
+            first_token = asyncio.Event()
+
+            async def attempt(index: int) -> LLMResponse:
+                started = time.monotonic()
+
+                def forward(text: str):
+                    if not leader:
+                        leader.append(index)
+                        first_token.set()
+                        self.latency.record(key, time.monotonic() - started)
+                    if leader[0] != index:
+                        raise _HedgeLost()
+                    on_delta(text)
+
+                return await self._stream(messages, model, max_tokens, temperature, forward, timeout)
+
+            return await self._hedged(key, attempt, reservation, prompt_tokens, max_tokens, progressed=first_token)
+
+        return await self._call(model, prompt_tokens, max_tokens, run)
+
+    async def _stream(self, messages, model, max_tokens, temperature, on_delta, timeout) -> LLMResponse:
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                return await asyncio.wait_for(
+                    self._consume_stream(messages, model, max_tokens, temperature, on_delta),
+                    timeout=timeout or self.timeout,
+                )
+            finally:
+                self._in_flight -= 1
+
+    async def _consume_stream(self, messages, model, max_tokens, temperature, on_delta) -> LLMResponse:
+        stream = await self._client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parts = []
+        usage = None
+        served_by = model
+        async for chunk in stream:
+            served_by = chunk.model or served_by
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+
+        return LLMResponse(
+            content="".join(parts),
+            model=served_by,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            cached_prompt_tokens=cached_tokens(usage),
+        )
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(model, **self._breaker_options)
+        return self._breakers[model]
+
+    def available(self, model: str) -> bool:
+        """False while the model's circuit breaker is open"""
+        return model not in self._breakers or self._breakers[model].state != CircuitBreaker.OPEN
+
+    async def _call(self, model: str, prompt_tokens: int, max_tokens: int,
+                    run: Callable[[Optional[Reservation]], Awaitable[LLMResponse]]) -> LLMResponse:
+        breaker = self._breaker(model)
+        breaker.allow()
+        try:
+            response = await self._rate_limited(prompt_tokens + max_tokens, run)
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return response
+
+    async def _hedged(self, key: str, attempt: Callable[[int], Awaitable[LLMResponse]],
+                      reservation: Optional[Reservation], prompt_tokens: int, max_tokens: int,
+                      progressed: Optional[asyncio.Event] = None) -> LLMResponse:
+        self.calls += 1
+        delay = None
+        if self.hedge_percentile and self.hedges < self.hedge_budget * self.calls:
+            delay = self.latency.percentile(key, self.hedge_percentile)
+        # Each attempt is a request against the provider's limits and settles its own reservation
+        reservations = [reservation]
+
+        async def can_hedge() -> bool:
+            # Waiting for capacity would defeat the point of hedging
+            hedge_reservation = None
+            if self.rate_limiter:
+                hedge_reservation = await self.rate_limiter.try_acquire(prompt_tokens + max_tokens)
+                if hedge_reservation is None:
+                    logger.info(f"Not hedging slow LLM call for {key}: no rate limit capacity")
+                    return False
+            reservations.append(hedge_reservation)
+            return True
+
+        def on_hedge():
+            self.hedges += 1
+            logger.info(f"Hedging slow LLM call for {key} after {delay:.1f}s")
+
+        async def run(index: int) -> LLMResponse:
+            return await self._reserved(reservations[index], prompt_tokens, lambda: attempt(index))
+
+        response, winner = await hedged(run, delay, progressed=progressed, can_hedge=can_hedge, on_hedge=on_hedge)
+        if winner:
+            self.hedge_wins += 1
+        return response
+
+    async def _rate_limited(self, estimate: int,
+                            call: Callable[[Optional[Reservation]], Awaitable[LLMResponse]]) -> LLMResponse:
+        """Reserve ``estimate`` tokens for a call and retry it on 429s"""
+        for attempt in range(self.rate_limit_retries + 1):
+            reservation = await self.rate_limiter.acquire(estimate) if self.rate_limiter else None
+            try:
+                return await call(reservation)
+            except RateLimitError as e:
+                delay = self._retry_after(e) or self.rate_limit_backoff * (2 ** attempt)
+                if self.rate_limiter:
+                    await self.rate_limiter.block(delay)
+                if attempt == self.rate_limit_retries:
+                    raise
+                logger.warning(f"LLM rate limited, retrying in {delay:.1f}s")
+                await asyncio.sleep(random.uniform(delay, delay * 1.5))
+
+    async def _reserved(self, reservation: Optional[Reservation], prompt_tokens: int,
+                        call: Callable[[], Awaitable[LLMResponse]]) -> LLMResponse:
+        """Run one request on its reservation and settle it against actual usage, however the request ends"""
+        if reservation is None:
+            return await call()
+        try:
+            response = await call()
+        except RateLimitError:
+            await self.rate_limiter.release(reservation)
+            raise
+        except BaseException:
+            # Timeouts, errors and cancellations may still have been billed for
+            # the prompt, but produced no completion worth keeping reserved
+            await self.rate_limiter.reconcile(reservation, prompt_tokens)
+            raise
+        await self.rate_limiter.reconcile(reservation, response.prompt_tokens + response.completion_tokens)
+        return response
+
+    @staticmethod
+    def _retry_after(error: RateLimitError) -> Optional[float]:
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "in_flight": self._in_flight,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedges / self.calls if self.calls else 0.0,
+            "breakers": {model: breaker.stats() for model, breaker in self._breakers.items()},
+        }
+
+    async def aclose(self):
+        await self._client.close()
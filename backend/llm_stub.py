@@ -0,0 +1,134 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Run with ``uvicorn llm_stub:app --port 12112`` and point the backend at it
+with ``OPENAI_BASE_URL=http://localhost:12112/v1``. Every call waits
+``LLM_STUB_LATENCY_SECONDS`` before its first token, then produces tokens at
+``LLM_STUB_TOKENS_PER_SECOND``, so generation time behaves like a real model
+without the variance. Replies are deterministic filler of
+``LLM_STUB_COMPLETION_TOKENS`` tokens (capped by the request's ``max_tokens``),
+after a set of SVG concepts when the prompt asks for ``<svg>``; failures and 429s can be injected to exercise fallbacks and the rate limiter.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="OpenAI stand-in")
+
+LATENCY_SECONDS = float(os.environ.get("LLM_STUB_LATENCY_SECONDS", "0.5"))
+TOKENS_PER_SECOND = float(os.environ.get("LLM_STUB_TOKENS_PER_SECOND", "100"))
+COMPLETION_TOKENS = int(os.environ.get("LLM_STUB_COMPLETION_TOKENS", "300"))
+FAILURE_RATE = float(os.environ.get("LLM_STUB_FAILURE_RATE", "0"))
+RATE_LIMIT_RATE = float(os.environ.get("LLM_STUB_RATE_LIMIT_RATE", "0"))
+# Tokens per streamed chunk; real providers send one or a few
+CHUNK_TOKENS = int(os.environ.get("LLM_STUB_CHUNK_TOKENS", "5"))
+
+calls = {"total": 0, "streamed": 0, "failed": 0, "rate_limited": 0}
+
+
+def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(str(message.get("content") or "")) // 4 + 4 for message in messages) + 3
+
+
+def filler(count: int) -> List[str]:
+    """``count`` tokens of text, one word per token"""
+    words = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit")
+    return [f"{words[index % len(words)]} " for index in range(count)]
+
+
+# Prompts asking for inline SVG (the logo concepts step) get drawable concepts
+LOGO_CONCEPTS = "".join(
+    f"### Concept {number}: Mark {number}\nA ring around a square.\n"
+    f'<svg viewBox="0 0 512 512"><circle cx="256" cy="256" r="{120 + 20 * number}" fill="none" '
+    f'stroke="#1e3a8a" stroke-width="24"/><rect x="176" y="176" width="160" height="160" fill="#f59e0b"/></svg>\n\n'
+    for number in range(1, 6)
+)
+
+
+def reply_text(body: Dict[str, Any], tokens: List[str]) -> str:
+    messages = body.get("messages") or [{}]
+    if "<svg>" in str(messages[-1].get("content") or ""):
+        return LOGO_CONCEPTS + "".join(tokens)
+    return "".join(tokens)
+
+
+def injected_error():
+    if RATE_LIMIT_RATE and random.random() < RATE_LIMIT_RATE:
+        calls["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": "1"},
+            content={"error": {"type": "rate_limit_exceeded", "message": "Injected rate limit"}},
+        )
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        calls["failed"] += 1
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"type": "server_error", "message": "Injected failure"}},
+        )
+    return None
+
+
+def usage(body: Dict[str, Any], completion_tokens: int) -> Dict[str, int]:
+    prompt = prompt_tokens(body.get("messages", []))
+    return {"prompt_tokens": prompt, "completion_tokens": completion_tokens, "total_tokens": prompt + completion_tokens}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    calls["total"] += 1
+    await asyncio.sleep(LATENCY_SECONDS)
+    error = injected_error()
+    if error:
+        return error
+
+    tokens = filler(min(COMPLETION_TOKENS, body.get("max_tokens") or COMPLETION_TOKENS))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4o-mini")
+
+    if not body.get("stream"):
+        await asyncio.sleep(len(tokens) / TOKENS_PER_SECOND)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply_text(body, tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage(body, len(tokens)),
+        }
+
+    calls["streamed"] += 1
+
+    def chunk(choices: List[Dict[str, Any]], **extra) -> str:
+        payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": choices, **extra}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def events():
+        for start in range(0, len(tokens), CHUNK_TOKENS):
+            piece = tokens[start:start + CHUNK_TOKENS]
+            await asyncio.sleep(len(piece) / TOKENS_PER_SECOND)
+            yield chunk([{"index": 0, "delta": {"content": "".join(piece)}, "finish_reason": None}])
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield chunk([], usage=usage(body, len(tokens)))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return calls
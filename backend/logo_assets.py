@@ -0,0 +1,768 @@
+"""Raster logo packages from sanitized SVG (see ``svg.py``).
+
+Every concept is rasterized once, at the largest size, by a NumPy scanline
+rasterizer: shapes, paths (lines, curves and arcs), strokes and transforms are
+flattened to polygons, and each shape's nonzero/even-odd coverage is computed
+for a whole block of supersampled rows at once from the edge crossings.
+Smaller sizes are area-averaged from the nearest of its successive 2x2
+halvings, which is also the anti-aliasing that favicons need, and the palette
+is measured from the rendered pixels. Linear and radial gradients are shaded
+per pixel from a lookup table of their stops, in either unit system and with
+any spread method.
+
+``build_logo_package`` runs in the render pool and writes every file into the
+artifact store, finishing with a manifest so a package is only ever built once.
+"""
+import json
+import math
+import os
+import re
+import struct
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from artifacts import ArtifactStore
+from svg import local_name, parse_view_box
+
+# Bump when rasterizing changes so packages are built again
+LOGO_VERSION = "2"
+
+LOGO_SIZES: Dict[str, Tuple[int, ...]] = {
+    "favicon": (16, 32, 48, 180, 192, 512),
+    "social": (400, 1080),
+    "print": (2048,),
+}
+
+# Samples per pixel along each axis when rasterizing the master
+SUPERSAMPLE = 2
+# Supersampled cells rasterized per block, bounding memory for large shapes
+BLOCK_CELLS = 1 << 21
+# Colors precomputed along each gradient, finer than 8-bit output can show
+GRADIENT_STEPS = 1024
+
+Matrix = Tuple[float, float, float, float, float, float]
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+NAMED_COLORS = {
+    "black": "#000000", "white": "#ffffff", "red": "#ff0000", "green": "#008000", "blue": "#0000ff",
+    "yellow": "#ffff00", "orange": "#ffa500", "purple": "#800080", "gray": "#808080", "grey": "#808080",
+    "navy": "#000080", "teal": "#008080", "maroon": "#800000", "olive": "#808000", "lime": "#00ff00",
+    "aqua": "#00ffff", "cyan": "#00ffff", "fuchsia": "#ff00ff", "magenta": "#ff00ff", "silver": "#c0c0c0",
+    "gold": "#ffd700", "pink": "#ffc0cb", "brown": "#a52a2a", "indigo": "#4b0082", "coral": "#ff7f50",
+    "crimson": "#dc143c", "turquoise": "#40e0d0", "darkblue": "#00008b", "skyblue": "#87ceeb",
+}
+
+NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+PATH_TOKEN = re.compile(r"[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+TRANSFORM = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+
+Color = Tuple[float, float, float, float]
+
+
+# Geometry
+
+def multiply(m: Matrix, n: Matrix) -> Matrix:
+    """The transform applying ``n`` first, then ``m``"""
+    a, b, c, d, e, f = m
+    g, h, i, j, k, l = n
+    return (a * g + c * h, b * g + d * h, a * i + c * j, b * i + d * j, a * k + c * l + e, b * k + d * l + f)
+
+
+def parse_transform(value: Optional[str]) -> Matrix:
+    matrix = IDENTITY
+    for name, arguments in TRANSFORM.findall(value or ""):
+        args = [float(number) for number in NUMBER.findall(arguments)]
+        if name == "matrix" and len(args) == 6:
+            step = tuple(args)
+        elif name == "translate" and args:
+            step = (1.0, 0.0, 0.0, 1.0, args[0], args[1] if len(args) > 1 else 0.0)
+        elif name == "scale" and args:
+            step = (args[0], 0.0, 0.0, args[1] if len(args) > 1 else args[0], 0.0, 0.0)
+        elif name == "rotate" and args:
+            angle = math.radians(args[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(args) == 3:
+                cx, cy = args[1], args[2]
+                step = multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), step), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == "skewX" and args:
+            step = (1.0, 0.0, math.tan(math.radians(args[0])), 1.0, 0.0, 0.0)
+        elif name == "skewY" and args:
+            step = (1.0, math.tan(math.radians(args[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            continue
+        matrix = multiply(matrix, step)
+    return matrix
+
+
+def apply(matrix: Matrix, points: np.ndarray) -> np.ndarray:
+    a, b, c, d, e, f = matrix
+    x, y = points[:, 0], points[:, 1]
+    return np.column_stack((a * x + c * y + e, b * x + d * y + f))
+
+
+def scale_of(matrix: Matrix) -> float:
+    a, b, c, d, _, _ = matrix
+    return math.sqrt(abs(a * d - b * c)) or 1.0
+
+
+def segments_for(length: float) -> int:
+    """Line segments for a curve of ``length`` pixels, keeping it smooth at any size"""
+    return int(min(256, max(8, math.sqrt(max(length, 0.0)) * 4)))
+
+
+def ellipse_points(cx: float, cy: float, rx: float, ry: float, pixel_scale: float, clockwise: bool = False) -> np.ndarray:
+    count = segments_for(2 * math.pi * max(rx, ry) * pixel_scale)
+    angles = np.linspace(0, -2 * math.pi if clockwise else 2 * math.pi, count, endpoint=False)
+    return np.column_stack((cx + rx * np.cos(angles), cy + ry * np.sin(angles)))
+
+
+def cubic(p0, p1, p2, p3, pixel_scale: float) -> np.ndarray:
+    control = np.array([p0, p1, p2, p3], dtype=float)
+    length = np.linalg.norm(np.diff(control, axis=0), axis=1).sum() * pixel_scale
+    t = np.linspace(0, 1, segments_for(length) + 1)[1:, None]
+    u = 1 - t
+    return u ** 3 * control[0] + 3 * u * u * t * control[1] + 3 * u * t * t * control[2] + t ** 3 * control[3]
+
+
+def quadratic(p0, p1, p2, pixel_scale: float) -> np.ndarray:
+    control = np.array([p0, p1, p2], dtype=float)
+    length = np.linalg.norm(np.diff(control, axis=0), axis=1).sum() * pixel_scale
+    t = np.linspace(0, 1, segments_for(length) + 1)[1:, None]
+    u = 1 - t
+    return u * u * control[0] + 2 * u * t * control[1] + t * t * control[2]
+
+
+def arc(p0, rx: float, ry: float, rotation: float, large: bool, sweep: bool, p1, pixel_scale: float) -> np.ndarray:
+    """Points along an SVG elliptical arc (endpoint parameterization, SVG 1.1 appendix F.6)"""
+    (x0, y0), (x1, y1) = p0, p1
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0 or (x0, y0) == (x1, y1):
+        return np.array([[x1, y1]], dtype=float)
+    phi = math.radians(rotation)
+    cos, sin = math.cos(phi), math.sin(phi)
+    dx, dy = (x0 - x1) / 2, (y0 - y1) / 2
+    xp, yp = cos * dx + sin * dy, -sin * dx + cos * dy
+    radii = xp * xp / (rx * rx) + yp * yp / (ry * ry)
+    if radii > 1:
+        rx, ry = rx * math.sqrt(radii), ry * math.sqrt(radii)
+    numerator = rx * rx * ry * ry - rx * rx * yp * yp - ry * ry * xp * xp
+    factor = math.sqrt(max(0.0, numerator / (rx * rx * yp * yp + ry * ry * xp * xp)))
+    if large == sweep:
+        factor = -factor
+    cxp, cyp = factor * rx * yp / ry, -factor * ry * xp / rx
+    cx = cos * cxp - sin * cyp + (x0 + x1) / 2
+    cy = sin * cxp + cos * cyp + (y0 + y1) / 2
+    start = math.atan2((yp - cyp) / ry, (xp - cxp) / rx)
+    end = math.atan2((-yp - cyp) / ry, (-xp - cxp) / rx)
+    delta = end - start
+    if sweep and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * math.pi
+    count = segments_for(abs(delta) * max(rx, ry) * pixel_scale)
+    angles = start + delta * np.linspace(0, 1, count + 1)[1:]
+    ex, ey = rx * np.cos(angles), ry * np.sin(angles)
+    return np.column_stack((cx + cos * ex - sin * ey, cy + sin * ex + cos * ey))
+
+
+Subpath = Tuple[np.ndarray, bool]
+
+
+def path_subpaths(d: str, pixel_scale: float) -> List[Subpath]:
+    """Flatten SVG path data into (points, closed) subpaths"""
+    tokens = PATH_TOKEN.findall(d)
+    subpaths: List[Subpath] = []
+    points: List[np.ndarray] = []
+    current = np.zeros(2)
+    start = np.zeros(2)
+    # The previous command's last control point, for S (after C/S) and T (after Q/T)
+    reflected: Tuple[str, Optional[np.ndarray]] = ("", None)
+    command = ""
+    index = 0
+
+    def numbers(count: int) -> Optional[List[float]]:
+        nonlocal index
+        if index + count > len(tokens) or any(token.isalpha() for token in tokens[index:index + count]):
+            return None
+        values = [float(token) for token in tokens[index:index + count]]
+        index += count
+        return values
+
+    def finish(closed: bool):
+        nonlocal points
+        if len(points) > 1:
+            subpaths.append((np.vstack(points), closed))
+        points = []
+
+    def reflection(family: str) -> np.ndarray:
+        kind, control = reflected
+        return 2 * current - control if kind == family and control is not None else current
+
+    while index < len(tokens):
+        if tokens[index].isalpha():
+            command = tokens[index]
+            index += 1
+        elif not command:
+            break
+        origin = current if command.islower() else np.zeros(2)
+        upper = command.upper()
+        control: Optional[np.ndarray] = None
+
+        if upper == "Z":
+            finish(True)
+            current = start.copy()
+            reflected = ("", None)
+            continue
+        arity = {"M": 2, "L": 2, "T": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "A": 7}.get(upper)
+        values = numbers(arity) if arity else None
+        if values is None:
+            break
+        if upper == "M":
+            finish(False)
+            current = origin + values
+            start = current.copy()
+            points = [current[None, :]]
+            reflected = ("", None)
+            # Further coordinate pairs are implicit line-tos
+            command = "l" if command == "m" else "L"
+            continue
+        if not points:
+            # Drawing straight after a Z continues from the subpath's start
+            points = [current[None, :]]
+
+        if upper == "L":
+            target = origin + values
+            points.append(target[None, :])
+        elif upper in ("H", "V"):
+            target = current.copy()
+            axis = 0 if upper == "H" else 1
+            target[axis] = origin[axis] + values[0]
+            points.append(target[None, :])
+        elif upper in ("C", "S"):
+            if upper == "C":
+                first, control, target = origin + values[0:2], origin + values[2:4], origin + values[4:6]
+            else:
+                first, control, target = reflection("C"), origin + values[0:2], origin + values[2:4]
+            points.append(cubic(current, first, control, target, pixel_scale))
+        elif upper in ("Q", "T"):
+            if upper == "Q":
+                control, target = origin + values[0:2], origin + values[2:4]
+            else:
+                control, target = reflection("Q"), origin + values[0:2]
+            points.append(quadratic(current, control, target, pixel_scale))
+        else:
+            target = origin + values[5:7]
+            points.append(arc(current, values[0], values[1], values[2], bool(values[3]), bool(values[4]), target,
+                              pixel_scale))
+        reflected = ("C" if upper in ("C", "S") else "Q" if upper in ("Q", "T") else "", control)
+        current = target
+    finish(False)
+    return subpaths
+
+
+def to_number(value: Optional[str], default: float = 0.0) -> float:
+    match = NUMBER.match((value or "").strip())
+    if not match:
+        return default
+    return float(match.group(0)) / (100 if value.strip().endswith("%") else 1)
+
+
+def number(element: ET.Element, name: str, default: float = 0.0) -> float:
+    return to_number(element.get(name), default)
+
+
+def point_list(value: Optional[str]) -> np.ndarray:
+    values = [float(token) for token in NUMBER.findall(value or "")]
+    return np.array(values[:len(values) // 2 * 2], dtype=float).reshape(-1, 2)
+
+
+def rounded_rect(x: float, y: float, width: float, height: float, rx: float, ry: float, pixel_scale: float) -> np.ndarray:
+    corners = []
+    for cx, cy, start in ((x + width - rx, y + ry, -90), (x + width - rx, y + height - ry, 0),
+                          (x + rx, y + height - ry, 90), (x + rx, y + ry, 180)):
+        count = segments_for(math.pi / 2 * max(rx, ry) * pixel_scale)
+        angles = np.radians(np.linspace(start, start + 90, count + 1))
+        corners.append(np.column_stack((cx + rx * np.cos(angles), cy + ry * np.sin(angles))))
+    return np.vstack(corners)
+
+
+def element_subpaths(element: ET.Element, pixel_scale: float) -> List[Subpath]:
+    name = local_name(element.tag)
+    if name == "rect":
+        x, y = number(element, "x"), number(element, "y")
+        width, height = number(element, "width"), number(element, "height")
+        if width <= 0 or height <= 0:
+            return []
+        rx, ry = element.get("rx"), element.get("ry")
+        rx_value = number(element, "rx") if rx is not None else number(element, "ry") if ry is not None else 0.0
+        ry_value = number(element, "ry") if ry is not None else rx_value
+        rx_value, ry_value = min(rx_value, width / 2), min(ry_value, height / 2)
+        if rx_value > 0 and ry_value > 0:
+            return [(rounded_rect(x, y, width, height, rx_value, ry_value, pixel_scale), True)]
+        return [(np.array([[x, y], [x + width, y], [x + width, y + height], [x, y + height]], dtype=float), True)]
+    if name == "circle":
+        r = number(element, "r")
+        return [(ellipse_points(number(element, "cx"), number(element, "cy"), r, r, pixel_scale), True)] if r > 0 else []
+    if name == "ellipse":
+        rx, ry = number(element, "rx"), number(element, "ry")
+        if rx <= 0 or ry <= 0:
+            return []
+        return [(ellipse_points(number(element, "cx"), number(element, "cy"), rx, ry, pixel_scale), True)]
+    if name == "line":
+        return [(np.array([[number(element, "x1"), number(element, "y1")],
+                           [number(element, "x2"), number(element, "y2")]], dtype=float), False)]
+    if name in ("polyline", "polygon"):
+        points = point_list(element.get("points"))
+        return [(points, name == "polygon")] if len(points) > 1 else []
+    if name == "path":
+        return path_subpaths(element.get("d") or "", pixel_scale)
+    return []
+
+
+def stroke_outline(subpaths: List[Subpath], width: float) -> List[np.ndarray]:
+    """Polygons covering a stroke (round joins and caps), all wound the same way so nonzero fill unions them"""
+    half = width / 2
+    polygons: List[np.ndarray] = []
+    for points, closed in subpaths:
+        if closed:
+            points = np.vstack((points, points[:1]))
+        starts, ends = points[:-1], points[1:]
+        direction = ends - starts
+        lengths = np.linalg.norm(direction, axis=1)
+        keep = lengths > 1e-9
+        starts, ends, direction, lengths = starts[keep], ends[keep], direction[keep], lengths[keep]
+        normal = np.column_stack((-direction[:, 1], direction[:, 0])) / lengths[:, None] * half
+        quads = np.stack((starts + normal, ends + normal, ends - normal, starts - normal), axis=1)
+        polygons.extend(quads)
+        for x, y in points:
+            polygons.append(ellipse_points(x, y, half, half, 1.0, clockwise=True))
+    return polygons
+
+
+# Paint
+
+def parse_color(value: str) -> Optional[Tuple[float, float, float]]:
+    value = NAMED_COLORS.get(value.strip().lower(), value.strip())
+    if value.startswith("#"):
+        digits = value[1:]
+        if len(digits) in (3, 4):
+            digits = "".join(char * 2 for char in digits[:3])
+        try:
+            return tuple(int(digits[i:i + 2], 16) / 255 for i in (0, 2, 4))
+        except ValueError:
+            return None
+    match = re.match(r"rgba?\(([^)]*)\)", value)
+    if match:
+        parts = [part.strip() for part in match.group(1).split(",")]
+        if len(parts) >= 3:
+            channels = []
+            for part in parts[:3]:
+                channel = to_number(part) * (255 if part.endswith("%") else 1)
+                channels.append(min(max(channel / 255, 0.0), 1.0))
+            return tuple(channels)
+    return None
+
+
+class Gradient(NamedTuple):
+    """A gradient's geometry in its own coordinates and its color along them"""
+
+    radial: bool
+    # (x1, y1, x2, y2) for linear gradients, (cx, cy, r, fx, fy) for radial ones
+    geometry: Tuple[float, ...]
+    bounding_box: bool
+    transform: Matrix
+    spread: str
+    # GRADIENT_STEPS premultiplied RGBA colors from offset 0 to 1
+    colors: np.ndarray
+
+
+class GradientPaint(NamedTuple):
+    gradient: Gradient
+    # From canvas pixels back to the gradient's coordinates
+    inverse: Matrix
+    opacity: float
+
+
+Paint = Union[Color, GradientPaint]
+
+
+def gradient_table(stops: List[Tuple[float, float, float, float, float]]) -> np.ndarray:
+    """Premultiplied colors at GRADIENT_STEPS offsets, interpolated between stops as straight RGBA"""
+    offsets = np.array([stop[0] for stop in stops])
+    straight = np.array([stop[1:] for stop in stops])
+    positions = np.linspace(0, 1, GRADIENT_STEPS)
+    table = np.column_stack([np.interp(positions, offsets, straight[:, channel]) for channel in range(4)])
+    table[:, :3] *= table[:, 3:]
+    return table.astype(np.float32)
+
+
+def parse_gradients(root: ET.Element, view_box: Sequence[float]) -> Dict[str, Gradient]:
+    """Every gradient with at least one usable stop, by id"""
+    _, _, width, height = view_box
+    diagonal = math.hypot(width, height) / math.sqrt(2)
+    gradients = {}
+    for element in root.iter():
+        name = local_name(element.tag)
+        if name not in ("linearGradient", "radialGradient") or not element.get("id"):
+            continue
+        stops = []
+        for stop in element:
+            color = parse_color(stop.get("stop-color", "black"))
+            if color is None:
+                continue
+            # Offsets are clamped to 0..1 and may not go backwards
+            offset = min(max(number(stop, "offset"), stops[-1][0] if stops else 0.0), 1.0)
+            stops.append((offset, *color, min(max(number(stop, "stop-opacity", 1.0), 0.0), 1.0)))
+        if not stops:
+            continue
+        bounding_box = element.get("gradientUnits") != "userSpaceOnUse"
+
+        def length(attribute: str, default: str, extent: float) -> float:
+            value = element.get(attribute) or default
+            # Percentages are of the bounding box (already fractions) or of the viewBox
+            if value.strip().endswith("%") and not bounding_box:
+                return to_number(value) * extent
+            return to_number(value)
+
+        if name == "linearGradient":
+            geometry = (length("x1", "0%", width), length("y1", "0%", height),
+                        length("x2", "100%", width), length("y2", "0%", height))
+        else:
+            cx, cy = length("cx", "50%", width), length("cy", "50%", height)
+            fx = length("fx", element.get("cx") or "50%", width)
+            fy = length("fy", element.get("cy") or "50%", height)
+            geometry = (cx, cy, length("r", "50%", diagonal), fx, fy)
+        gradients[element.get("id")] = Gradient(
+            radial=name == "radialGradient",
+            geometry=geometry,
+            bounding_box=bounding_box,
+            transform=parse_transform(element.get("gradientTransform")),
+            spread=element.get("spreadMethod", "pad"),
+            colors=gradient_table(stops),
+        )
+    return gradients
+
+
+def invert(matrix: Matrix) -> Optional[Matrix]:
+    a, b, c, d, e, f = matrix
+    determinant = a * d - b * c
+    if abs(determinant) < 1e-12:
+        return None
+    return (d / determinant, -b / determinant, -c / determinant, a / determinant,
+            (c * f - d * e) / determinant, (b * e - a * f) / determinant)
+
+
+def gradient_offsets(gradient: Gradient, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Where each point (in gradient coordinates) falls along the gradient, before spreading"""
+    if not gradient.radial:
+        x1, y1, x2, y2 = gradient.geometry
+        dx, dy = x2 - x1, y2 - y1
+        length = dx * dx + dy * dy
+        if length == 0:
+            # A zero-length gradient paints its last stop
+            return np.ones_like(x)
+        return ((x - x1) * dx + (y - y1) * dy) / length
+
+    cx, cy, r, fx, fy = gradient.geometry
+    if r <= 0:
+        return np.ones_like(x)
+    # A focal point outside the circle is moved just inside it (SVG 1.1)
+    ex, ey = cx - fx, cy - fy
+    distance = math.hypot(ex, ey)
+    if distance > 0.999 * r:
+        fx, fy = cx - ex * 0.999 * r / distance, cy - ey * 0.999 * r / distance
+        ex, ey = cx - fx, cy - fy
+    # The t whose circle (centered at f + t(c - f), radius t*r) passes through the point
+    dx, dy = x - fx, y - fy
+    a = ex * ex + ey * ey - r * r
+    b = dx * ex + dy * ey
+    return (b - np.sqrt(b * b - a * (dx * dx + dy * dy))) / a
+
+
+def shade(paint: GradientPaint, box: Tuple[int, int, int, int]) -> np.ndarray:
+    """Premultiplied RGBA of a gradient at the centers of the pixels in ``box``"""
+    x0, y0, x1, y1 = box
+    a, b, c, d, e, f = paint.inverse
+    columns = np.arange(x0, x1, dtype=np.float32)[None, :] + 0.5
+    rows = np.arange(y0, y1, dtype=np.float32)[:, None] + 0.5
+    t = gradient_offsets(paint.gradient, a * columns + c * rows + e, b * columns + d * rows + f)
+    if paint.gradient.spread == "repeat":
+        t = t - np.floor(t)
+    elif paint.gradient.spread == "reflect":
+        t = np.abs((t + 1) % 2 - 1)
+    index = np.rint(np.clip(t, 0, 1) * (GRADIENT_STEPS - 1)).astype(np.int32)
+    return paint.gradient.colors[index] * np.float32(min(max(paint.opacity, 0.0), 1.0))
+
+
+def paint(value: Optional[str], opacity: float, gradients: Dict[str, Gradient], matrix: Matrix,
+          bounds: Tuple[float, float, float, float]) -> Optional[Paint]:
+    """A solid color, or a gradient placed on a shape with local ``bounds`` drawn through ``matrix``"""
+    if value is None or value.strip() in ("none", "transparent"):
+        return None
+    reference = re.match(r"url\(\s*#([\w.\-]+)\s*\)", value.strip())
+    if reference:
+        gradient = gradients.get(reference.group(1))
+        if gradient is None:
+            return None
+        if gradient.bounding_box:
+            x0, y0, x1, y1 = bounds
+            if x1 <= x0 or y1 <= y0:
+                # Bounding box units need an area to map onto
+                return None
+            matrix = multiply(matrix, (x1 - x0, 0.0, 0.0, y1 - y0, x0, y0))
+        inverse = invert(multiply(matrix, gradient.transform))
+        return GradientPaint(gradient, inverse, opacity) if inverse else None
+    color = parse_color(value) or (0.0, 0.0, 0.0)
+    return (*color, opacity)
+
+
+def opacity_of(fill: Paint) -> float:
+    return fill.opacity if isinstance(fill, GradientPaint) else fill[3]
+
+
+Shape = Tuple[List[np.ndarray], bool, Paint]
+
+
+def shapes(svg: str, size: int) -> Iterator[Shape]:
+    """(polygons in pixel space, even-odd, paint) for everything painted, in paint order"""
+    root = ET.fromstring(svg)
+    view_box = parse_view_box(root)
+    min_x, min_y, width, height = view_box
+    scale = size / max(width, height)
+    # viewBox fitted and centered in a square canvas
+    root_matrix = (scale, 0.0, 0.0, scale, (size - width * scale) / 2 - min_x * scale,
+                   (size - height * scale) / 2 - min_y * scale)
+    gradients = parse_gradients(root, view_box)
+
+    def inherited(element: ET.Element, style: Dict[str, str]) -> Dict[str, str]:
+        style = dict(style)
+        for name in ("fill", "fill-opacity", "fill-rule", "stroke", "stroke-width", "stroke-opacity"):
+            if element.get(name) is not None:
+                style[name] = element.get(name)
+        # Group opacity is applied to each child rather than to the group as a layer
+        style["opacity"] = str(to_number(style.get("opacity"), 1.0) * number(element, "opacity", 1.0))
+        return style
+
+    def walk(element: ET.Element, matrix: Matrix, style: Dict[str, str]) -> Iterator[Shape]:
+        name = local_name(element.tag)
+        if name in ("defs", "linearGradient", "radialGradient", "stop"):
+            return
+        matrix = multiply(matrix, parse_transform(element.get("transform")))
+        style = inherited(element, style)
+        if name in ("svg", "g"):
+            for child in element:
+                yield from walk(child, matrix, style)
+            return
+
+        pixel_scale = scale_of(matrix)
+        local = element_subpaths(element, pixel_scale)
+        if not local:
+            return
+        stacked = np.vstack([points for points, _ in local])
+        # Bounding box units of gradients are relative to the untransformed geometry
+        bounds = (*stacked.min(axis=0), *stacked.max(axis=0))
+        subpaths = [(apply(matrix, points), closed) for points, closed in local]
+        opacity = float(style["opacity"])
+        if name != "line":
+            fill = paint(style.get("fill", "black"), opacity * to_number(style.get("fill-opacity"), 1.0), gradients,
+                         matrix, bounds)
+            if fill is not None and opacity_of(fill) > 0:
+                yield [points for points, _ in subpaths], style.get("fill-rule") == "evenodd", fill
+        stroke = paint(style.get("stroke"), opacity * to_number(style.get("stroke-opacity"), 1.0), gradients,
+                       matrix, bounds)
+        stroke_width = to_number(style.get("stroke-width"), 1.0) * pixel_scale
+        if stroke is not None and opacity_of(stroke) > 0 and stroke_width > 0:
+            yield stroke_outline(subpaths, stroke_width), False, stroke
+
+    yield from walk(root, root_matrix, {"opacity": "1"})
+
+
+# Raster
+
+def coverage(polygons: Sequence[np.ndarray], even_odd: bool, box: Tuple[int, int, int, int]) -> np.ndarray:
+    """Fraction of each pixel in ``box`` (x0, y0, x1, y1) inside the polygons, from supersampled scanlines.
+
+    Each edge adds its winding direction at the first sample right of where it
+    crosses each sample row; a cumulative sum along the row then gives every
+    sample's winding number.
+    """
+    x0, y0, x1, y1 = box
+    s = SUPERSAMPLE
+    columns = (x1 - x0) * s
+    edges = np.vstack([np.column_stack((points, np.roll(points, -1, axis=0))) for points in polygons if len(points) > 2])
+    edges = edges * s - [x0 * s, y0 * s, x0 * s, y0 * s]
+    edges = edges[edges[:, 1] != edges[:, 3]]
+    direction = np.where(edges[:, 3] > edges[:, 1], 1, -1)
+    top = np.minimum(edges[:, 1], edges[:, 3])
+    bottom = np.maximum(edges[:, 1], edges[:, 3])
+    slope = (edges[:, 2] - edges[:, 0]) / (edges[:, 3] - edges[:, 1])
+
+    result = np.zeros((y1 - y0, x1 - x0), dtype=np.float32)
+    rows_per_block = max(s, BLOCK_CELLS // max(columns, 1) // s * s)
+    for block_start in range(0, (y1 - y0) * s, rows_per_block):
+        block_end = min(block_start + rows_per_block, (y1 - y0) * s)
+        # Sample rows (centers at row + 0.5) each edge crosses within the block
+        first = np.clip(np.ceil(top - 0.5), block_start, block_end).astype(np.int64)
+        last = np.clip(np.ceil(bottom - 0.5), block_start, block_end).astype(np.int64)
+        counts = last - first
+        active = counts > 0
+        if not active.any():
+            continue
+        counts, first = counts[active], first[active]
+        total = int(counts.sum())
+        edge = np.repeat(np.flatnonzero(active), counts)
+        rows = np.repeat(first, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        x = edges[edge, 0] + (rows + 0.5 - edges[edge, 1]) * slope[edge]
+        cols = np.clip(np.ceil(x - 0.5), 0, columns).astype(np.int64)
+        height = block_end - block_start
+        winding = np.bincount(
+            (rows - block_start) * (columns + 1) + cols, weights=direction[edge], minlength=height * (columns + 1)
+        ).reshape(height, columns + 1).cumsum(axis=1)[:, :columns]
+        inside = (np.rint(winding).astype(np.int64) & 1) if even_odd else (np.rint(winding) != 0)
+        pixel_rows = slice(block_start // s, block_end // s)
+        result[pixel_rows] = inside.reshape(height // s, s, columns // s, s).mean(axis=(1, 3), dtype=np.float32)
+    return result
+
+
+def rasterize(svg: str, size: int) -> np.ndarray:
+    """Premultiplied RGBA float32 image of a sanitized SVG, fitted into ``size`` x ``size``"""
+    image = np.zeros((size, size, 4), dtype=np.float32)
+    for polygons, even_odd, fill in shapes(svg, size):
+        polygons = [points for points in polygons if len(points) > 2 and np.isfinite(points).all()]
+        if not polygons:
+            continue
+        stacked = np.vstack(polygons)
+        x0, y0 = np.clip(np.floor(stacked.min(axis=0)).astype(int), 0, size)
+        x1, y1 = np.clip(np.ceil(stacked.max(axis=0)).astype(int), 0, size)
+        if x1 <= x0 or y1 <= y0:
+            continue
+        amount = coverage(polygons, even_odd, (x0, y0, x1, y1))[..., None]
+        if isinstance(fill, GradientPaint):
+            color = shade(fill, (x0, y0, x1, y1))
+        else:
+            red, green, blue, alpha = fill
+            alpha = min(max(alpha, 0.0), 1.0)
+            color = np.array([red * alpha, green * alpha, blue * alpha, alpha], dtype=np.float32)
+        region = image[y0:y1, x0:x1]
+        region *= 1 - amount * color[..., 3:]
+        region += amount * color
+    return image
+
+
+def area_weights(source: int, target: int) -> Tuple[np.ndarray, np.ndarray]:
+    """For each target pixel, the source pixels it overlaps and their weights (a box filter at any ratio)"""
+    ratio = source / target
+    edges = np.arange(target + 1) * ratio
+    index = np.floor(edges[:-1]).astype(np.int64)[:, None] + np.arange(int(math.ceil(ratio)) + 1)
+    overlap = np.minimum(edges[1:, None], index + 1) - np.maximum(edges[:-1, None], index)
+    return np.minimum(index, source - 1), (np.clip(overlap, 0, None) / ratio).astype(np.float32)
+
+
+def halve(image: np.ndarray) -> np.ndarray:
+    return (image[0::2, 0::2] + image[1::2, 0::2] + image[0::2, 1::2] + image[1::2, 1::2]) * 0.25
+
+
+def resize(image: np.ndarray, size: int) -> np.ndarray:
+    """Area-averaged square resize of a premultiplied image.
+
+    Halved by 2x2 means while that stays at or above twice the target, then
+    filtered one axis at a time, one tap of the filter at a time.
+    """
+    while image.shape[0] >= 2 * size and image.shape[0] % 2 == 0:
+        image = halve(image)
+    if image.shape[0] == size:
+        return image
+    index, weights = area_weights(image.shape[0], size)
+    rows = sum(weights[:, tap, None, None] * image[index[:, tap]] for tap in range(index.shape[1]))
+    return sum(weights[None, :, tap, None] * rows[:, index[:, tap]] for tap in range(index.shape[1]))
+
+
+def pyramid(image: np.ndarray, smallest: int) -> List[np.ndarray]:
+    """``image`` and its successive halvings down to the last one at least ``smallest`` pixels wide"""
+    levels = [image]
+    while levels[-1].shape[0] % 2 == 0 and levels[-1].shape[0] // 2 >= smallest:
+        levels.append(halve(levels[-1]))
+    return levels
+
+
+def to_rgba8(image: np.ndarray) -> np.ndarray:
+    """Straight (not premultiplied) 8-bit RGBA"""
+    rgba = np.empty(image.shape, dtype=np.float32)
+    alpha = image[..., 3:4]
+    # Fully transparent pixels are all zeros, so the floor only avoids dividing by zero
+    np.divide(image[..., :3], np.maximum(alpha, 1e-6), out=rgba[..., :3])
+    rgba[..., 3:] = alpha
+    np.clip(rgba, 0, 1, out=rgba)
+    rgba *= 255
+    rgba += 0.5
+    return rgba.astype(np.uint8)
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """RGBA8 PNG, each row with the Sub filter"""
+    height, width, _ = pixels.shape
+    rows = pixels.reshape(height, width * 4).astype(np.int16)
+    filtered = rows.copy()
+    filtered[:, 4:] -= rows[:, :-4]
+    data = np.column_stack((np.ones(height, dtype=np.uint8), (filtered & 0xFF).astype(np.uint8)))
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(data.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def extract_palette(image: np.ndarray, colors: int = 6, min_share: float = 0.01) -> List[Dict[str, Any]]:
+    """Dominant colors of the visible pixels, by coverage-weighted 4-bit-per-channel histogram"""
+    pixels = to_rgba8(resize(image, min(image.shape[0], 256))).reshape(-1, 4).astype(np.int64)
+    visible = pixels[pixels[:, 3] >= 128]
+    if not len(visible):
+        return []
+    bins = (visible[:, 0] >> 4) << 8 | (visible[:, 1] >> 4) << 4 | visible[:, 2] >> 4
+    counts = np.bincount(bins, minlength=4096)
+    # Mean actual color of each bin, not the bin's corner
+    means = np.stack([np.bincount(bins, weights=visible[:, channel], minlength=4096) for channel in range(3)], axis=1)
+    palette = []
+    for index in np.argsort(counts)[::-1][:colors]:
+        share = counts[index] / len(visible)
+        if share < min_share:
+            break
+        red, green, blue = np.rint(means[index] / counts[index]).astype(int)
+        palette.append({"hex": f"#{red:02x}{green:02x}{blue:02x}", "share": round(float(share), 4)})
+    return palette
+
+
+def variant_names() -> List[Tuple[str, int]]:
+    return [(f"{category}-{size}", size) for category, sizes in LOGO_SIZES.items() for size in sizes]
+
+
+def write_atomic(path, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "wb") as handle:
+        handle.write(data)
+    os.replace(partial, path)
+
+
+def build_logo_package(svg: str, directory: str, key: str) -> Dict[str, Any]:
+    """Write the SVG master and every PNG size of a logo, then its manifest; returns the manifest"""
+    store = ArtifactStore(directory)
+    master = rasterize(svg, max(size for _, size in variant_names()))
+    manifest: Dict[str, Any] = {"svg": key, "png": {}, "palette": extract_palette(master)}
+    write_atomic(store.path(key, "svg"), svg.encode("utf-8"))
+    # Each size is resized from the smallest halving of the master that still covers it
+    levels = pyramid(master, min(size for _, size in variant_names()))
+    for name, size in variant_names():
+        source = min((level for level in levels if level.shape[0] >= size), key=lambda level: level.shape[0])
+        variant_key = ArtifactStore.digest(key, name)
+        write_atomic(store.path(variant_key, "png"), encode_png(to_rgba8(resize(source, size))))
+        manifest["png"][name] = variant_key
+    # Written last: a manifest means the whole package is on disk
+    write_atomic(store.path(key, "json"), json.dumps(manifest).encode("utf-8"))
+    return manifest
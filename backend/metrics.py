@@ -0,0 +1,243 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+STATUS_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 86400.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _Shards:
+    """Per-thread accumulators, summed at scrape time.
+
+    Each thread only ever writes its own list, so updates need no lock; the
+    event loop thread (where nearly all updates happen) just indexes a dict.
+    """
+
+    __slots__ = ("size", "_shards")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._shards: Dict[int, List[float]] = {}
+
+    def local(self) -> List[float]:
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            shard = self._shards[ident] = [0.0] * self.size
+        return shard
+
+    def total(self) -> List[float]:
+        totals = [0.0] * self.size
+        for shard in list(self._shards.values()):
+            for index, value in enumerate(shard):
+                totals[index] += value
+        return totals
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._children: Dict[LabelValues, _Shards] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        shards = self._children.get(labels)
+        if shards is None:
+            shards = self._children.setdefault(labels, _Shards(1))
+        shards.local()[0] += amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, shards in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, values)} {_format_value(shards.total()[0])}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[LabelValues, _Shards] = {}
+
+    def observe(self, value: float, *labels: str):
+        shards = self._children.get(labels)
+        if shards is None:
+            # One slot per bucket, one for +Inf, then the sum
+            shards = self._children.setdefault(labels, _Shards(len(self.buckets) + 2))
+        shard = shards.local()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, shards in list(self._children.items()):
+            totals = shards.total()
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), totals[:-1]):
+                cumulative += count
+                labels = _format_labels(self.label_names, values, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(totals[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Values are read from a callback at scrape time, so nothing is updated on the hot path"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 read: Optional[Callable[[], Iterable[Tuple[LabelValues, float]]]] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self.read = read
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        values = list(self.read()) if self.read else list(self._values.items())
+        lines = self.header()
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """A counter kept elsewhere (e.g. on the LLM gateway), read at scrape time"""
+
+    kind = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = (),
+              read: Optional[Callable[[], Iterable[Tuple[LabelValues, float]]]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, read))
+
+    def callback_counter(self, name: str, documentation: str, labels: Sequence[str] = (),
+                         read: Optional[Callable[[], Iterable[Tuple[LabelValues, float]]]] = None) -> CallbackCounter:
+        return self.register(CallbackCounter(name, documentation, labels, read))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"),
+)
+llm_request_seconds = registry.histogram(
+    "llm_request_duration_seconds", "LLM call latency by service, step and model", ("service", "step", "model"),
+    buckets=LLM_BUCKETS,
+)
+llm_prompt_tokens = registry.histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM call", ("service", "model"), buckets=TOKEN_BUCKETS,
+)
+llm_cached_prompt_tokens = registry.histogram(
+    "llm_cached_prompt_tokens", "Prompt tokens per LLM call served from the provider's prefix cache", ("service", "model"),
+    buckets=TOKEN_BUCKETS,
+)
+llm_completion_tokens = registry.histogram(
+    "llm_completion_tokens", "Completion tokens per LLM call", ("service", "model"), buckets=TOKEN_BUCKETS,
+)
+llm_failures = registry.counter("llm_failures_total", "Failed LLM calls by service and model", ("service", "model"))
+mongo_command_seconds = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command",),
+)
+mongo_command_failures = registry.counter("mongo_command_failures_total", "Failed MongoDB commands", ("command",))
+order_status_seconds = registry.histogram(
+    "order_status_duration_seconds", "Time orders spent in each status before leaving it", ("status",),
+    buckets=STATUS_BUCKETS,
+)
+
+generation_single_flight = registry.counter(
+    "generation_single_flight_total",
+    "Generations served by a concurrent identical one, in this process (joined) or another worker (waited)",
+    ("service", "result"),
+)
+artifact_renders = registry.counter(
+    "artifact_renders_total", "Artifact requests by format and outcome (rendered, reused, joined)", ("format", "result"),
+)
+artifact_render_seconds = registry.histogram(
+    "artifact_render_duration_seconds", "Time to render an artifact in the render pool", ("format",),
+)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends, using the durations it reports"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_command_seconds.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        mongo_command_seconds.observe(event.duration_micros / 1e6, event.command_name)
+        mongo_command_failures.inc(1.0, event.command_name)
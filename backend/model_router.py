@@ -0,0 +1,164 @@
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+_served_models: ContextVar[Optional[Dict[str, str]]] = ContextVar("served_models", default=None)
+
+
+@dataclass(frozen=True)
+class ModelOption:
+    name: str
+    prompt_cost_per_1k: float
+    completion_cost_per_1k: float
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.prompt_cost_per_1k + completion_tokens * self.completion_cost_per_1k) / 1000
+
+
+@dataclass(frozen=True)
+class Route:
+    """Models a prompt step may run on.
+
+    ``models`` are ranked by measured latency and cost on every call;
+    ``fallbacks`` are only used, in order, once every model is degraded.
+    """
+
+    models: List[str]
+    fallbacks: List[str] = field(default_factory=list)
+
+
+class ModelStats:
+    """Exponentially weighted latency per output token and error rate for one model"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.seconds_per_token: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+
+    def record_success(self, seconds: float, completion_tokens: int):
+        self.calls += 1
+        self.error_rate *= 1 - self.alpha
+        if completion_tokens:
+            sample = seconds / completion_tokens
+            if self.seconds_per_token is None:
+                self.seconds_per_token = sample
+            else:
+                self.seconds_per_token += self.alpha * (sample - self.seconds_per_token)
+
+    def record_failure(self):
+        self.calls += 1
+        self.error_rate += self.alpha * (1 - self.error_rate)
+
+
+class ModelRouter:
+    """Chooses the model for each generation step.
+
+    Routes are looked up as ``{service}.{step}``, then ``{service}``, then
+    ``default``. Healthy models are ordered by expected cost plus expected
+    latency valued at ``latency_value_per_second``; a model is degraded when
+    its error rate passes ``max_error_rate`` or ``available`` (the gateway's
+    circuit breaker) says no. Degraded models stay at the end of the list so
+    there is always something to try.
+    """
+
+    def __init__(
+        self,
+        models: Mapping[str, ModelOption],
+        routes: Mapping[str, Route],
+        *,
+        latency_value_per_second: float = 0.001,
+        max_error_rate: float = 0.3,
+        available: Optional[Callable[[str], bool]] = None,
+    ):
+        if "default" not in routes:
+            raise ValueError("Model routes need a 'default' entry")
+        self.models = dict(models)
+        self.routes = dict(routes)
+        self.latency_value_per_second = latency_value_per_second
+        self.max_error_rate = max_error_rate
+        self.available = available or (lambda model: True)
+        self._stats: Dict[str, ModelStats] = {}
+
+    def route(self, service: str, step: str) -> Route:
+        return self.routes.get(f"{service}.{step}") or self.routes.get(service) or self.routes["default"]
+
+    def signature(self, service: str) -> str:
+        """Stable description of a service's routes, for cache keys"""
+        routes = {
+            key: {"models": route.models, "fallbacks": route.fallbacks}
+            for key, route in sorted(self.routes.items())
+            if key in ("default", service) or key.startswith(f"{service}.")
+        }
+        return json.dumps(routes, sort_keys=True, separators=(",", ":"))
+
+    def stats_for(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats()
+        return self._stats[model]
+
+    def degraded(self, model: str) -> bool:
+        return self.stats_for(model).error_rate > self.max_error_rate or not self.available(model)
+
+    def expected_score(self, model: str, prompt_tokens: int, max_tokens: int) -> float:
+        option = self.models.get(model)
+        cost = option.cost(prompt_tokens, max_tokens) if option else 0.0
+        seconds_per_token = self.stats_for(model).seconds_per_token
+        latency = seconds_per_token * max_tokens if seconds_per_token is not None else 0.0
+        return cost + latency * self.latency_value_per_second
+
+    def candidates(self, service: str, step: str, *, prompt_tokens: int, max_tokens: int) -> List[str]:
+        """Models to try for a step, best first"""
+        route = self.route(service, step)
+        healthy = [model for model in route.models if not self.degraded(model)]
+        healthy.sort(key=lambda model: self.expected_score(model, prompt_tokens, max_tokens))
+        fallbacks = [model for model in route.fallbacks if not self.degraded(model)]
+        ordered = healthy + fallbacks
+        return ordered + [model for model in route.models + route.fallbacks if model not in ordered]
+
+    def record_success(self, model: str, seconds: float, completion_tokens: int):
+        self.stats_for(model).record_success(seconds, completion_tokens)
+
+    def record_failure(self, model: str):
+        self.stats_for(model).record_failure()
+
+    @staticmethod
+    @contextmanager
+    def track():
+        """Collect the models that serve each step inside the block"""
+        served: Dict[str, str] = {}
+        token = _served_models.set(served)
+        try:
+            yield served
+        finally:
+            _served_models.reset(token)
+
+    @staticmethod
+    def record_served(step: str, model: str):
+        served = _served_models.get()
+        if served is not None:
+            served[step] = model
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            model: {
+                "calls": stats.calls,
+                "error_rate": stats.error_rate,
+                "seconds_per_token": stats.seconds_per_token,
+                "degraded": self.degraded(model),
+            }
+            for model, stats in self._stats.items()
+        }
+
+
+def parse_routes(value: str) -> Dict[str, Route]:
+    """Parse LLM_ROUTES JSON: {"business_plan": {"models": [...], "fallbacks": [...]}}"""
+    return {
+        key: Route(models=list(spec["models"]), fallbacks=list(spec.get("fallbacks", [])))
+        for key, spec in json.loads(value).items()
+    }
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from pymongo import ASCENDING
+
+from indexes import IndexSpec
+
+logger = logging.getLogger(__name__)
+
+
+class OrderEvents:
+    """Status transitions and content deltas for in-progress orders.
+
+    Every event is published to in-process subscribers immediately. Status
+    events and periodic content checkpoints are also written to a Mongo
+    collection so that API processes can follow orders that are being
+    generated by a worker on another host.
+    """
+
+    def __init__(self, collection, *, ttl_seconds: int = 86400):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def index_specs(self) -> List[IndexSpec]:
+        name = self.collection.name
+        return [
+            IndexSpec(name, (("order_id", ASCENDING), ("_id", ASCENDING))),
+            IndexSpec(name, (("created_at", ASCENDING),), expire_after_seconds=self.ttl_seconds),
+        ]
+
+    @contextmanager
+    def subscribe(self, order_id: str):
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers[order_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[order_id].discard(queue)
+            if not self._subscribers[order_id]:
+                del self._subscribers[order_id]
+
+    def publish_local(self, order_id: str, event: Dict[str, Any]):
+        for queue in self._subscribers.get(order_id, ()):
+            queue.put_nowait(event)
+
+    async def publish(self, order_id: str, event: Dict[str, Any]):
+        """Persist an event and deliver it to local subscribers"""
+        await self.collection.insert_one({
+            "order_id": order_id,
+            "created_at": datetime.utcnow(),
+            **event,
+        })
+        self.publish_local(order_id, event)
+
+    async def last_id(self, order_id: str):
+        """Id of the newest persisted event for an order, to fetch from later"""
+        event = await self.collection.find_one({"order_id": order_id}, {"_id": 1}, sort=[("_id", -1)])
+        return event["_id"] if event else None
+
+    async def fetch(self, order_id: str, after_id=None) -> List[Dict[str, Any]]:
+        """Persisted events for an order newer than ``after_id``"""
+        query: Dict[str, Any] = {"order_id": order_id}
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        return await self.collection.find(query).sort("_id", ASCENDING).to_list(None)
+
+
+class GenerationProgress:
+    """Collects streamed content for one order attempt.
+
+    Each delta goes straight to local subscribers; the text accumulated since
+    the last checkpoint is written to Mongo every ``checkpoint_interval``
+    seconds as one chunk per output key.
+    """
+
+    def __init__(self, events: OrderEvents, order_id: str, attempt: int, *, checkpoint_interval: float = 0.5):
+        self.events = events
+        self.order_id = order_id
+        self.attempt = attempt
+        self.checkpoint_interval = checkpoint_interval
+        self._lengths: Dict[str, int] = defaultdict(int)
+        self._pending: Dict[str, List[str]] = defaultdict(list)
+        self._pending_offsets: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def writer(self, key: str) -> Callable[[str], None]:
+        return lambda text: self._append(key, text)
+
+    def _append(self, key: str, text: str):
+        offset = self._lengths[key]
+        self._lengths[key] += len(text)
+        self._pending_offsets.setdefault(key, offset)
+        self._pending[key].append(text)
+        self.events.publish_local(self.order_id, {
+            "type": "delta", "key": key, "offset": offset, "text": text, "attempt": self.attempt,
+        })
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._checkpoint_loop())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._task.cancel()
+        await self.checkpoint()
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.error(f"Error checkpointing order {self.order_id}: {str(e)}")
+
+    async def checkpoint(self):
+        pending, self._pending = self._pending, defaultdict(list)
+        offsets, self._pending_offsets = self._pending_offsets, {}
+        chunks = [
+            {
+                "order_id": self.order_id,
+                "created_at": datetime.utcnow(),
+                "type": "delta",
+                "key": key,
+                "offset": offsets[key],
+                "text": "".join(parts),
+                "attempt": self.attempt,
+            }
+            for key, parts in pending.items() if parts
+        ]
+        if chunks:
+            await self.events.collection.insert_many(chunks)
+
+
+def sse_event(event_type: str, data: Dict[str, Any]) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
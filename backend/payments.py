@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentError(Exception):
+    """A Stripe API error, or a transport failure that outlasted the retries"""
+
+    def __init__(self, message: str, *, status_code: Optional[int] = None, code: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+
+def encode_form(data: Dict[str, Any], prefix: str = "") -> List[Tuple[str, str]]:
+    """Flatten nested params into Stripe's bracketed form encoding"""
+    pairs: List[Tuple[str, str]] = []
+    for key, value in data.items():
+        name = f"{prefix}[{key}]" if prefix else key
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            pairs.extend(encode_form(value, name))
+        elif isinstance(value, (list, tuple)):
+            for index, item in enumerate(value):
+                pairs.extend(encode_form({str(index): item}, name))
+        elif isinstance(value, bool):
+            pairs.append((name, "true" if value else "false"))
+        else:
+            pairs.append((name, str(value)))
+    return pairs
+
+
+class StripeGateway:
+    """Async Stripe client on a pooled HTTP connection.
+
+    POSTs carry an idempotency key so that retries after timeouts, 429s and
+    5xx responses cannot create duplicate objects. ``api_base`` can point at
+    the local stand-in in ``stripe_stub.py``.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        *,
+        api_base: str = "https://api.stripe.com",
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_connections: int = 20,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+    ):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._client = httpx.AsyncClient(
+            base_url=api_base,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+
+    async def create_payment_intent(self, *, amount: int, currency: str, metadata: Dict[str, Any],
+                                    idempotency_key: str) -> Dict[str, Any]:
+        return await self._request(
+            "POST",
+            "/v1/payment_intents",
+            data={"amount": amount, "currency": currency, "metadata": metadata},
+            idempotency_key=idempotency_key,
+        )
+
+    async def retrieve_payment_intent(self, payment_intent_id: str) -> Dict[str, Any]:
+        return await self._request("GET", f"/v1/payment_intents/{payment_intent_id}")
+
+    async def _request(self, method: str, path: str, *, data: Optional[Dict[str, Any]] = None,
+                       idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        if not self.api_key:
+            raise PaymentError("Stripe is not configured")
+
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        body = None
+        if data:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            body = urlencode(encode_form(data))
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self._client.request(method, path, content=body, headers=headers)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise PaymentError(f"Stripe unreachable: {str(e)}")
+                await self._backoff(attempt)
+                continue
+
+            if response.status_code < 400:
+                return response.json()
+
+            if self._should_retry(response) and not last_attempt:
+                logger.warning(f"Retrying Stripe {method} {path} after HTTP {response.status_code}")
+                await self._backoff(attempt)
+                continue
+
+            error = self._error_body(response)
+            raise PaymentError(
+                error.get("message") or f"Stripe returned HTTP {response.status_code}",
+                status_code=response.status_code,
+                code=error.get("code"),
+            )
+
+    @staticmethod
+    def _should_retry(response: httpx.Response) -> bool:
+        should_retry = response.headers.get("Stripe-Should-Retry")
+        if should_retry is not None:
+            return should_retry == "true"
+        # 409 is returned while a request with the same idempotency key is in flight
+        return response.status_code in (409, 429) or response.status_code >= 500
+
+    @staticmethod
+    def _error_body(response: httpx.Response) -> Dict[str, Any]:
+        try:
+            return response.json().get("error", {})
+        except ValueError:
+            return {}
+
+    async def _backoff(self, attempt: int):
+        delay = self.backoff_base * (2 ** attempt)
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class WebhookSignatureError(PaymentError):
+    pass
+
+
+def verify_webhook(payload: bytes, signature_header: Optional[str], secret: str,
+                   tolerance: int = 300) -> Dict[str, Any]:
+    """Check a Stripe-Signature header and return the decoded event.
+
+    Stripe signs ``{timestamp}.{payload}`` with HMAC-SHA256; any of the ``v1``
+    signatures may match (several are sent while a secret is being rolled).
+    """
+    if not signature_header:
+        raise WebhookSignatureError("Missing Stripe-Signature header")
+
+    timestamp = None
+    signatures = []
+    for item in signature_header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise WebhookSignatureError("Malformed Stripe-Signature header")
+
+    expected = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise WebhookSignatureError("Signature mismatch")
+    if abs(time.time() - int(timestamp)) > tolerance:
+        raise WebhookSignatureError("Timestamp outside tolerance")
+
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise WebhookSignatureError("Invalid payload")
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from generation_cache import GenerationCache, normalize_requirements
+from order_stream import GenerationProgress
+
+logger = logging.getLogger(__name__)
+
+
+class StepContext:
+    """What a step function gets: the order's requirements, its dependencies'
+    outputs, and (when the order is being streamed) a writer for its output"""
+
+    def __init__(self, name: str, requirements: Dict[str, Any], inputs: Dict[str, Any],
+                 writer: Optional[Callable[[str], None]]):
+        self.name = name
+        self.requirements = requirements
+        self.inputs = inputs
+        self.emitted = False
+        self._writer = writer
+
+    @property
+    def on_delta(self) -> Optional[Callable[[str], None]]:
+        if self._writer is None:
+            return None
+        return self._emit
+
+    def _emit(self, text: str):
+        self.emitted = True
+        self._writer(text)
+
+
+StepFunction = Callable[[StepContext], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    run: StepFunction
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    retries: int = 0
+    # Streamed steps write their output to the order's progress under ``name``
+    stream: bool = True
+
+
+@dataclass
+class Pipeline:
+    """A service's generation steps and the dependencies between them.
+
+    Each step starts as soon as the steps it depends on have finished, so an
+    order takes as long as its critical path. Steps are retried (unless they
+    already streamed output) and their results cached by step, inputs and
+    ``cache_version``, so a retried order only reruns the steps that failed.
+    """
+
+    name: str
+    steps: List[Step]
+    assemble: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+    retry_backoff: float = 1.0
+    _by_name: Dict[str, Step] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._by_name = {step.name: step for step in self.steps}
+        if len(self._by_name) != len(self.steps):
+            raise ValueError(f"Pipeline {self.name} has duplicate step names")
+        self._order()
+
+    def _order(self) -> List[Step]:
+        """Steps in dependency order; raises on unknown dependencies or cycles"""
+        ordered: List[Step] = []
+        state: Dict[str, str] = {}
+
+        def visit(step: Step):
+            if state.get(step.name) == "done":
+                return
+            if state.get(step.name) == "visiting":
+                raise ValueError(f"Pipeline {self.name} has a cycle through {step.name}")
+            state[step.name] = "visiting"
+            for dependency in step.depends_on:
+                if dependency not in self._by_name:
+                    raise ValueError(f"Step {step.name} depends on unknown step {dependency}")
+                visit(self._by_name[dependency])
+            state[step.name] = "done"
+            ordered.append(step)
+
+        for step in self.steps:
+            visit(step)
+        return ordered
+
+    async def run(self, requirements: Dict[str, Any], *, progress: Optional[GenerationProgress] = None,
+                  cache: Optional[GenerationCache] = None, cache_version: str = "") -> Dict[str, Any]:
+        """Run every step, concurrently where dependencies allow, and assemble the output"""
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: Step) -> Any:
+            if step.depends_on:
+                await asyncio.gather(*(tasks[dependency] for dependency in step.depends_on))
+            inputs = {dependency: tasks[dependency].result() for dependency in step.depends_on}
+            writer = progress.writer(step.name) if progress is not None and step.stream else None
+            return await self._run_step(step, requirements, inputs, writer, cache, cache_version)
+
+        for step in self._order():
+            tasks[step.name] = asyncio.create_task(run_step(step))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        return self.assemble(requirements, {name: task.result() for name, task in tasks.items()})
+
+    async def _run_step(self, step: Step, requirements: Dict[str, Any], inputs: Dict[str, Any],
+                        writer: Optional[Callable[[str], None]], cache: Optional[GenerationCache],
+                        cache_version: str) -> Any:
+        label = f"{self.name}.{step.name}"
+        key = self.step_key(step, requirements, inputs, cache_version)
+        if cache is not None:
+            cached = await cache.get(label, key)
+            if cached is not None:
+                if writer is not None and isinstance(cached["output"], str):
+                    writer(cached["output"])
+                return cached["output"]
+
+        for attempt in range(step.retries + 1):
+            context = StepContext(step.name, requirements, inputs, writer)
+            started = time.monotonic()
+            try:
+                output = await asyncio.wait_for(step.run(context), timeout=step.timeout)
+            except Exception as e:
+                if context.emitted or attempt == step.retries:
+                    raise
+                logger.warning(f"Step {label} failed (attempt {attempt + 1}), retrying: {str(e) or type(e).__name__}")
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                continue
+            logger.debug(f"Step {label} finished in {time.monotonic() - started:.2f}s")
+            break
+
+        if cache is not None:
+            await cache.set(label, key, {"output": output})
+        return output
+
+    def step_key(self, step: Step, requirements: Dict[str, Any], inputs: Dict[str, Any], cache_version: str) -> str:
+        canonical = json.dumps(
+            {
+                "pipeline": self.name,
+                "step": step.name,
+                "version": cache_version,
+                "requirements": normalize_requirements(requirements),
+                "inputs": inputs,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
@@ -0,0 +1,364 @@
+"""Prompt templates for every generation step, keyed by service and step.
+
+A template's system prompt and instructions are the same for every order and
+are sent first; the order's own fields are filled in after them. Providers
+cache prompt prefixes, so calls for the same step share one cached prefix
+instead of reprocessing it each time. Templates are compiled once: their
+fields are parsed when they are registered, and the tokens in their fixed
+prefix are counted as each template is built, with an offline tokenizer
+(``tiktoken``, with its encoding read from ``encodings/`` next to this module
+and never downloaded; ~4 characters per token when either is missing).
+
+Each template carries a version, bumped by hand when its wording changes so
+outputs can be told apart; a service's version (see ``PromptRegistry.version``)
+combines its templates' versions and text, and is what generation caches are
+keyed on.
+"""
+import base64
+import hashlib
+import logging
+import string
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_ENCODING = "o200k_base"
+# The encoding's merge ranks, shipped with the backend (see the README)
+TOKENIZER_FILE = Path(__file__).parent / "encodings" / f"{TOKENIZER_ENCODING}.tiktoken"
+TOKENIZER_FILE_SHA256 = "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d"
+# The rest of o200k_base, as tiktoken_ext.openai_public defines it
+TOKENIZER_PATTERN = "|".join([
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+TOKENIZER_SPECIAL_TOKENS = {"<|endoftext|>": 199999, "<|endofprompt|>": 200018}
+# Per-message framing, as in rate_limiter.estimate_prompt_tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+
+def load_ranks(path: Path, sha256: Optional[str] = None) -> Dict[bytes, int]:
+    """Merge ranks from a ``.tiktoken`` file: one base64 token and its rank per line"""
+    data = path.read_bytes()
+    if sha256 and hashlib.sha256(data).hexdigest() != sha256:
+        raise ValueError(f"{path} does not match the expected {TOKENIZER_ENCODING} encoding")
+    return {base64.b64decode(token): int(rank) for token, rank in (line.split() for line in data.splitlines() if line)}
+
+
+@lru_cache(maxsize=None)
+def tokenizer():
+    """The offline tokenizer, or None to fall back to estimating.
+
+    The encoding is built from the bundled file rather than with
+    ``tiktoken.get_encoding``, which downloads it when it is not cached.
+    """
+    if not TOKENIZER_FILE.exists():
+        logger.warning(f"{TOKENIZER_FILE} is missing, estimating prompt tokens")
+        return None
+    try:
+        import tiktoken
+
+        return tiktoken.Encoding(
+            TOKENIZER_ENCODING,
+            pat_str=TOKENIZER_PATTERN,
+            mergeable_ranks=load_ranks(TOKENIZER_FILE, TOKENIZER_FILE_SHA256),
+            special_tokens=TOKENIZER_SPECIAL_TOKENS,
+        )
+    except Exception as e:
+        logger.warning(f"No tokenizer available ({type(e).__name__}: {str(e)}), estimating prompt tokens")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = tokenizer()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """A rendered template: the messages to send and an estimate of their prompt tokens"""
+
+    messages: List[Dict[str, Any]]
+    prompt_tokens: int
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """The prompt for one step: a fixed system prompt and instructions, then ``fields``.
+
+    ``fields`` is a ``str.format`` template of plain ``{name}`` placeholders
+    that ``render`` fills from the order.
+    """
+
+    service: str
+    step: str
+    version: str
+    system: str
+    instructions: str
+    fields: str
+    parts: Tuple[Tuple[str, Optional[str]], ...] = field(init=False, repr=False, compare=False)
+    # Tokens in the system prompt and instructions, which every render starts with
+    prefix_tokens: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        parts = []
+        for literal, name, spec, conversion in string.Formatter().parse(self.fields):
+            if name is not None and (not name.isidentifier() or spec or conversion):
+                raise ValueError(f"Template {self.service}.{self.step} has an unsupported field {{{name}}}")
+            parts.append((literal, name))
+        object.__setattr__(self, "parts", tuple(parts))
+        object.__setattr__(
+            self, "prefix_tokens",
+            count_tokens(self.system) + count_tokens(self.instructions) + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+
+    @cached_property
+    def digest(self) -> str:
+        return hashlib.sha256("\0".join((self.system, self.instructions, self.fields)).encode("utf-8")).hexdigest()
+
+    def render(self, **values: Any) -> Prompt:
+        variable = "".join(literal + ("" if name is None else str(values[name])) for literal, name in self.parts)
+        return Prompt(
+            messages=[
+                {"role": "system", "content": self.system},
+                {"role": "user", "content": f"{self.instructions}\n\n{variable}"},
+            ],
+            # Only the order's fields are estimated, the fixed prefix was counted
+            prompt_tokens=self.prefix_tokens + len(variable) // 4 + REPLY_PRIMING_TOKENS,
+        )
+
+
+class PromptRegistry:
+    """Templates by (service, step)"""
+
+    def __init__(self, templates: Iterable[PromptTemplate]):
+        self._templates: Dict[Tuple[str, str], PromptTemplate] = {}
+        for template in templates:
+            key = (template.service, template.step)
+            if key in self._templates:
+                raise ValueError(f"Duplicate prompt template {template.service}.{template.step}")
+            self._templates[key] = template
+
+    @staticmethod
+    def _service(service: Any) -> str:
+        # ServiceType members hash by name, not value, so look up by value
+        return getattr(service, "value", service)
+
+    def get(self, service: Any, step: str) -> PromptTemplate:
+        return self._templates[(self._service(service), step)]
+
+    def render(self, service: Any, step: str, **values: Any) -> Prompt:
+        return self.get(service, step).render(**values)
+
+    def templates(self, service: Any) -> List[PromptTemplate]:
+        service = self._service(service)
+        return [template for (owner, _), template in sorted(self._templates.items()) if owner == service]
+
+    def version(self, service: Any) -> str:
+        """Changes whenever any of the service's templates is re-versioned or reworded"""
+        return hashlib.sha256(
+            "\0".join(
+                f"{template.step}@{template.version}:{template.digest}" for template in self.templates(service)
+            ).encode("utf-8")
+        ).hexdigest()[:16]
+
+
+RESUME_WRITER = (
+    "You are an expert resume writer and career coach with 10+ years of experience helping people land their dream jobs."
+)
+COVER_LETTER_WRITER = "You are an expert career coach specializing in compelling cover letters that get interviews."
+BUSINESS_CONSULTANT = (
+    "You are a seasoned business consultant and MBA with expertise in creating winning business plans that secure funding."
+)
+SOCIAL_MEDIA_EXPERT = (
+    "You are a social media marketing expert with proven success in viral content creation and audience engagement."
+)
+BRAND_DESIGNER = (
+    "You are a senior brand designer with 15+ years of experience creating iconic logos for startups and Fortune 500 companies."
+)
+
+BUSINESS_DETAILS = "{business_details}"
+SOCIAL_MEDIA_DETAILS = "{details}"
+LOGO_BRIEF = """Business: {business_name}
+Industry: {industry}
+Style: {style}
+Preferred Colors: {colors}"""
+LOGO_CONCEPTS = f"""{LOGO_BRIEF}
+
+Logo concepts and brand guidelines:
+{{concepts}}"""
+
+TEMPLATES = [
+    PromptTemplate(
+        "resume", "resume", "2", RESUME_WRITER,
+        """Create a professional, ATS-optimized resume for the candidate below, targeting the role and industry given.
+
+Format the resume in a clean, professional structure with:
+1. Professional Summary (3-4 lines)
+2. Key Skills (bullet points)
+3. Professional Experience (with achievements and metrics)
+4. Education
+5. Additional sections as relevant
+
+Make it keyword-rich for ATS systems and compelling for human readers.""",
+        """Target Role: {role}
+Industry: {industry}
+
+Personal Details:
+- Name: {name}
+- Email: {email}
+- Phone: {phone}
+- Experience Level: {experience}
+- Key Skills: {skills}
+- Education: {education}
+- Work History: {work_history}""",
+    ),
+    PromptTemplate(
+        "resume", "cover_letter", "2", COVER_LETTER_WRITER,
+        """Create a compelling cover letter for the candidate below, applying for the role and industry given.
+
+Use the same personal details and work history from the resume.
+Make it:
+- Personalized and engaging
+- Highlighting key achievements
+- Showing enthusiasm for the role
+- Professional but conversational tone
+- 3-4 paragraphs maximum""",
+        """Candidate: {name}
+Target Role: {role}
+Industry: {industry}""",
+    ),
+    PromptTemplate(
+        "business_plan", "business_plan", "2", BUSINESS_CONSULTANT,
+        """Create a comprehensive business plan for the business below.
+
+Include these sections:
+1. Executive Summary
+2. Company Description
+3. Market Analysis
+4. Organization & Management
+5. Marketing & Sales Strategy
+6. Financial Projections (3 years)
+7. Risk Analysis
+8. Implementation Timeline
+
+Make it professional, detailed, and investor-ready with realistic financial projections in GBP.""",
+        BUSINESS_DETAILS,
+    ),
+    PromptTemplate(
+        "business_plan", "outline", "2", BUSINESS_CONSULTANT,
+        """Write a planning brief for a business plan. It will be handed to several writers who each draft one section, so it must pin down every fact they need to agree on.
+
+Cover, in at most 350 words of terse bullet points:
+- Positioning and value proposition
+- Customer segments
+- Products or services and pricing (GBP)
+- Key financial assumptions: revenue, costs and headcount for years 1-3, use of the initial investment
+- Major milestones""",
+        BUSINESS_DETAILS,
+    ),
+    PromptTemplate(
+        "business_plan", "section", "2", BUSINESS_CONSULTANT,
+        """Write one section of an investor-ready business plan for the business below. All figures and claims must agree with the shared planning brief. Write only the requested section, starting with its heading.""",
+        """{business_details}
+
+Shared planning brief:
+{outline}
+
+Section: {title}
+Focus: {guidance}
+Heading: ## {number}. {title}""",
+    ),
+    PromptTemplate(
+        "business_plan", "executive_summary", "2", BUSINESS_CONSULTANT,
+        """Write the "Executive Summary" of the business plan below from its finished sections. Use exactly the figures they give, and point out nothing that is not in them.
+
+Start with the heading "## 1. Executive Summary" and keep it under 350 words.""",
+        """{business_details}
+
+Sections (abridged):
+{sections}""",
+    ),
+    PromptTemplate(
+        "social_media", "content_calendar", "2", SOCIAL_MEDIA_EXPERT,
+        """Create a 30-day social media content calendar for the business below.
+
+For each day, provide:
+1. Post idea/topic
+2. Caption (platform-optimized)
+3. Relevant hashtags
+4. Best posting time
+5. Engagement strategy
+
+Include a mix of:
+- Educational content (40%)
+- Behind-the-scenes (20%)
+- User-generated content ideas (20%)
+- Promotional content (20%)
+
+Make it actionable and engaging.""",
+        SOCIAL_MEDIA_DETAILS,
+    ),
+    PromptTemplate(
+        "social_media", "outline", "2", SOCIAL_MEDIA_EXPERT,
+        """Plan a 30-day social media content calendar for the business below that several writers will fill in, a few days each.
+
+In at most 300 words of bullet points give: the content pillars, a theme for each week, which days carry which content type (40% educational, 20% behind-the-scenes, 20% user-generated content ideas, 20% promotional), hashtag sets and best posting times per platform.""",
+        SOCIAL_MEDIA_DETAILS,
+    ),
+    PromptTemplate(
+        "social_media", "days", "2", SOCIAL_MEDIA_EXPERT,
+        """Write the listed days of a 30-day social media content calendar for the business below, following the calendar plan's weekly themes, content mix and hashtag sets.
+
+For each day, start with the heading "### Day N" and provide:
+1. Post idea/topic
+2. Caption (platform-optimized)
+3. Relevant hashtags
+4. Best posting time
+5. Engagement strategy""",
+        """{details}
+
+Calendar plan:
+{outline}
+
+Days to write: {days}""",
+    ),
+    PromptTemplate(
+        "logo_design", "logo_concepts", "2", BRAND_DESIGNER,
+        """Create detailed logo concepts and brand guidelines for the business below.
+
+Provide:
+1. 5 distinct logo concepts with detailed descriptions
+2. Brand color palette with hex codes
+3. Typography recommendations
+4. Logo usage guidelines
+5. Brand personality and voice guidelines
+
+Make each concept unique and industry-appropriate.""",
+        LOGO_BRIEF,
+    ),
+    PromptTemplate(
+        "logo_design", "logo_svgs", "2", f"{BRAND_DESIGNER} You hand-write clean, minimal SVG.",
+        """Draw each logo concept described below for the business below, in the palette the brand guidelines give.
+
+For each concept, in the order given, write a heading "### Concept N: <name>" with the concept's own number and name, one line describing it, then the logo as a single inline <svg> element:
+- viewBox="0 0 512 512", the mark centred with some margin, transparent background
+- Only <g>, <defs>, <linearGradient>, <radialGradient>, <stop>, <rect>, <circle>, <ellipse>, <line>, <polyline>, <polygon> and <path>
+- Colours as hex fill and stroke attributes
+- No <text>: draw any letters as paths
+- No scripts, images, <style> blocks, external references or event handlers""",
+        LOGO_CONCEPTS,
+    ),
+]
+
+PROMPTS = PromptRegistry(TEMPLATES)
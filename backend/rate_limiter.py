@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt size: ~4 characters per token plus per-message overhead"""
+    return sum(len(str(message.get("content") or "")) // 4 + 4 for message in messages) + 3
+
+
+@dataclass
+class Reservation:
+    tokens: int
+
+
+class LocalBuckets:
+    """Request and token buckets held in this process.
+
+    ``take`` either debits both buckets and returns 0, or leaves them alone
+    and returns how long to wait before enough capacity has refilled.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.request_capacity = requests_per_minute
+        self.token_capacity = tokens_per_minute
+        self.requests = requests_per_minute
+        self.tokens = tokens_per_minute
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self.requests = min(self.request_capacity, self.requests + elapsed * self.request_capacity / 60)
+        self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_capacity / 60)
+
+    async def take(self, tokens: int) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(
+            self.blocked_until - now,
+            (1 - self.requests) * 60 / self.request_capacity,
+            (tokens - self.tokens) * 60 / self.token_capacity,
+        )
+        if wait > 0:
+            return wait
+        self.requests -= 1
+        self.tokens -= tokens
+        return 0.0
+
+    async def refund(self, tokens: int):
+        self._refill(time.monotonic())
+        self.tokens = min(self.token_capacity, self.tokens + tokens)
+
+    async def debit(self, tokens: int):
+        # May go below zero; later callers wait until the overrun has refilled
+        self._refill(time.monotonic())
+        self.tokens -= tokens
+
+    async def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class MongoBuckets:
+    """The same buckets in one Mongo document, shared by every process.
+
+    Refill, check and debit happen in a single pipeline update against the
+    server clock, so concurrent workers cannot overdraw the buckets.
+    """
+
+    def __init__(self, collection, key: str, requests_per_minute: float, tokens_per_minute: float):
+        self.collection = collection
+        self.key = key
+        self.request_capacity = requests_per_minute
+        self.token_capacity = tokens_per_minute
+
+    def _refilled(self, field: str, capacity: float) -> Dict[str, Any]:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        return {"$min": [capacity, {"$add": [{"$ifNull": [f"${field}", capacity]}, {"$multiply": [elapsed, capacity / 60]}]}]}
+
+    async def take(self, tokens: int) -> float:
+        doc = await self.collection.find_one_and_update(
+            {"_id": self.key},
+            [
+                {"$set": {
+                    "requests": self._refilled("requests", self.request_capacity),
+                    "tokens": self._refilled("tokens", self.token_capacity),
+                    "blocked_until": {"$ifNull": ["$blocked_until", "$$NOW"]},
+                    "updated_at": "$$NOW",
+                }},
+                {"$set": {"granted": {"$and": [
+                    {"$gte": ["$requests", 1]},
+                    {"$gte": ["$tokens", tokens]},
+                    {"$lte": ["$blocked_until", "$$NOW"]},
+                ]}}},
+                {"$set": {
+                    "requests": {"$cond": ["$granted", {"$subtract": ["$requests", 1]}, "$requests"]},
+                    "tokens": {"$cond": ["$granted", {"$subtract": ["$tokens", tokens]}, "$tokens"]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["granted"]:
+            return 0.0
+        return max(
+            (doc["blocked_until"] - doc["updated_at"]).total_seconds(),
+            (1 - doc["requests"]) * 60 / self.request_capacity,
+            (tokens - doc["tokens"]) * 60 / self.token_capacity,
+            0.01,
+        )
+
+    async def refund(self, tokens: int):
+        await self.collection.update_one(
+            {"_id": self.key},
+            [{"$set": {"tokens": {"$min": [self.token_capacity, {"$add": ["$tokens", tokens]}]}}}],
+        )
+
+    async def debit(self, tokens: int):
+        await self.collection.update_one(
+            {"_id": self.key}, [{"$set": {"tokens": {"$subtract": ["$tokens", tokens]}}}],
+        )
+
+    async def block(self, seconds: float):
+        until = datetime.utcnow() + timedelta(seconds=seconds)
+        await self.collection.update_one({"_id": self.key}, {"$max": {"blocked_until": until}}, upsert=True)
+
+
+class RateLimiter:
+    """Keeps LLM calls under the provider's requests- and tokens-per-minute limits.
+
+    Each call reserves its prompt estimate plus ``max_tokens`` up front and is
+    reconciled against reported usage afterwards, returning what it did not
+    use and charging whatever it used beyond the reservation; a call that
+    fails or is cancelled keeps only its prompt estimate. A
+    429 returns the whole reservation and blocks every caller sharing the
+    buckets for the retry delay.
+    """
+
+    def __init__(self, buckets, *, max_wait: float = 120.0):
+        self.buckets = buckets
+        self.max_wait = max_wait
+
+    async def acquire(self, tokens: int) -> Reservation:
+        # A single request larger than the whole bucket could never be granted
+        tokens = min(tokens, int(self.buckets.token_capacity))
+        waited = 0.0
+        while True:
+            wait = await self.buckets.take(tokens)
+            if wait <= 0:
+                return Reservation(tokens=tokens)
+            if waited >= self.max_wait:
+                raise TimeoutError(f"Rate limit capacity unavailable after {waited:.0f}s")
+            # Jitter so waiting callers do not all retry at the same instant
+            wait = min(wait, self.max_wait) * random.uniform(1.0, 1.25)
+            waited += wait
+            await asyncio.sleep(wait)
+
+    async def try_acquire(self, tokens: int) -> Optional[Reservation]:
+        """Reserve capacity only if it is free right now"""
+        tokens = min(tokens, int(self.buckets.token_capacity))
+        if await self.buckets.take(tokens) > 0:
+            return None
+        return Reservation(tokens=tokens)
+
+    async def reconcile(self, reservation: Reservation, used_tokens: int):
+        """Settle a reservation once usage is known: refund what was unused, charge any overrun"""
+        if not used_tokens:
+            # Usage was not reported; keep the reservation as the best estimate
+            return
+        if used_tokens < reservation.tokens:
+            await self.buckets.refund(reservation.tokens - used_tokens)
+        elif used_tokens > reservation.tokens:
+            await self.buckets.debit(used_tokens - reservation.tokens)
+
+    async def release(self, reservation: Reservation):
+        """Return a whole reservation for a request the provider rejected"""
+        await self.buckets.refund(reservation.tokens)
+
+    async def block(self, seconds: float):
+        logger.warning(f"Provider rate limit hit; pausing LLM calls for {seconds:.1f}s")
+        await self.buckets.block(seconds)
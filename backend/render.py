@@ -0,0 +1,422 @@
+"""PDF and DOCX documents from generated markdown.
+
+Generated content is loose markdown (headings, bullet and numbered lists,
+paragraphs, ``**bold**``). It is parsed into blocks and laid out with the
+standard library only: PDFs embed subsets of DejaVu Sans (see
+``truetype.py``), so names and text in any script the font covers come out
+as written and can be copied back out, and DOCX files are a minimal
+WordprocessingML package. Everything
+here is CPU-bound and runs in a process pool (see ``artifacts.py``); output is
+deterministic, so the same text always renders to the same bytes.
+"""
+import hashlib
+import io
+import os
+import re
+import zipfile
+import zlib
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+from truetype import TrueTypeFont
+
+# Bump when the layout changes so existing artifacts are rendered again
+RENDER_VERSION = "2"
+
+PDF = "pdf"
+DOCX = "docx"
+
+MEDIA_TYPES = {
+    PDF: "application/pdf",
+    DOCX: "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+HEADING_1 = "heading1"
+HEADING_2 = "heading2"
+HEADING_3 = "heading3"
+BULLET = "bullet"
+PARAGRAPH = "paragraph"
+
+Block = Tuple[str, str]
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+BULLET_ITEM = re.compile(r"^\s*[-*+•]\s+(.*)$")
+NUMBERED_ITEM = re.compile(r"^\s*(\d+[.)])\s+(.*)$")
+RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+EMPHASIS = re.compile(r"(\*\*|__|`)")
+# Characters XML 1.0 does not allow
+XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def plain(text: str) -> str:
+    return EMPHASIS.sub("", text).strip()
+
+
+def parse_blocks(text: str) -> List[Block]:
+    """Split markdown into (kind, text) blocks; consecutive lines form one paragraph"""
+    blocks: List[Block] = []
+    paragraph: List[str] = []
+
+    def flush():
+        if paragraph:
+            blocks.append((PARAGRAPH, plain(" ".join(paragraph))))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or RULE.match(stripped):
+            flush()
+            continue
+        heading = HEADING.match(stripped)
+        bullet = BULLET_ITEM.match(line)
+        numbered = NUMBERED_ITEM.match(line)
+        if heading:
+            flush()
+            level = min(len(heading.group(1)), 3)
+            blocks.append(((HEADING_1, HEADING_2, HEADING_3)[level - 1], plain(heading.group(2))))
+        elif bullet:
+            flush()
+            blocks.append((BULLET, "• " + plain(bullet.group(1))))
+        elif numbered:
+            flush()
+            blocks.append((BULLET, f"{numbered.group(1)} {plain(numbered.group(2))}"))
+        elif stripped.startswith("**") and stripped.endswith("**") and len(stripped) > 4:
+            # A line that is bold throughout is used as a heading
+            flush()
+            blocks.append((HEADING_3, plain(stripped)))
+        else:
+            paragraph.append(stripped)
+    flush()
+    return [(kind, text) for kind, text in blocks if text]
+
+
+# PDF
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, in points
+MARGIN = 72
+
+# (font, size, leading, space before, indent) per block kind
+PDF_STYLES: Dict[str, Tuple[str, float, float, float, float]] = {
+    "title": ("F2", 20, 26, 0, 0),
+    HEADING_1: ("F2", 16, 21, 14, 0),
+    HEADING_2: ("F2", 13, 18, 12, 0),
+    HEADING_3: ("F2", 11.5, 16, 10, 0),
+    BULLET: ("F1", 10.5, 14.5, 3, 14),
+    PARAGRAPH: ("F1", 10.5, 14.5, 8, 0),
+}
+
+# PDF font resources and the files they are embedded from
+FONT_FILES = {"F1": "DejaVuSans.ttf", "F2": "DejaVuSans-Bold.ttf"}
+# Searched in order after RENDER_FONT_DIR
+FONT_DIRS = ("/usr/share/fonts/truetype/dejavu", "/usr/share/fonts/dejavu", "/usr/share/fonts/TTF")
+
+
+@lru_cache(maxsize=None)
+def pdf_fonts() -> Dict[str, TrueTypeFont]:
+    """The fonts PDFs are set in, loaded once per process.
+
+    There is no fallback: a font without the document's characters would
+    silently lose them, so a missing font fails the render instead.
+    """
+    directories = [directory for directory in (os.environ.get("RENDER_FONT_DIR"), *FONT_DIRS) if directory]
+    fonts = {}
+    for key, filename in FONT_FILES.items():
+        for directory in directories:
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                with open(path, "rb") as handle:
+                    fonts[key] = TrueTypeFont(handle.read())
+                break
+        else:
+            raise FileNotFoundError(
+                f"PDF font {filename} not found in {', '.join(directories)}; "
+                "install DejaVu (fonts-dejavu-core) or set RENDER_FONT_DIR"
+            )
+    return fonts
+
+
+def text_width(text: str, font: str, size: float) -> float:
+    return pdf_fonts()[font].measure(text) * size / 1000
+
+
+def wrap(text: str, font: str, size: float, width: float) -> List[str]:
+    lines: List[str] = []
+    current = ""
+    # Widths add up (there is no kerning), so lines are measured a word at a time
+    current_width = 0.0
+    space = text_width(" ", font, size)
+    for word in text.split():
+        word_width = text_width(word, font, size)
+        if current and current_width + space + word_width > width:
+            lines.append(current)
+            current, current_width = word, word_width
+        elif current:
+            current, current_width = f"{current} {word}", current_width + space + word_width
+        else:
+            current, current_width = word, word_width
+        # Words longer than a line (e.g. URLs) are broken by character
+        while current_width > width and len(current) > 1:
+            cut = len(current) - 1
+            while cut > 1 and text_width(current[:cut], font, size) > width:
+                cut -= 1
+            lines.append(current[:cut])
+            current = current[cut:]
+            current_width = text_width(current, font, size)
+    if current:
+        lines.append(current)
+    return lines
+
+
+def pdf_text(text: str) -> bytes:
+    """A text string outside content streams (e.g. the title), in UTF-16 so any character survives"""
+    return b"<FEFF%s>" % text.encode("utf-16-be").hex().upper().encode()
+
+
+def show_text(font: TrueTypeFont, text: str, used: Dict[int, str]) -> bytes:
+    """``text`` as the hex glyph ids Identity-H expects, noting each glyph's character for ToUnicode"""
+    glyphs = []
+    for char in text:
+        glyph = font.glyph(char)
+        used.setdefault(glyph, char)
+        glyphs.append(glyph)
+    return b"<%s>" % "".join("%04X" % glyph for glyph in glyphs).encode()
+
+
+TO_UNICODE_HEADER = b"""/CIDInit /ProcSet findresource begin
+12 dict begin
+begincmap
+/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def
+/CMapName /Adobe-Identity-UCS def
+/CMapType 2 def
+1 begincodespacerange
+<0000> <FFFF>
+endcodespacerange
+"""
+TO_UNICODE_FOOTER = b"""endcmap
+CMapName currentdict /CMap defineresource pop
+end
+end"""
+# Most entries a bfchar section may hold
+BFCHAR_LIMIT = 100
+
+
+def to_unicode_cmap(used: Dict[int, str]) -> bytes:
+    """Maps glyphs back to their characters, so text can be searched and copied"""
+    entries = [
+        b"<%04X> <%s>" % (glyph, char.encode("utf-16-be").hex().upper().encode())
+        for glyph, char in sorted(used.items()) if glyph
+    ]
+    sections = [entries[index:index + BFCHAR_LIMIT] for index in range(0, len(entries), BFCHAR_LIMIT)]
+    return TO_UNICODE_HEADER + b"".join(
+        b"%d beginbfchar\n%s\nendbfchar\n" % (len(section), b"\n".join(section)) for section in sections
+    ) + TO_UNICODE_FOOTER
+
+
+def font_objects(key: str, used: Dict[int, str], first_id: int) -> List[bytes]:
+    """The five objects embedding a font subset: Type0 font, CIDFont, descriptor, font file and ToUnicode map"""
+    font = pdf_fonts()[key]
+    glyphs = sorted(used)
+    # Subsets are named with a tag derived from their glyphs, which keeps output deterministic
+    digest = hashlib.sha256(("%s:%s" % (key, glyphs)).encode()).digest()
+    name = b"%s+%s" % (bytes(65 + byte % 26 for byte in digest[:6]), FONT_FILES[key].rsplit(".", 1)[0].encode())
+    program = font.subset(glyphs)
+    compressed_program = zlib.compress(program, 6)
+    cmap = zlib.compress(to_unicode_cmap(used), 6)
+    widths = b" ".join(b"%d [%d]" % (glyph, round(font.advance(glyph))) for glyph in glyphs)
+    bbox = b" ".join(b"%d" % font.scaled(value) for value in font.bbox)
+    return [
+        b"<< /Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H /DescendantFonts [%d 0 R] "
+        b"/ToUnicode %d 0 R >>" % (name, first_id + 1, first_id + 4),
+        b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /%s "
+        b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+        b"/FontDescriptor %d 0 R /CIDToGIDMap /Identity /DW %d /W [%s] >>"
+        % (name, first_id + 2, round(font.advance(0)), widths),
+        b"<< /Type /FontDescriptor /FontName /%s /Flags 32 /FontBBox [%s] /ItalicAngle 0 /Ascent %d "
+        b"/Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>"
+        % (name, bbox, font.scaled(font.ascent), font.scaled(font.descent), font.scaled(font.ascent), first_id + 3),
+        b"<< /Length %d /Length1 %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+        % (len(compressed_program), len(program), compressed_program),
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(cmap), cmap),
+    ]
+
+
+def layout_pages(title: str, blocks: List[Block]) -> Tuple[List[bytes], Dict[str, Dict[int, str]]]:
+    """Content streams, one per page, and the glyphs each font drew (with their characters)"""
+    fonts = pdf_fonts()
+    used: Dict[str, Dict[int, str]] = {key: {} for key in FONT_FILES}
+    pages: List[List[bytes]] = [[]]
+    y = PAGE_HEIGHT - MARGIN
+    for kind, text in [("title", title), *blocks]:
+        font, size, leading, space_before, indent = PDF_STYLES[kind]
+        lines = wrap(text, font, size, PAGE_WIDTH - 2 * MARGIN - indent)
+        if pages[-1]:
+            y -= space_before
+        # Keep headings with the first line that follows them
+        needed = leading * (2 if kind.startswith("heading") else 1)
+        for index, line in enumerate(lines):
+            if y - (needed if index == 0 else leading) < MARGIN and pages[-1]:
+                pages.append([])
+                y = PAGE_HEIGHT - MARGIN
+            y -= leading
+            x = MARGIN + (indent if index or kind != BULLET else indent - 10)
+            text = show_text(fonts[font], line, used[font])
+            pages[-1].append(b"BT /%s %g Tf %g %g Td %s Tj ET" % (font.encode(), size, x, y, text))
+    return [b"\n".join(page) for page in pages], used
+
+
+def render_pdf(title: str, text: str) -> bytes:
+    streams, used = layout_pages(title, parse_blocks(text))
+    font_ids = {key: 3 + 5 * index for index, key in enumerate(FONT_FILES)}
+    first_page = 3 + 5 * len(FONT_FILES)
+    page_ids = [first_page + 2 * index for index in range(len(streams))]
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % id_ for id_ in page_ids), len(streams)),
+    ]
+    for key, font_id in font_ids.items():
+        objects.extend(font_objects(key, used[key], font_id))
+    resources = b" ".join(b"/%s %d 0 R" % (key.encode(), font_id) for key, font_id in font_ids.items())
+    for page_id, stream in zip(page_ids, streams):
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << %s >> >> "
+            b"/Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, resources, page_id + 1)
+        )
+        compressed = zlib.compress(stream, 6)
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(compressed), compressed))
+    objects.append(b"<< /Title %s /Producer (%s) >>" % (pdf_text(title), b"render " + RENDER_VERSION.encode()))
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, len(objects), xref
+    )
+    return bytes(output)
+
+
+# DOCX
+
+W_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+
+PACKAGE_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+DOCUMENT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+
+def docx_style(style_id: str, name: str, size_half_points: int, bold: bool = False,
+               space_before: int = 0, indent: int = 0) -> str:
+    return (
+        f'<w:style w:type="paragraph" w:styleId="{style_id}"><w:name w:val="{name}"/>'
+        '<w:basedOn w:val="Normal"/><w:qFormat/>'
+        f'<w:pPr><w:spacing w:before="{space_before}" w:after="80"/>'
+        + (f'<w:ind w:left="{indent}" w:hanging="200"/>' if indent else "")
+        + '</w:pPr><w:rPr>' + ("<w:b/>" if bold else "")
+        + f'<w:sz w:val="{size_half_points}"/></w:rPr></w:style>'
+    )
+
+
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<w:styles xmlns:w="{W_NAMESPACE}">'
+    '<w:docDefaults><w:rPrDefault><w:rPr>'
+    '<w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:cs="Calibri"/><w:sz w:val="22"/>'
+    '</w:rPr></w:rPrDefault><w:pPrDefault><w:pPr><w:spacing w:after="120"/></w:pPr></w:pPrDefault></w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>'
+    + docx_style("Title", "Title", 40, bold=True)
+    + docx_style("Heading1", "heading 1", 32, bold=True, space_before=280)
+    + docx_style("Heading2", "heading 2", 26, bold=True, space_before=240)
+    + docx_style("Heading3", "heading 3", 23, bold=True, space_before=200)
+    + docx_style("ListParagraph", "List Paragraph", 22, indent=360)
+    + '</w:styles>'
+)
+
+DOCX_STYLES = {
+    "title": "Title",
+    HEADING_1: "Heading1",
+    HEADING_2: "Heading2",
+    HEADING_3: "Heading3",
+    BULLET: "ListParagraph",
+    PARAGRAPH: "Normal",
+}
+
+# Fixed timestamps keep the archive identical for identical content
+ZIP_DATE = (2024, 1, 1, 0, 0, 0)
+
+
+def docx_paragraph(kind: str, text: str) -> str:
+    text = escape(XML_INVALID.sub("", text))
+    return (
+        f'<w:p><w:pPr><w:pStyle w:val="{DOCX_STYLES[kind]}"/></w:pPr>'
+        f'<w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+    )
+
+
+def render_docx(title: str, text: str) -> bytes:
+    body = "".join(docx_paragraph(kind, value) for kind, value in [("title", title), *parse_blocks(text)])
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<w:document xmlns:w="{W_NAMESPACE}"><w:body>{body}'
+        '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+        '<w:pgMar w:top="1440" w:right="1440" w:bottom="1440" w:left="1440" w:header="720" w:footer="720" w:gutter="0"/>'
+        '</w:sectPr></w:body></w:document>'
+    )
+    parts = [
+        ("[Content_Types].xml", CONTENT_TYPES_XML),
+        ("_rels/.rels", PACKAGE_RELS_XML),
+        ("word/_rels/document.xml.rels", DOCUMENT_RELS_XML),
+        ("word/styles.xml", STYLES_XML),
+        ("word/document.xml", document),
+    ]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in parts:
+            archive.writestr(zipfile.ZipInfo(name, ZIP_DATE), xml.encode("utf-8"), zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+RENDERERS: Dict[str, Callable[[str, str], bytes]] = {PDF: render_pdf, DOCX: render_docx}
+
+
+def render_to_file(fmt: str, title: str, text: str, path: str) -> int:
+    """Render ``text`` to ``path`` (atomically, so readers never see a partial file); returns its size.
+
+    Runs in a worker process, so the document never crosses back to the caller.
+    """
+    data = RENDERERS[fmt](title, text)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "wb") as handle:
+        handle.write(data)
+    os.replace(partial, path)
+    return len(data)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Recent latencies per key, for picking hedge delays from a percentile"""
+
+    def __init__(self, *, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, key: str, seconds: float):
+        self._samples[key].append(seconds)
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        """The pct-th percentile latency for key, or None until enough samples exist"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Fails calls fast while the recent error rate is too high.
+
+    Opens once ``failure_rate`` of the last ``window`` calls (and at least
+    ``min_calls``) failed. After ``cooldown`` seconds a single probe call is
+    let through; its outcome closes the breaker or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, *, failure_rate: float = 0.5, window: int = 50, min_calls: int = 20,
+                 cooldown: float = 30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.rejected = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"Circuit for {self.name} is {state}")
+
+    def record_success(self):
+        if self._state == self.HALF_OPEN:
+            logger.info(f"Circuit for {self.name} closed")
+            self._state = self.CLOSED
+            self._outcomes.clear()
+        self._probing = False
+        self._outcomes.append(True)
+
+    def abandon(self):
+        """Forget a call that ended without an outcome, e.g. because it was cancelled"""
+        self._probing = False
+
+    def record_failure(self):
+        self._probing = False
+        self._outcomes.append(False)
+        if self._state == self.HALF_OPEN or self._tripped():
+            if self._state != self.OPEN:
+                logger.warning(f"Circuit for {self.name} opened")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def _tripped(self) -> bool:
+        if len(self._outcomes) < self.min_calls:
+            return False
+        failures = sum(1 for ok in self._outcomes if not ok)
+        return failures / len(self._outcomes) >= self.failure_rate
+
+    def stats(self) -> Dict[str, Any]:
+        outcomes = len(self._outcomes)
+        return {
+            "state": self.state,
+            "error_rate": (outcomes - sum(self._outcomes)) / outcomes if outcomes else 0.0,
+            "rejected": self.rejected,
+        }
+
+
+async def hedged(call: Callable[[int], Awaitable[T]], delay: Optional[float], *,
+                 progressed: Optional[asyncio.Event] = None,
+                 can_hedge: Optional[Callable[[], Awaitable[bool]]] = None,
+                 on_hedge: Optional[Callable[[], None]] = None) -> Tuple[T, int]:
+    """Run ``call(0)``, and ``call(1)`` too if it has not finished after ``delay``.
+
+    Returns the first successful result and the index of the attempt that
+    produced it; the other attempt is cancelled. When ``progressed`` is set
+    before the delay (e.g. a stream produced its first token), or
+    ``can_hedge`` returns False, no hedge is sent. Raises the last error if
+    every attempt fails.
+    """
+    tasks = {asyncio.create_task(call(0)): 0}
+    try:
+        if delay is not None:
+            waiters = set(tasks)
+            progress_waiter = asyncio.create_task(progressed.wait()) if progressed else None
+            if progress_waiter:
+                waiters.add(progress_waiter)
+            done, _ = await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if progress_waiter:
+                progress_waiter.cancel()
+            if not done and (can_hedge is None or await can_hedge()):
+                if on_hedge:
+                    on_hedge()
+                tasks[asyncio.create_task(call(1))] = 1
+
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), tasks[task]
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
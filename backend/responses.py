@@ -0,0 +1,151 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import anyio
+import orjson
+from fastapi.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+
+class FastJSONResponse(Response):
+    """JSON for trusted documents (e.g. straight from Mongo), encoded by orjson
+    without going through a response model"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def etag_for(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names ``etag`` (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class StaticJSON:
+    """A response body encoded once, served with an ETag so clients can revalidate for free"""
+
+    def __init__(self, content: Any, *, max_age: int):
+        self.body = orjson.dumps(content)
+        self.etag = etag_for(self.body)
+        self.headers: Dict[str, str] = {"ETag": self.etag, "Cache-Control": f"public, max-age={max_age}"}
+
+    def response(self, if_none_match: Optional[str] = None) -> Response:
+        if etag_matches(if_none_match, self.etag):
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type="application/json", headers=self.headers)
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """The inclusive byte range a Range header asks for, or None to send the whole file.
+
+    Malformed and multi-range headers are ignored (the whole file is a valid
+    answer to those); ranges starting past the end raise RangeNotSatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start is None:
+        # Suffix range: the last ``end`` bytes
+        if end is None:
+            return None
+        if end <= 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - end), size - 1
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if end is None:
+        end = size - 1
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    """206 Partial Content for one byte range of a file"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: Path, start: int, end: int, size: int, *, headers: Mapping[str, str], media_type: str):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.status_code = 206
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+        })
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+
+def immutable_file_response(path: Path, request_headers: Mapping[str, str], *, etag: str, media_type: str,
+                            filename: str, accel_redirect: Optional[str] = None) -> Response:
+    """Serve a file that never changes once written (e.g. named by its content hash).
+
+    With ``accel_redirect`` the body is left to the fronting nginx
+    (``X-Accel-Redirect``), which sends it with sendfile and handles ranges
+    itself. Otherwise whole files go out through the server's zero-copy
+    ``pathsend`` extension where it has one, and single byte ranges are
+    answered with 206.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if etag_matches(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if accel_redirect:
+        return Response(headers={**headers, "X-Accel-Redirect": accel_redirect}, media_type=media_type)
+
+    stat_result = os.stat(path)
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if if_range and if_range != etag:
+        # The client's partial copy is of something else; send it all
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, stat_result.st_size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat_result.st_size}"})
+    if byte_range is not None:
+        start, end = byte_range
+        return FileRangeResponse(path, start, end, stat_result.st_size, headers=headers, media_type=media_type)
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
@@ -0,0 +1,44 @@
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Mapping
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(second|minute|hour|day)s?\s*$", re.IGNORECASE)
+_UNIT_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_delivery_time(text: str) -> timedelta:
+    """Turn a service's promised delivery time ('15 minutes') into a timedelta"""
+    match = _DURATION.match(text)
+    if not match:
+        raise ValueError(f"Unrecognised delivery time {text!r}")
+    amount, unit = match.groups()
+    return timedelta(seconds=float(amount) * _UNIT_SECONDS[unit.lower()])
+
+
+def delivery_deadline(delivery_time: str, start: datetime) -> datetime:
+    return start + parse_delivery_time(delivery_time)
+
+
+def parse_shares(value: str) -> Dict[str, float]:
+    """Parse 'business_plan=0.5,social_media=0.75' into per-kind concurrency shares"""
+    shares: Dict[str, float] = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        kind, _, share = item.partition("=")
+        shares[kind.strip()] = float(share)
+    return shares
+
+
+def concurrency_limits(shares: Mapping[str, float], concurrency: int) -> Dict[str, int]:
+    """Job slots each kind may hold in a worker of the given concurrency.
+
+    A share is the fraction of slots one kind may occupy; kinds without a
+    share (or with a share of 1) may use every slot. Each kind keeps at least
+    one slot so nothing is starved outright.
+    """
+    return {
+        kind: max(1, int(share * concurrency))
+        for kind, share in shares.items()
+        if share < 1
+    }
@@ -1,37 +1,68 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from contextlib import asynccontextmanager
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import logging
-from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Tuple, Union, Callable
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 import json
-import openai
-from openai import OpenAI
-import stripe
+import base64
+import re
 import asyncio
+import time
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+from model_router import ModelOption, ModelRouter, Route, parse_routes
+from resilience import CircuitOpenError
+from worker import Worker
+from order_stream import GenerationProgress, sse_event
+from pipeline import Pipeline, Step, StepContext
+from prompts import PROMPTS, Prompt
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, http_request_seconds, llm_cached_prompt_tokens, llm_completion_tokens,
+    llm_failures, llm_prompt_tokens, llm_request_seconds, order_status_seconds, registry as metrics_registry,
+)
+from bulk_import import parse_bulk_rows
+from scheduler import concurrency_limits, delivery_deadline
+from payments import PaymentError, WebhookSignatureError, verify_webhook
+from artifacts import MEDIA_TYPES as ARTIFACT_MEDIA_TYPES
+from render import pdf_fonts
+from responses import FastJSONResponse, StaticJSON, immutable_file_response
+from services import Services
+from settings import get_settings
+from svg import InvalidSVG, extract_svg, sanitize_svg
+
+if TYPE_CHECKING:
+    from llm_gateway import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+# Configuration is read here; clients (Mongo, OpenAI, Stripe) are only built
+# when first used, see services.py
+settings = get_settings()
+services = Services(settings)
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+STREAM_CHECKPOINT_INTERVAL = settings.stream_checkpoint_interval
+STREAM_POLL_INTERVAL = settings.stream_poll_interval
+STREAM_KEEPALIVE_SECONDS = 15.0
 
-# OpenAI setup
-openai_client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+# Bulk (B2B) uploads: each batch's jobs run at a lower priority and share a
+# concurrency limit so one large upload cannot starve regular orders
+BULK_MAX_ROWS = settings.bulk_max_rows
+BULK_DEFAULT_CONCURRENCY = settings.bulk_default_concurrency
+BULK_MAX_CONCURRENCY = settings.bulk_max_concurrency
+BULK_JOB_PRIORITY = -1
 
-# Stripe setup
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+# Deadline scheduling: jobs run earliest-deadline-first, and each service may
+# hold at most its share of a worker's slots (unlisted services: all of them)
+SERVICE_CONCURRENCY_SHARES = settings.service_concurrency_shares
+SLA_RISK_WINDOW_SECONDS = settings.sla_risk_window_seconds
 
-# Create the main app without a prefix
-app = FastAPI(title="AI Service Arbitrage Platform", version="1.0.0")
+STRIPE_WEBHOOK_SECRET = settings.stripe_webhook_secret
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -44,6 +75,7 @@ class ServiceType(str, Enum):
     LOGO_DESIGN = "logo_design"
 
 class OrderStatus(str, Enum):
+    AWAITING_PAYMENT = "awaiting_payment"
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
@@ -72,6 +104,13 @@ class OrderRequest(BaseModel):
     service_type: ServiceType
     requirements: Dict[str, Any]
     payment_method_id: Optional[str] = None
+    bypass_cache: bool = False
+
+class ContentRef(BaseModel):
+    storage: str
+    sha256: str
+    size: int
+    keys: Dict[str, Optional[int]]
 
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -81,11 +120,69 @@ class Order(BaseModel):
     status: OrderStatus = OrderStatus.PENDING
     price: float
     payment_intent_id: Optional[str] = None
+    order_reference: Optional[str] = None
+    # Unique: the Idempotency-Key an order was created with, or the payment intent it was created for
+    idempotency_key: Optional[str] = None
+    bypass_cache: bool = False
     generated_content: Optional[Dict[str, Any]] = None
+    content_ref: Optional[ContentRef] = None
+    # Model that served each generation step (empty when served from the cache)
+    models_used: Optional[Dict[str, str]] = None
     delivery_urls: Optional[List[str]] = None
+    # Rendered files per document and format (artifact keys), served by delivery_urls
+    artifacts: Optional[Dict[str, Dict[str, str]]] = None
+    batch_id: Optional[str] = None
+    batch_row: Optional[int] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    status_changed_at: Optional[datetime] = None
+    deadline: Optional[datetime] = None
+    paid_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+class OrderSummary(BaseModel):
+    id: str
+    customer_id: str
+    service_type: ServiceType
+    status: OrderStatus
+    price: float
+    created_at: datetime
+    deadline: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
+class OrderPage(BaseModel):
+    orders: List[Union[Order, OrderSummary]]
+    next_cursor: Optional[str] = None
+
+ORDER_SUMMARY_PROJECTION = {field: 1 for field in OrderSummary.model_fields}
+ORDER_SUMMARY_PROJECTION["_id"] = 0
+ORDER_PROJECTION = {"_id": 0, **{field: 1 for field in Order.model_fields}}
+ORDER_STATUS_PROJECTION = {field: value for field, value in ORDER_PROJECTION.items() if field != "generated_content"}
+
+def model_defaults(model: type) -> Dict[str, Any]:
+    """Plain defaults of a model's optional fields, to complete documents served without the model"""
+    return {
+        name: field.default for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+# The read endpoints serve documents as stored: they are written through the
+# models, and the projections keep out anything the models do not declare
+ORDER_DEFAULTS = model_defaults(Order)
+ORDER_SUMMARY_DEFAULTS = model_defaults(OrderSummary)
+
+class OrderBatch(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    customer_id: str
+    service_type: ServiceType
+    total: int
+    concurrency: int
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BatchProgress(BaseModel):
+    batch: OrderBatch
+    counts: Dict[str, int]
+    finished: bool
+
 # Service configurations with pricing
 SERVICE_CONFIGS = {
     ServiceType.RESUME: ServiceConfig(
@@ -139,7 +236,7 @@ SERVICE_CONFIGS = {
         delivery_time="25 minutes",
         features=[
             "5 unique logo concepts",
-            "Vector files (SVG, AI)",
+            "Vector files (SVG)",
             "PNG files (various sizes)",
             "Brand color palette",
             "Typography recommendations"
@@ -147,301 +244,749 @@ SERVICE_CONFIGS = {
     )
 }
 
+# The catalog is fixed for the life of the process, so it is encoded once
+SERVICE_CATALOG = StaticJSON(
+    [config.model_dump(mode="json") for config in SERVICE_CONFIGS.values()],
+    max_age=settings.catalog_max_age_seconds,
+)
+SERVICE_CATALOG_ENTRIES = {
+    service_type: StaticJSON(config.model_dump(mode="json"), max_age=settings.catalog_max_age_seconds)
+    for service_type, config in SERVICE_CONFIGS.items()
+}
+
+def order_deadline(service_type: ServiceType, start: datetime) -> datetime:
+    """When the order's content is due, per the service's promised delivery time"""
+    return delivery_deadline(SERVICE_CONFIGS[service_type].delivery_time, start)
+
+# Generation parameters. Bump a service's template version whenever its
+# prompts change so cached output from the old prompts is not reused.
+LLM_MODEL = "gpt-3.5-turbo"
+
+# Models each prompt step may use (keys: "default", "{service}" or
+# "{service}.{step}"), with prices in USD per 1k tokens for routing by cost.
+# LLM_ROUTES (JSON) overrides individual entries.
+MODEL_OPTIONS = {
+    "gpt-4o-mini": ModelOption("gpt-4o-mini", 0.00015, 0.0006),
+    "gpt-3.5-turbo": ModelOption("gpt-3.5-turbo", 0.0005, 0.0015),
+    "gpt-4o": ModelOption("gpt-4o", 0.0025, 0.01),
+}
+
+MODEL_ROUTES = {
+    "default": Route([LLM_MODEL], fallbacks=["gpt-4o-mini"]),
+    "resume.cover_letter": Route(["gpt-4o-mini", LLM_MODEL]),
+    ServiceType.BUSINESS_PLAN.value: Route(["gpt-4o"], fallbacks=[LLM_MODEL]),
+    **parse_routes(settings.llm_routes),
+}
+
+model_router = ModelRouter(
+    MODEL_OPTIONS,
+    MODEL_ROUTES,
+    latency_value_per_second=settings.llm_latency_value_per_second,
+    # Nothing has failed on a gateway that has not been built yet
+    available=lambda model: not services.built("llm_gateway") or services.llm_gateway.available(model),
+)
+
+GENERATION_TEMPERATURES = {
+    ServiceType.RESUME: 0.7,
+    ServiceType.BUSINESS_PLAN: 0.6,
+    ServiceType.SOCIAL_MEDIA: 0.8,
+    ServiceType.LOGO_DESIGN: 0.7,
+}
+
 # AI Content Generation Functions
-async def generate_resume_content(requirements: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate resume and cover letter using OpenAI"""
-    
-    name = requirements.get('name', 'John Doe')
-    email = requirements.get('email', 'john@example.com')
-    phone = requirements.get('phone', '+44 123 456 7890')
+async def call_model(model: str, messages: List[Dict[str, Any]], *, max_tokens: int, temperature: float,
+                     on_delta=None, latency_key: str, prompt_tokens: Optional[int] = None) -> "LLMResponse":
+    if on_delta is not None:
+        return await services.llm_gateway.stream(
+            messages,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            on_delta=on_delta,
+            latency_key=latency_key,
+            prompt_tokens=prompt_tokens
+        )
+    return await services.llm_gateway.complete(
+        messages,
+        model=model,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        latency_key=latency_key,
+        prompt_tokens=prompt_tokens
+    )
+
+async def run_completion(prompt: Prompt, *, service_type: ServiceType, max_tokens: int,
+                         temperature: float, on_delta: Optional[Callable[[str], None]] = None,
+                         stream_key: str) -> str:
+    """Run one generation step's prompt on the model the router picks, streaming through on_delta when given.
+
+    A failed model falls through to the router's next candidate, unless it
+    already streamed part of its output (the step retry or job retry starts over).
+    """
+    streamed = []
+    if on_delta is not None:
+        writer = on_delta
+
+        def on_delta(text: str):
+            streamed.append(text)
+            writer(text)
+
+    candidates = model_router.candidates(
+        service_type.value, stream_key, prompt_tokens=prompt.prompt_tokens, max_tokens=max_tokens
+    )
+    for model in candidates:
+        started = time.monotonic()
+        try:
+            response = await call_model(
+                model, prompt.messages, max_tokens=max_tokens, temperature=temperature,
+                on_delta=on_delta, latency_key=f"{stream_key}:{model}", prompt_tokens=prompt.prompt_tokens
+            )
+        except (CircuitOpenError, *services.llm_gateway.call_errors) as e:
+            model_router.record_failure(model)
+            llm_failures.inc(1.0, service_type.value, model)
+            if streamed or model == candidates[-1]:
+                raise
+            logger.warning(f"Model {model} failed for {service_type.value}.{stream_key}, falling back: {str(e)}")
+            continue
+
+        elapsed = time.monotonic() - started
+        model_router.record_success(model, elapsed, response.completion_tokens)
+        llm_request_seconds.observe(elapsed, service_type.value, stream_key, response.model)
+        llm_prompt_tokens.observe(response.prompt_tokens, service_type.value, response.model)
+        llm_cached_prompt_tokens.observe(response.cached_prompt_tokens, service_type.value, response.model)
+        llm_completion_tokens.observe(response.completion_tokens, service_type.value, response.model)
+        model_router.record_served(stream_key, response.model)
+        return response.content
+
+# Service pipelines. Each step is one prompt; steps without dependencies on
+# each other run concurrently. Services listed in GENERATION_FANOUT_SERVICES
+# use the section fan-out pipelines below instead of one long call.
+FANOUT_SERVICES = set(settings.generation_fanout_services)
+
+# Order fields shared by several prompts; the templates themselves are in prompts.py
+def listed(value: Union[str, List[Any]]) -> str:
+    """A list requirement as prompt text; API clients may also send a plain string"""
+    if isinstance(value, str):
+        return value
+    return ", ".join(str(item) for item in value)
+
+def business_details(requirements: Dict[str, Any]) -> str:
+    return (
+        f"Business: {requirements.get('business_name', 'My Business')}\n"
+        f"Industry: {requirements.get('industry', 'Technology')}\n"
+        f"Business Type: {requirements.get('business_type', 'Service')}\n"
+        f"Target Market: {requirements.get('target_market', 'Small businesses')}\n"
+        f"Initial Investment: {requirements.get('initial_investment', '£10,000')}"
+    )
+
+def social_media_details(requirements: Dict[str, Any]) -> str:
+    platforms = listed(requirements.get('platforms', ['Instagram', 'LinkedIn', 'Twitter']))
+    return (
+        f"Business Type: {requirements.get('business_type', 'General Business')}\n"
+        f"Target Audience: {requirements.get('target_audience', 'Young professionals')}\n"
+        f"Platforms: {platforms}\n"
+        f"Tone: {requirements.get('tone', 'Professional but friendly')}"
+    )
+
+async def resume_step(step: StepContext) -> str:
+    """Generate the resume"""
+    requirements = step.requirements
+    return await run_completion(
+        PROMPTS.render(
+            ServiceType.RESUME, "resume",
+            name=requirements.get('name', 'John Doe'),
+            email=requirements.get('email', 'john@example.com'),
+            phone=requirements.get('phone', '+44 123 456 7890'),
+            industry=requirements.get('industry', 'Technology'),
+            role=requirements.get('target_role', 'Software Developer'),
+            experience=requirements.get('experience', 'Mid-level'),
+            skills=listed(requirements.get('skills', 'Python, JavaScript, React')),
+            education=requirements.get('education', 'Computer Science Degree'),
+            work_history=requirements.get('work_history', 'Software Developer at Tech Corp'),
+        ),
+        max_tokens=2000,
+        temperature=GENERATION_TEMPERATURES[ServiceType.RESUME],
+        service_type=ServiceType.RESUME,
+        on_delta=step.on_delta,
+        stream_key=step.name
+    )
+
+async def cover_letter_step(step: StepContext) -> str:
+    """Generate the cover letter (independent of the resume output)"""
+    requirements = step.requirements
+    return await run_completion(
+        PROMPTS.render(
+            ServiceType.RESUME, "cover_letter",
+            name=requirements.get('name', 'John Doe'),
+            industry=requirements.get('industry', 'Technology'),
+            role=requirements.get('target_role', 'Software Developer'),
+        ),
+        max_tokens=1000,
+        temperature=GENERATION_TEMPERATURES[ServiceType.RESUME],
+        service_type=ServiceType.RESUME,
+        on_delta=step.on_delta,
+        stream_key=step.name
+    )
+
+def assemble_resume(requirements: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
     industry = requirements.get('industry', 'Technology')
     role = requirements.get('target_role', 'Software Developer')
-    experience = requirements.get('experience', 'Mid-level')
-    skills = requirements.get('skills', 'Python, JavaScript, React')
-    education = requirements.get('education', 'Computer Science Degree')
-    work_history = requirements.get('work_history', 'Software Developer at Tech Corp')
-    
-    # Generate resume
-    resume_prompt = f"""
-    Create a professional, ATS-optimized resume for {name} targeting a {role} position in the {industry} industry.
-    
-    Personal Details:
-    - Name: {name}
-    - Email: {email}
-    - Phone: {phone}
-    - Experience Level: {experience}
-    - Key Skills: {skills}
-    - Education: {education}
-    - Work History: {work_history}
-    
-    Format the resume in a clean, professional structure with:
-    1. Professional Summary (3-4 lines)
-    2. Key Skills (bullet points)
-    3. Professional Experience (with achievements and metrics)
-    4. Education
-    5. Additional sections as relevant
-    
-    Make it keyword-rich for ATS systems and compelling for human readers.
-    """
-    
-    try:
-        resume_response = await asyncio.to_thread(
-            openai_client.chat.completions.create,
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert resume writer and career coach with 10+ years of experience helping people land their dream jobs."},
-                {"role": "user", "content": resume_prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.7
-        )
-        
-        resume_content = resume_response.choices[0].message.content
-        
-        # Generate cover letter
-        cover_letter_prompt = f"""
-        Create a compelling cover letter for {name} applying for a {role} position in the {industry} industry.
-        
-        Use the same personal details and work history from the resume.
-        Make it:
-        - Personalized and engaging
-        - Highlighting key achievements
-        - Showing enthusiasm for the role
-        - Professional but conversational tone
-        - 3-4 paragraphs maximum
-        """
-        
-        cover_letter_response = await asyncio.to_thread(
-            openai_client.chat.completions.create,
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert career coach specializing in compelling cover letters that get interviews."},
-                {"role": "user", "content": cover_letter_prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
-        
-        cover_letter_content = cover_letter_response.choices[0].message.content
-        
-        return {
-            "resume": resume_content,
-            "cover_letter": cover_letter_content,
-            "linkedin_tips": f"Optimize your LinkedIn profile for {role} roles by including these keywords: {skills}. Update your headline to '{role} | {industry} Professional' and ensure your summary matches your resume's professional summary."
-        }
-        
-    except Exception as e:
-        logger.error(f"Error generating resume content: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating resume: {str(e)}")
+    skills = listed(requirements.get('skills', 'Python, JavaScript, React'))
+    return {
+        "resume": results["resume"],
+        "cover_letter": results["cover_letter"],
+        "linkedin_tips": f"Optimize your LinkedIn profile for {role} roles by including these keywords: {skills}. Update your headline to '{role} | {industry} Professional' and ensure your summary matches your resume's professional summary."
+    }
+
+async def business_plan_step(step: StepContext) -> str:
+    """Generate the comprehensive business plan"""
+    return await run_completion(
+        PROMPTS.render(ServiceType.BUSINESS_PLAN, "business_plan", business_details=business_details(step.requirements)),
+        max_tokens=3000,
+        temperature=GENERATION_TEMPERATURES[ServiceType.BUSINESS_PLAN],
+        service_type=ServiceType.BUSINESS_PLAN,
+        on_delta=step.on_delta,
+        stream_key=step.name
+    )
 
-async def generate_business_plan(requirements: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate comprehensive business plan using OpenAI"""
-    
+def assemble_business_plan(requirements: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
     business_name = requirements.get('business_name', 'My Business')
     industry = requirements.get('industry', 'Technology')
-    business_type = requirements.get('business_type', 'Service')
     target_market = requirements.get('target_market', 'Small businesses')
     initial_investment = requirements.get('initial_investment', '£10,000')
-    
-    business_plan_prompt = f"""
-    Create a comprehensive business plan for "{business_name}" in the {industry} industry.
-    
-    Business Details:
-    - Business Type: {business_type}
-    - Target Market: {target_market}
-    - Initial Investment: {initial_investment}
-    
-    Include these sections:
-    1. Executive Summary
-    2. Company Description
-    3. Market Analysis
-    4. Organization & Management
-    5. Marketing & Sales Strategy
-    6. Financial Projections (3 years)
-    7. Risk Analysis
-    8. Implementation Timeline
-    
-    Make it professional, detailed, and investor-ready with realistic financial projections in GBP.
-    """
-    
-    try:
-        response = await asyncio.to_thread(
-            openai_client.chat.completions.create,
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a seasoned business consultant and MBA with expertise in creating winning business plans that secure funding."},
-                {"role": "user", "content": business_plan_prompt}
-            ],
-            max_tokens=3000,
-            temperature=0.6
-        )
-        
-        return {
-            "business_plan": response.choices[0].message.content,
-            "executive_summary": f"Executive Summary for {business_name} - targeting {target_market} in the {industry} sector with {initial_investment} initial investment."
-        }
-        
-    except Exception as e:
-        logger.error(f"Error generating business plan: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating business plan: {str(e)}")
+    return {
+        "business_plan": results["business_plan"],
+        "executive_summary": f"Executive Summary for {business_name} - targeting {target_market} in the {industry} sector with {initial_investment} initial investment."
+    }
 
-async def generate_social_media_content(requirements: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate social media content package using OpenAI"""
-    
+async def content_calendar_step(step: StepContext) -> str:
+    """Generate the 30-day social media content calendar"""
+    return await run_completion(
+        PROMPTS.render(ServiceType.SOCIAL_MEDIA, "content_calendar", details=social_media_details(step.requirements)),
+        max_tokens=2500,
+        temperature=GENERATION_TEMPERATURES[ServiceType.SOCIAL_MEDIA],
+        service_type=ServiceType.SOCIAL_MEDIA,
+        on_delta=step.on_delta,
+        stream_key=step.name
+    )
+
+def assemble_social_media(requirements: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
     business_type = requirements.get('business_type', 'General Business')
     target_audience = requirements.get('target_audience', 'Young professionals')
-    platforms = requirements.get('platforms', ['Instagram', 'LinkedIn', 'Twitter'])
-    tone = requirements.get('tone', 'Professional but friendly')
-    
-    content_prompt = f"""
-    Create a 30-day social media content calendar for a {business_type} targeting {target_audience}.
-    
-    Platforms: {', '.join(platforms)}
-    Tone: {tone}
-    
-    For each day, provide:
-    1. Post idea/topic
-    2. Caption (platform-optimized)
-    3. Relevant hashtags
-    4. Best posting time
-    5. Engagement strategy
-    
-    Include a mix of:
-    - Educational content (40%)
-    - Behind-the-scenes (20%)
-    - User-generated content ideas (20%)
-    - Promotional content (20%)
-    
-    Make it actionable and engaging.
-    """
-    
-    try:
-        response = await asyncio.to_thread(
-            openai_client.chat.completions.create,
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a social media marketing expert with proven success in viral content creation and audience engagement."},
-                {"role": "user", "content": content_prompt}
-            ],
-            max_tokens=2500,
-            temperature=0.8
-        )
-        
-        return {
-            "content_calendar": response.choices[0].message.content,
-            "bonus_tips": f"For {business_type} targeting {target_audience}, focus on authentic storytelling and consistent engagement. Post during peak hours for your audience timezone."
-        }
-        
-    except Exception as e:
-        logger.error(f"Error generating social media content: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating social media content: {str(e)}")
+    return {
+        "content_calendar": results["content_calendar"],
+        "bonus_tips": f"For {business_type} targeting {target_audience}, focus on authentic storytelling and consistent engagement. Post during peak hours for your audience timezone."
+    }
+
+def logo_brief(requirements: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "business_name": requirements.get('business_name', 'My Business'),
+        "industry": requirements.get('industry', 'Technology'),
+        "style": requirements.get('style', 'Modern and clean'),
+        "colors": requirements.get('preferred_colors', 'Blue and white'),
+    }
+
+async def logo_concepts_step(step: StepContext) -> str:
+    """Generate logo concepts and brand guidelines"""
+    return await run_completion(
+        PROMPTS.render(ServiceType.LOGO_DESIGN, "logo_concepts", **logo_brief(step.requirements)),
+        max_tokens=2000,
+        temperature=GENERATION_TEMPERATURES[ServiceType.LOGO_DESIGN],
+        service_type=ServiceType.LOGO_DESIGN,
+        on_delta=step.on_delta,
+        stream_key=step.name
+    )
+
+LOGO_CONCEPT_HEADING = re.compile(r"^#{2,4}\s*Concept\s+(\d+)\s*[:.\-\u2013\u2014]?\s*(.*)$", re.MULTILINE | re.IGNORECASE)
+
+async def logo_svgs_step(step: StepContext) -> List[Dict[str, str]]:
+    """Draw the concepts from ``logo_concepts`` as SVG; only concepts that survive sanitizing are kept"""
+    text = await run_completion(
+        PROMPTS.render(
+            ServiceType.LOGO_DESIGN, "logo_svgs",
+            **logo_brief(step.requirements), concepts=step.inputs["logo_concepts"]
+        ),
+        max_tokens=4000,
+        temperature=GENERATION_TEMPERATURES[ServiceType.LOGO_DESIGN],
+        service_type=ServiceType.LOGO_DESIGN,
+        stream_key=step.name
+    )
+    concepts = []
+    for number, (name, description, markup) in enumerate(split_logo_concepts(text), start=1):
+        try:
+            concepts.append({"name": name, "description": description, "svg": sanitize_svg(markup)})
+        except InvalidSVG as e:
+            logger.warning(f"Dropping logo concept {number} ({name}): {e}")
+    if not concepts:
+        # Fails the step so it is retried
+        raise ValueError("no valid SVG logo concepts in model output")
+    return concepts
+
+def split_logo_concepts(text: str) -> List[Tuple[str, str, str]]:
+    """(name, description, svg markup) for each '### Concept N' block in text that contains an <svg>"""
+    matches = list(LOGO_CONCEPT_HEADING.finditer(text))
+    concepts = []
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        block = text[match.end():end]
+        markup = extract_svg(block)
+        if markup is None:
+            continue
+        description = block[:block.find(markup)].replace("```svg", "").replace("```xml", "").replace("```", "")
+        name = match.group(2).strip().strip("*").strip() or f"Concept {match.group(1)}"
+        concepts.append((name, " ".join(description.split()), markup))
+    return concepts
 
-async def generate_logo_concepts(requirements: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate logo concepts and brand guidelines using OpenAI"""
-    
+def assemble_logo_design(requirements: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
     business_name = requirements.get('business_name', 'My Business')
     industry = requirements.get('industry', 'Technology')
     style = requirements.get('style', 'Modern and clean')
-    colors = requirements.get('preferred_colors', 'Blue and white')
-    
-    logo_prompt = f"""
-    Create detailed logo concepts and brand guidelines for "{business_name}" in the {industry} industry.
-    
-    Requirements:
-    - Style: {style}
-    - Preferred Colors: {colors}
-    - Industry: {industry}
-    
-    Provide:
-    1. 5 distinct logo concepts with detailed descriptions
-    2. Brand color palette with hex codes
-    3. Typography recommendations
-    4. Logo usage guidelines
-    5. Brand personality and voice guidelines
-    
-    Make each concept unique and industry-appropriate.
+    return {
+        "logo_concepts": results["logo_concepts"],
+        "logo_svgs": results["logo_svgs"],
+        "brand_guidelines": f"Brand guidelines for {business_name} - emphasizing {style} design approach in the {industry} sector.",
+        "file_formats": "You will receive: SVG (vector) and PNG (transparent background) files for each concept, in favicon, social media and print sizes"
+    }
+
+# Fan-out (map/reduce) variants for long documents: an outline step fixes the
+# shared facts, sections or day ranges are generated in parallel from it, and
+# a final pass makes the whole consistent before it is assembled in order.
+BUSINESS_PLAN_SECTIONS = [
+    ("company_description", "Company Description", "Mission, legal structure, products or services and what sets the business apart."),
+    ("market_analysis", "Market Analysis", "Market size, trends, customer segments and competitors, with UK figures where possible."),
+    ("organization_management", "Organization & Management", "Team, roles, hiring plan and advisers."),
+    ("marketing_sales", "Marketing & Sales Strategy", "Positioning, pricing, channels, sales process and customer acquisition costs."),
+    ("financial_projections", "Financial Projections (3 years)", "Revenue, costs, gross margin, cash flow and break-even for years 1-3 in GBP, as tables."),
+    ("risk_analysis", "Risk Analysis", "Key risks with likelihood, impact and mitigation."),
+    ("implementation_timeline", "Implementation Timeline", "Quarter-by-quarter milestones for the first two years."),
+]
+
+async def business_plan_outline_step(step: StepContext) -> str:
+    """Shared brief every section is written from, so figures and positioning agree"""
+    return await run_completion(
+        PROMPTS.render(ServiceType.BUSINESS_PLAN, "outline", business_details=business_details(step.requirements)),
+        max_tokens=600,
+        temperature=GENERATION_TEMPERATURES[ServiceType.BUSINESS_PLAN],
+        service_type=ServiceType.BUSINESS_PLAN,
+        stream_key=step.name
+    )
+
+def business_plan_section_step(number: int, title: str, guidance: str):
+    async def section_step(step: StepContext) -> str:
+        return await run_completion(
+            PROMPTS.render(
+                ServiceType.BUSINESS_PLAN, "section",
+                business_details=business_details(step.requirements),
+                outline=step.inputs["outline"],
+                number=number,
+                title=title,
+                guidance=guidance,
+            ),
+            max_tokens=900,
+            temperature=GENERATION_TEMPERATURES[ServiceType.BUSINESS_PLAN],
+            service_type=ServiceType.BUSINESS_PLAN,
+            on_delta=step.on_delta,
+            stream_key=step.name
+        )
+    return section_step
+
+async def business_plan_summary_step(step: StepContext) -> str:
+    """Consistency pass: the executive summary is written last, from the finished sections"""
+    sections = "\n\n".join(
+        step.inputs[name][:1500] for name, _, _ in BUSINESS_PLAN_SECTIONS
+    )
+    return await run_completion(
+        PROMPTS.render(
+            ServiceType.BUSINESS_PLAN, "executive_summary",
+            business_details=business_details(step.requirements),
+            sections=sections,
+        ),
+        max_tokens=600,
+        temperature=GENERATION_TEMPERATURES[ServiceType.BUSINESS_PLAN],
+        service_type=ServiceType.BUSINESS_PLAN,
+        on_delta=step.on_delta,
+        stream_key=step.name
+    )
+
+def assemble_business_plan_sections(requirements: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
+    sections = [results["executive_summary"]] + [results[name] for name, _, _ in BUSINESS_PLAN_SECTIONS]
+    return {
+        "business_plan": "\n\n".join(section.strip() for section in sections),
+        "executive_summary": results["executive_summary"].strip()
+    }
+
+CALENDAR_DAY_RANGES = [(1, 6), (7, 12), (13, 18), (19, 24), (25, 30)]
+CALENDAR_DAY_HEADING = re.compile(r"^#+\s*Day\s+(\d+)\b", re.IGNORECASE | re.MULTILINE)
+
+def calendar_days_prompt(requirements: Dict[str, Any], outline: str, days: List[int]) -> Prompt:
+    return PROMPTS.render(
+        ServiceType.SOCIAL_MEDIA, "days",
+        details=social_media_details(requirements),
+        outline=outline,
+        days=", ".join(str(day) for day in days),
+    )
+
+async def calendar_outline_step(step: StepContext) -> str:
+    """Shared plan for the month so the parallel day ranges fit together"""
+    return await run_completion(
+        PROMPTS.render(ServiceType.SOCIAL_MEDIA, "outline", details=social_media_details(step.requirements)),
+        max_tokens=600,
+        temperature=GENERATION_TEMPERATURES[ServiceType.SOCIAL_MEDIA],
+        service_type=ServiceType.SOCIAL_MEDIA,
+        stream_key=step.name
+    )
+
+def calendar_days_step(first: int, last: int):
+    async def days_step(step: StepContext) -> str:
+        return await run_completion(
+            calendar_days_prompt(step.requirements, step.inputs["outline"], list(range(first, last + 1))),
+            max_tokens=900,
+            temperature=GENERATION_TEMPERATURES[ServiceType.SOCIAL_MEDIA],
+            service_type=ServiceType.SOCIAL_MEDIA,
+            on_delta=step.on_delta,
+            stream_key=step.name
+        )
+    return days_step
+
+def calendar_range_name(first: int, last: int) -> str:
+    return f"days_{first}_{last}"
+
+def split_calendar_days(text: str) -> Dict[int, str]:
+    """Map each '### Day N' block in text to its day number (first occurrence wins)"""
+    matches = list(CALENDAR_DAY_HEADING.finditer(text))
+    days: Dict[int, str] = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        days.setdefault(int(match.group(1)), text[match.start():end].strip())
+    return days
+
+async def calendar_gaps_step(step: StepContext) -> str:
+    """Consistency pass: regenerate any days the ranges skipped or were cut off before"""
+    found: Dict[int, str] = {}
+    for first, last in CALENDAR_DAY_RANGES:
+        found.update(split_calendar_days(step.inputs[calendar_range_name(first, last)]))
+    missing = [day for day in range(1, 31) if day not in found]
+    if not missing:
+        return ""
+    logger.info(f"Filling {len(missing)} missing calendar days: {missing}")
+    return await run_completion(
+        calendar_days_prompt(step.requirements, step.inputs["outline"], missing),
+        max_tokens=min(2500, 150 * len(missing) + 200),
+        temperature=GENERATION_TEMPERATURES[ServiceType.SOCIAL_MEDIA],
+        service_type=ServiceType.SOCIAL_MEDIA,
+        on_delta=step.on_delta,
+        stream_key=step.name
+    )
+
+def assemble_calendar_days(requirements: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
+    parts = [results[calendar_range_name(first, last)] for first, last in CALENDAR_DAY_RANGES] + [results["gaps"]]
+    days: Dict[int, str] = {}
+    for part in parts:
+        for day, text in split_calendar_days(part).items():
+            days.setdefault(day, text)
+    # Without recognisable day headings keep the ranges as written
+    calendar = "\n\n".join(days[day] for day in sorted(days)) if days else "\n\n".join(part.strip() for part in parts if part)
+    return assemble_social_media(requirements, {"content_calendar": calendar})
+
+BUSINESS_PLAN_FANOUT = Pipeline(
+    "business_plan_sections",
+    [
+        Step("outline", business_plan_outline_step, timeout=60, retries=1, stream=False),
+        *[
+            Step(name, business_plan_section_step(number, title, guidance), depends_on=("outline",), timeout=90, retries=1)
+            for number, (name, title, guidance) in enumerate(BUSINESS_PLAN_SECTIONS, start=2)
+        ],
+        Step(
+            "executive_summary", business_plan_summary_step,
+            depends_on=tuple(name for name, _, _ in BUSINESS_PLAN_SECTIONS), timeout=60, retries=1
+        ),
+    ],
+    assemble_business_plan_sections,
+)
+
+SOCIAL_MEDIA_FANOUT = Pipeline(
+    "social_media_day_ranges",
+    [
+        Step("outline", calendar_outline_step, timeout=60, retries=1, stream=False),
+        *[
+            Step(calendar_range_name(first, last), calendar_days_step(first, last), depends_on=("outline",), timeout=90, retries=1)
+            for first, last in CALENDAR_DAY_RANGES
+        ],
+        Step(
+            "gaps", calendar_gaps_step,
+            depends_on=("outline", *(calendar_range_name(first, last) for first, last in CALENDAR_DAY_RANGES)),
+            timeout=90, retries=1
+        ),
+    ],
+    assemble_calendar_days,
+)
+
+PIPELINES = {
+    ServiceType.RESUME: Pipeline(
+        ServiceType.RESUME.value,
+        [
+            Step("resume", resume_step, timeout=120, retries=1),
+            Step("cover_letter", cover_letter_step, timeout=90, retries=1),
+        ],
+        assemble_resume,
+    ),
+    ServiceType.BUSINESS_PLAN: BUSINESS_PLAN_FANOUT if ServiceType.BUSINESS_PLAN.value in FANOUT_SERVICES else Pipeline(
+        ServiceType.BUSINESS_PLAN.value,
+        [Step("business_plan", business_plan_step, timeout=240, retries=1)],
+        assemble_business_plan,
+    ),
+    ServiceType.SOCIAL_MEDIA: SOCIAL_MEDIA_FANOUT if ServiceType.SOCIAL_MEDIA.value in FANOUT_SERVICES else Pipeline(
+        ServiceType.SOCIAL_MEDIA.value,
+        [Step("content_calendar", content_calendar_step, timeout=180, retries=1)],
+        assemble_social_media,
+    ),
+    ServiceType.LOGO_DESIGN: Pipeline(
+        ServiceType.LOGO_DESIGN.value,
+        [
+            Step("logo_concepts", logo_concepts_step, timeout=120, retries=1),
+            Step("logo_svgs", logo_svgs_step, depends_on=("logo_concepts",), timeout=150, retries=1, stream=False),
+        ],
+        assemble_logo_design,
+    ),
+}
+
+def generation_version(service_type: ServiceType) -> str:
+    """Everything besides requirements that determines a service's output"""
+    return json.dumps({
+        "template_version": PROMPTS.version(service_type),
+        "pipeline": PIPELINES[service_type].name,
+        "routes": model_router.signature(service_type.value),
+        "temperature": GENERATION_TEMPERATURES[service_type],
+    }, sort_keys=True)
+
+async def generate_content(service_type: ServiceType, requirements: Dict[str, Any],
+                           progress: Optional[GenerationProgress] = None, bypass_cache: bool = False) -> Dict[str, Any]:
+    """Run the service's pipeline, serving repeat requirements from the generation cache.
+
+    Concurrent generations of the same requirements (e.g. a retried order
+    whose first job is still running) share one run, see GenerationLeases.
     """
-    
-    try:
-        response = await asyncio.to_thread(
-            openai_client.chat.completions.create,
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a senior brand designer with 15+ years of experience creating iconic logos for startups and Fortune 500 companies."},
-                {"role": "user", "content": logo_prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.7
+    pipeline = PIPELINES[service_type]
+    cacheable = services.generation_cache.enabled_for(service_type.value)
+    # Step outputs are shared across orders too, so they follow the service's opt-in
+    cached_steps = services.step_cache if cacheable and not bypass_cache else None
+    run = lambda: pipeline.run(
+        requirements, progress=progress, cache=cached_steps, cache_version=generation_version(service_type)
+    )
+    # Only cached generations share a run: followers pick the leader's result
+    # up from the generation cache, bypass orders ask for a fresh run of
+    # their own, and an uncached service's output is not meant to be reused.
+    if not cacheable:
+        return await run()
+    if bypass_cache:
+        services.generation_cache.record_bypass(service_type.value)
+        return await run()
+
+    cache_key = services.generation_cache.key(
+        service_type.value,
+        requirements,
+        template_version=f"{PROMPTS.version(service_type)}/{pipeline.name}",
+        model=model_router.signature(service_type.value),
+        temperature=GENERATION_TEMPERATURES[service_type]
+    )
+    content = await services.generation_cache.get(service_type.value, cache_key)
+    if content is not None:
+        return content
+    # Waiting on another run polls the cache; only the lookup above counts as this request's miss
+    cached = lambda: services.generation_cache.get(service_type.value, cache_key, record=False)
+
+    async def generate() -> Dict[str, Any]:
+        generated_content = await run()
+        if generated_content:
+            await services.generation_cache.set(service_type.value, cache_key, generated_content)
+        return generated_content
+
+    return await services.generation_leases.run(service_type.value, cache_key, generate, cached)
+
+# Order generation (run by the job queue workers)
+def batch_channel(batch_id: str) -> str:
+    return f"batch:{batch_id}"
+
+async def publish_order_status(order_id: str, status: OrderStatus, attempt: Optional[int] = None,
+                               batch_id: Optional[str] = None):
+    """Publish a status event to the order's stream and, for bulk orders, its batch's"""
+    await services.order_events.publish(order_id, {"type": "status", "status": status.value, "attempt": attempt})
+    if batch_id:
+        await services.order_events.publish(
+            batch_channel(batch_id),
+            {"type": "order_status", "id": order_id, "status": status.value, "attempt": attempt}
         )
-        
-        return {
-            "logo_concepts": response.choices[0].message.content,
-            "brand_guidelines": f"Brand guidelines for {business_name} - emphasizing {style} design approach in the {industry} sector.",
-            "file_formats": "You will receive: SVG (vector), PNG (transparent background), JPG (web optimized) in various sizes (logo, favicon, social media formats)"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error generating logo concepts: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating logo concepts: {str(e)}")
 
-# Background task for content generation
-async def process_order(order_id: str):
-    """Background task to generate content for an order"""
+# Fields needed to time how long an order spent in the status it is leaving
+STATUS_TIMING_PROJECTION = {"_id": 0, "status": 1, "status_changed_at": 1, "created_at": 1}
+
+def observe_status_exit(previous: Optional[Dict[str, Any]], status: OrderStatus, now: datetime):
+    """Record time spent in the previous status, given the order as it was before a transition"""
+    if not previous or previous.get("status") == status:
+        return
+    entered = previous.get("status_changed_at") or previous.get("created_at")
+    if entered:
+        order_status_seconds.observe((now - entered).total_seconds(), OrderStatus(previous["status"]).value)
+
+async def set_order_status(order_id: str, status: OrderStatus, attempt: Optional[int] = None,
+                           batch_id: Optional[str] = None, **fields):
+    """Persist a status transition and publish it to order stream subscribers"""
+    now = datetime.utcnow()
+    previous = await services.db.orders.find_one_and_update(
+        {"id": order_id},
+        {"$set": {"status": status, "status_changed_at": now, **fields}},
+        projection=STATUS_TIMING_PROJECTION,
+        return_document=ReturnDocument.BEFORE,
+    )
+    observe_status_exit(previous, status, now)
+    await publish_order_status(order_id, status, attempt, batch_id)
+
+# Generated documents delivered as PDF/DOCX: content key -> (title, requirement naming the subject).
+# Logo concepts (``logo_svgs``) are delivered as SVG and PNG files, see render_deliverables
+RENDERED_DOCUMENTS = {
+    ServiceType.RESUME: {"resume": ("Resume", "name"), "cover_letter": ("Cover Letter", "name")},
+    ServiceType.BUSINESS_PLAN: {"business_plan": ("Business Plan", "business_name")},
+}
+
+def delivery_url(order_id: str, document: str, fmt: str) -> str:
+    return f"/api/orders/{order_id}/files/{document}.{fmt}"
+
+async def render_deliverables(order: Order, generated_content: Dict[str, Any]) -> Dict[str, Any]:
+    """Render the order's documents and logos and return the order fields pointing at them.
+
+    Each logo concept gets its SVG master (``logo-N.svg``) and a PNG per size
+    (e.g. ``logo-N-favicon-32.png``), and its measured palette is added to the
+    concept in ``generated_content``. A failed render leaves the order without
+    files rather than failing it: the content itself is still delivered. Missing
+    fonts are a deployment problem rather than a bad document, so they fail the
+    job instead.
+    """
+    documents = {}
+    for key, (label, subject_field) in RENDERED_DOCUMENTS.get(order.service_type, {}).items():
+        text = generated_content.get(key)
+        if isinstance(text, str) and text.strip():
+            subject = order.requirements.get(subject_field)
+            documents[key] = (f"{subject} - {label}" if subject else label, text)
+    logos = generated_content.get("logo_svgs") or []
+    if not (documents and settings.render_formats) and not logos:
+        return {}
+    renderer = services.artifact_renderer
     try:
-        # Get order from database
-        order_data = await db.orders.find_one({"id": order_id})
-        if not order_data:
-            logger.error(f"Order {order_id} not found")
-            return
-        
-        order = Order(**order_data)
-        
-        # Update order status to processing
-        await db.orders.update_one(
-            {"id": order_id},
-            {"$set": {"status": OrderStatus.PROCESSING}}
+        # Documents and every concept's package render side by side in the pool
+        artifacts, *manifests = await asyncio.gather(
+            renderer.render(documents), *(renderer.render_logo(concept["svg"]) for concept in logos)
         )
-        
-        # Generate content based on service type
-        generated_content = None
-        
-        if order.service_type == ServiceType.RESUME:
-            generated_content = await generate_resume_content(order.requirements)
-        elif order.service_type == ServiceType.BUSINESS_PLAN:
-            generated_content = await generate_business_plan(order.requirements)
-        elif order.service_type == ServiceType.SOCIAL_MEDIA:
-            generated_content = await generate_social_media_content(order.requirements)
-        elif order.service_type == ServiceType.LOGO_DESIGN:
-            generated_content = await generate_logo_concepts(order.requirements)
-        
-        if generated_content:
-            # Update order with generated content and mark as completed
-            await db.orders.update_one(
-                {"id": order_id},
-                {
-                    "$set": {
-                        "status": OrderStatus.COMPLETED,
-                        "generated_content": generated_content,
-                        "completed_at": datetime.utcnow()
-                    }
-                }
-            )
-            logger.info(f"Order {order_id} completed successfully")
-        else:
-            # Mark order as failed
-            await db.orders.update_one(
-                {"id": order_id},
-                {"$set": {"status": OrderStatus.FAILED}}
-            )
-            logger.error(f"Order {order_id} failed - no content generated")
-            
+    except FileNotFoundError:
+        raise
     except Exception as e:
-        logger.error(f"Error processing order {order_id}: {str(e)}")
-        # Mark order as failed
-        await db.orders.update_one(
-            {"id": order_id},
-            {"$set": {"status": OrderStatus.FAILED}}
-        )
+        logger.exception(f"Rendering deliverables for order {order.id} failed: {e}")
+        return {}
+    for number, (concept, manifest) in enumerate(zip(logos, manifests), start=1):
+        concept["palette"] = manifest["palette"]
+        artifacts[f"logo-{number}"] = {"svg": manifest["svg"]}
+        for variant, key in manifest["png"].items():
+            artifacts[f"logo-{number}-{variant}"] = {"png": key}
+    return {
+        "artifacts": artifacts,
+        "delivery_urls": [
+            delivery_url(order.id, document, fmt) for document, formats in artifacts.items() for fmt in formats
+        ],
+    }
+
+async def process_order(order_id: str, attempt: int = 1):
+    """Generate content for an order; raises on failure so the job can be retried"""
+    # Get order from database
+    order_data = await services.db.orders.find_one({"id": order_id})
+    if not order_data:
+        logger.error(f"Order {order_id} not found")
+        return
+
+    order = Order(**order_data)
+    if order.status == OrderStatus.COMPLETED:
+        logger.info(f"Order {order_id} already completed, skipping")
+        return
+
+    # Update order status to processing
+    await set_order_status(order_id, OrderStatus.PROCESSING, attempt, order.batch_id)
+
+    # Generate content based on service type, streaming deltas to subscribers
+    async with GenerationProgress(services.order_events, order_id, attempt, checkpoint_interval=STREAM_CHECKPOINT_INTERVAL) as progress:
+        with model_router.track() as models_used:
+            generated_content = await generate_content(
+                order.service_type, order.requirements, progress, bypass_cache=order.bypass_cache
+            )
+
+    if not generated_content:
+        raise RuntimeError("no content generated")
+
+    # Store the content separately (after rendering, which adds logo palettes)
+    # and mark the order completed with a reference
+    deliverables = await render_deliverables(order, generated_content)
+    content_ref = await services.content_store.save(generated_content)
+    await set_order_status(
+        order_id,
+        OrderStatus.COMPLETED,
+        attempt,
+        order.batch_id,
+        content_ref=content_ref,
+        models_used=models_used,
+        completed_at=datetime.utcnow(),
+        **deliverables
+    )
+    logger.info(f"Order {order_id} completed successfully")
+
+async def run_order_job(job: Dict[str, Any]):
+    await process_order(job["order_id"], job["attempts"])
+
+async def handle_order_job_failure(job: Dict[str, Any], error: str, will_retry: bool):
+    """Put the order back to pending while retries remain, otherwise mark it failed"""
+    status = OrderStatus.PENDING if will_retry else OrderStatus.FAILED
+    now = datetime.utcnow()
+    previous = await services.db.orders.find_one_and_update(
+        {"id": job["order_id"], "status": {"$ne": OrderStatus.COMPLETED}},
+        {"$set": {"status": status, "status_changed_at": now}},
+        projection=STATUS_TIMING_PROJECTION,
+        return_document=ReturnDocument.BEFORE,
+    )
+    if previous:
+        observe_status_exit(previous, status, now)
+        await publish_order_status(job["order_id"], status, job["attempts"], job["payload"].get("batch_id"))
+    if not will_retry:
+        logger.error(f"Order {job['order_id']} failed after {job['attempts']} attempts: {error}")
+
+# Workers running in this process, for the in-flight generations gauge
+order_workers: List[Worker] = []
+
+def build_order_worker(concurrency: int, poll_interval: float = 1.0) -> Worker:
+    """A worker for order jobs; raises FileNotFoundError if PDFs are rendered and their fonts are missing"""
+    if "pdf" in settings.render_formats:
+        # Refuse to start rather than fail every order's render
+        pdf_fonts()
+    worker = Worker(
+        services.order_queue,
+        run_order_job,
+        on_failure=handle_order_job_failure,
+        housekeeping=sweep_pending_payments,
+        concurrency=concurrency,
+        poll_interval=poll_interval,
+        kind_limits=concurrency_limits(SERVICE_CONCURRENCY_SHARES, concurrency),
+    )
+    order_workers.append(worker)
+    return worker
+
+async def get_or_create_customer(email: str, name: str, phone: Optional[str] = None) -> str:
+    """Return the customer id for an email, creating the customer if needed"""
+    # Upsert on the unique email index so concurrent first orders cannot
+    # create duplicate customers
+    customer = Customer(email=email, name=name, phone=phone)
+    customer_data = await services.db.customers.find_one_and_update(
+        {"email": customer.email},
+        {"$setOnInsert": customer.dict()},
+        projection={"_id": 0, "id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return customer_data["id"]
 
 # API Routes
 @api_router.get("/")
@@ -449,33 +994,64 @@ async def root():
     return {"message": "AI Service Arbitrage Platform API", "status": "active"}
 
 @api_router.get("/services", response_model=List[ServiceConfig])
-async def get_services():
+async def get_services(if_none_match: Optional[str] = Header(None)):
     """Get all available services with pricing"""
-    return list(SERVICE_CONFIGS.values())
+    return SERVICE_CATALOG.response(if_none_match)
 
 @api_router.get("/services/{service_type}", response_model=ServiceConfig)
-async def get_service(service_type: ServiceType):
+async def get_service(service_type: ServiceType, if_none_match: Optional[str] = Header(None)):
     """Get specific service details"""
-    if service_type not in SERVICE_CONFIGS:
+    if service_type not in SERVICE_CATALOG_ENTRIES:
         raise HTTPException(status_code=404, detail="Service not found")
-    return SERVICE_CONFIGS[service_type]
+    return SERVICE_CATALOG_ENTRIES[service_type].response(if_none_match)
+
+# Longest Idempotency-Key header accepted (Stripe's limit)
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+def idempotent_replay(order_data: Dict[str, Any], order_request: OrderRequest) -> Order:
+    """The order a repeated request already created; a key cannot be reused for a different order"""
+    if order_data["service_type"] != order_request.service_type or order_data["requirements"] != order_request.requirements:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different order")
+    logger.info(f"Returning order {order_data['id']} for a repeated request")
+    return Order(**order_data)
+
+async def find_duplicate_order(error: DuplicateKeyError, keys: Dict[str, Optional[str]],
+                               projection: Dict[str, Any]) -> Dict[str, Any]:
+    """The stored order an insert collided with, looked up by the unique key that collided.
+
+    Raises 409 when that order is gone again (deleted between the insert and
+    the lookup) or the collision was on a key the caller cannot look up.
+    """
+    collided = (error.details or {}).get("keyPattern") or {}
+    for field, value in keys.items():
+        if value and (not collided or field in collided):
+            existing = await services.db.orders.find_one({field: value}, projection)
+            if existing:
+                return existing
+    raise HTTPException(status_code=409, detail="Order conflicts with another request; retry it")
 
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_request: OrderRequest, background_tasks: BackgroundTasks):
-    """Create a new order and start processing"""
+async def create_order(order_request: OrderRequest, idempotency_key: Optional[str] = Header(None)):
+    """Create a new order and start processing.
+
+    With an ``Idempotency-Key`` header, repeats of the request (double
+    submits, client retries) get back the order the first one created
+    instead of creating and generating another.
+    """
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
     try:
         # Create or get customer
-        customer_data = await db.customers.find_one({"email": order_request.customer_email})
-        if not customer_data:
-            customer = Customer(
-                email=order_request.customer_email,
-                name=order_request.customer_name,
-                phone=order_request.customer_phone
-            )
-            await db.customers.insert_one(customer.dict())
-            customer_id = customer.id
-        else:
-            customer_id = customer_data["id"]
+        customer_id = await get_or_create_customer(
+            order_request.customer_email, order_request.customer_name, order_request.customer_phone
+        )
+
+        # Keys are chosen by clients, so they only identify requests within one customer's
+        scoped_key = f"order:{customer_id}:{idempotency_key}" if idempotency_key else None
+        if scoped_key:
+            existing = await services.db.orders.find_one({"idempotency_key": scoped_key}, ORDER_STATUS_PROJECTION)
+            if existing:
+                return idempotent_replay(existing, order_request)
         
         # Get service price
         service_config = SERVICE_CONFIGS[order_request.service_type]
@@ -485,98 +1061,542 @@ async def create_order(order_request: OrderRequest, background_tasks: Background
             customer_id=customer_id,
             service_type=order_request.service_type,
             requirements=order_request.requirements,
-            price=service_config.price
+            price=service_config.price,
+            idempotency_key=scoped_key,
+            bypass_cache=order_request.bypass_cache
         )
+        order.deadline = order_deadline(order.service_type, order.created_at)
         
         # Save order to database
-        await db.orders.insert_one(order.dict())
+        try:
+            await services.db.orders.insert_one(order.dict())
+        except DuplicateKeyError as e:
+            # A concurrent repeat of the request won the insert (and queued the generation)
+            existing = await find_duplicate_order(e, {"idempotency_key": scoped_key}, ORDER_STATUS_PROJECTION)
+            return idempotent_replay(existing, order_request)
         
-        # Start background processing
-        background_tasks.add_task(process_order, order.id)
+        # Queue content generation
+        await services.order_queue.enqueue(order.id, kind=order.service_type.value, deadline=order.deadline)
         
         logger.info(f"Order {order.id} created for {order_request.customer_email}")
         return order
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating order: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating order: {str(e)}")
 
+@api_router.post("/orders/bulk", response_model=BatchProgress, status_code=202)
+async def create_bulk_orders(
+    request: Request,
+    service_type: ServiceType,
+    customer_email: str,
+    customer_name: str,
+    concurrency: Optional[int] = Query(None, ge=1),
+    bypass_cache: bool = False,
+    stream: bool = False,
+):
+    """Create one order per row of a CSV or NDJSON upload and queue them as a batch.
+
+    The batch's jobs run at a lower priority than single orders and at most
+    ``concurrency`` at a time. With ``stream=true`` the response is NDJSON:
+    the batch first, then each order's result as it finishes.
+    """
+    try:
+        rows = parse_bulk_rows(await request.body(), request.headers.get("content-type", ""), BULK_MAX_ROWS)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    customer_id = await get_or_create_customer(customer_email, customer_name)
+    batch = OrderBatch(
+        customer_id=customer_id,
+        service_type=service_type,
+        total=len(rows),
+        concurrency=min(concurrency or BULK_DEFAULT_CONCURRENCY, BULK_MAX_CONCURRENCY),
+    )
+    price = SERVICE_CONFIGS[service_type].price
+    deadline = order_deadline(service_type, batch.created_at)
+    orders = [
+        Order(
+            customer_id=customer_id,
+            service_type=service_type,
+            requirements=requirements,
+            price=price,
+            bypass_cache=bypass_cache,
+            batch_id=batch.id,
+            batch_row=row,
+            deadline=deadline
+        )
+        for row, requirements in enumerate(rows, start=1)
+    ]
+
+    await services.db.order_batches.insert_one(batch.dict())
+    await services.db.orders.insert_many([order.dict() for order in orders])
+    await services.order_queue.enqueue_many(
+        [order.id for order in orders],
+        priority=BULK_JOB_PRIORITY,
+        payload={"batch_id": batch.id},
+        kind=service_type.value,
+        deadline=deadline,
+        group=batch.id,
+        group_limit=batch.concurrency
+    )
+    logger.info(f"Batch {batch.id} of {batch.total} {service_type.value} orders created for {customer_email}")
+
+    progress = BatchProgress(batch=batch, counts={OrderStatus.PENDING.value: batch.total}, finished=False)
+    if stream:
+        return StreamingResponse(
+            stream_batch_results(batch.dict(), include_content=True, header=progress),
+            media_type="application/x-ndjson"
+        )
+    return progress
+
+async def attach_content(orders: List[Dict[str, Any]]):
+    """Fill generated_content from the content store for orders that hold a reference"""
+    refs = [order["content_ref"] for order in orders if order.get("content_ref") and not order.get("generated_content")]
+    if not refs:
+        return
+    contents = await services.content_store.load_many(refs)
+    for order in orders:
+        if order.get("content_ref") and not order.get("generated_content"):
+            order["generated_content"] = contents.get(order["content_ref"]["sha256"])
+
 @api_router.get("/orders/{order_id}", response_model=Order)
-async def get_order(order_id: str):
-    """Get order status and content"""
-    order_data = await db.orders.find_one({"id": order_id})
+async def get_order(order_id: str, include_content: bool = False):
+    """Get order status, and its generated content when include_content is set"""
+    projection = ORDER_PROJECTION if include_content else ORDER_STATUS_PROJECTION
+    order_data = await services.db.orders.find_one({"id": order_id}, projection)
     if not order_data:
         raise HTTPException(status_code=404, detail="Order not found")
-    return Order(**order_data)
+    if include_content:
+        await attach_content([order_data])
+    return FastJSONResponse({**ORDER_DEFAULTS, **order_data})
+
+@api_router.get("/orders/{order_id}/files/{filename}")
+async def get_order_file(order_id: str, filename: str, request: Request):
+    """Download a rendered deliverable (e.g. resume.pdf); supports range requests"""
+    document, _, fmt = filename.rpartition(".")
+    if not document or fmt not in ARTIFACT_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="File not found")
+    order_data = await services.db.orders.find_one({"id": order_id}, {"_id": 0, "artifacts": 1})
+    if not order_data:
+        raise HTTPException(status_code=404, detail="Order not found")
+    key = ((order_data.get("artifacts") or {}).get(document) or {}).get(fmt)
+    if not key:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    store = services.artifact_renderer.store
+    accel_redirect = None
+    if settings.artifact_accel_redirect_prefix:
+        accel_redirect = f"{settings.artifact_accel_redirect_prefix.rstrip('/')}/{store.relative_path(key, fmt)}"
+    try:
+        return immutable_file_response(
+            store.path(key, fmt),
+            request.headers,
+            etag=f'"{key[:32]}"',
+            media_type=ARTIFACT_MEDIA_TYPES[fmt],
+            filename=filename,
+            accel_redirect=accel_redirect,
+        )
+    except FileNotFoundError:
+        # Rendered on another host without a shared ARTIFACT_DIR, or cleaned up
+        raise HTTPException(status_code=404, detail="File not found")
+
+async def get_batch(batch_id: str) -> Dict[str, Any]:
+    batch = await services.db.order_batches.find_one({"id": batch_id}, {"_id": 0})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+async def count_batch_orders(batch_id: str) -> Dict[str, int]:
+    pipeline = [
+        {"$match": {"batch_id": batch_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]
+    return {row["_id"]: row["count"] async for row in services.db.orders.aggregate(pipeline)}
+
+BATCH_RESULT_PROJECTION = {"_id": 0, "id": 1, "batch_row": 1, "status": 1, "generated_content": 1, "content_ref": 1}
+TERMINAL_STATUSES = [OrderStatus.COMPLETED, OrderStatus.FAILED]
+
+async def stream_batch_results(batch: Dict[str, Any], include_content: bool = True,
+                               header: Optional[BaseModel] = None):
+    """Yield an NDJSON line per finished order in the batch until all have finished"""
+    if header is not None:
+        yield header.model_dump_json().encode() + b"\n"
+
+    channel = batch_channel(batch["id"])
+    reported = set()
+    # Remember where the event log is before reading finished orders, so an
+    # order that finishes in between is picked up from its event
+    last_event_id = await services.order_events.last_id(channel)
+    order_ids = None
+
+    while True:
+        query: Dict[str, Any] = {"batch_id": batch["id"], "status": {"$in": TERMINAL_STATUSES}}
+        if order_ids is not None:
+            query["id"] = {"$in": order_ids}
+        if order_ids is None or order_ids:
+            finished = await services.db.orders.find(query, BATCH_RESULT_PROJECTION).to_list(None)
+            finished = [order for order in finished if order["id"] not in reported]
+            if include_content:
+                await attach_content(finished)
+            for order in sorted(finished, key=lambda order: order.get("batch_row") or 0):
+                reported.add(order["id"])
+                yield json.dumps({
+                    "row": order.get("batch_row"),
+                    "order_id": order["id"],
+                    "status": order["status"],
+                    "generated_content": order.get("generated_content"),
+                }, default=str).encode() + b"\n"
+
+        if len(reported) >= batch["total"]:
+            return
+
+        await asyncio.sleep(STREAM_POLL_INTERVAL)
+        events = await services.order_events.fetch(channel, last_event_id)
+        if events:
+            last_event_id = events[-1]["_id"]
+        order_ids = list({
+            event["id"] for event in events
+            if event["status"] in TERMINAL_STATUSES and event["id"] not in reported
+        })
+
+@api_router.get("/batches/{batch_id}", response_model=BatchProgress)
+async def get_batch_progress(batch_id: str):
+    """Get a bulk batch with its orders counted by status"""
+    batch = await get_batch(batch_id)
+    counts = await count_batch_orders(batch_id)
+    finished = sum(counts.get(status.value, 0) for status in TERMINAL_STATUSES) >= batch["total"]
+    return BatchProgress(batch=OrderBatch(**batch), counts=counts, finished=finished)
+
+@api_router.get("/batches/{batch_id}/results")
+async def get_batch_results(batch_id: str, include_content: bool = True):
+    """Stream the batch's results as NDJSON, one line per order as it finishes"""
+    batch = await get_batch(batch_id)
+    return StreamingResponse(stream_batch_results(batch, include_content), media_type="application/x-ndjson")
+
+@api_router.get("/orders/{order_id}/stream")
+async def stream_order(order_id: str):
+    """Stream order status transitions and generated content as server-sent events"""
+    order_data = await services.db.orders.find_one({"id": order_id}, {"_id": 0, "status": 1})
+    if not order_data:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    async def event_source():
+        terminal = {OrderStatus.COMPLETED.value, OrderStatus.FAILED.value}
+        status = order_data["status"]
+        yield sse_event("status", {"type": "status", "status": status})
+
+        with services.order_events.subscribe(order_id) as local_events:
+            last_id = None
+            sent: Dict[tuple, int] = {}
+            waited: List[Dict[str, Any]] = []
+            last_status = None
+            idle = 0.0
+            while status not in terminal:
+                # Persisted events cover generation running in other processes;
+                # local deltas arrive sooner when the worker runs in this one.
+                events = await services.order_events.fetch(order_id, last_id)
+                if events:
+                    last_id = events[-1]["_id"]
+                events.extend(waited)
+                waited = []
+                while not local_events.empty():
+                    events.append(local_events.get_nowait())
+
+                for event in events:
+                    event.pop("_id", None)
+                    event.pop("order_id", None)
+                    event.pop("created_at", None)
+                    if event["type"] == "status":
+                        # Local and persisted copies of the same transition
+                        if (event["status"], event["attempt"]) == last_status:
+                            continue
+                        status = event["status"]
+                        last_status = (status, event["attempt"])
+                    else:
+                        # Skip chunks the client already has from local deltas
+                        end = event["offset"] + len(event["text"])
+                        position = (event["attempt"], event["key"])
+                        if end <= sent.get(position, -1):
+                            continue
+                        sent[position] = end
+                    yield sse_event(event["type"], event)
+                    idle = 0.0
+
+                if status in terminal:
+                    break
+                try:
+                    waited.append(await asyncio.wait_for(local_events.get(), timeout=STREAM_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    idle += STREAM_POLL_INTERVAL
+                    if idle >= STREAM_KEEPALIVE_SECONDS:
+                        yield ": keepalive\n\n"
+                        idle = 0.0
+
+        final = await services.db.orders.find_one(
+            {"id": order_id}, {"_id": 0, "status": 1, "generated_content": 1, "content_ref": 1}
+        )
+        await attach_content([final])
+        final.pop("content_ref", None)
+        yield sse_event("complete", {"type": "complete", **final})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def encode_order_cursor(order: Dict[str, Any]) -> str:
+    payload = json.dumps({"created_at": order["created_at"].isoformat(), "id": order["id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_order_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {"created_at": datetime.fromisoformat(payload["created_at"]), "id": str(payload["id"])}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@api_router.get("/orders", response_model=OrderPage)
+async def get_orders(
+    customer_email: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    include_content: bool = False
+):
+    """Get orders newest first, optionally filtered by customer email.
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_orders(customer_email: Optional[str] = None):
-    """Get orders, optionally filtered by customer email"""
+    Pages are keyed on (created_at, id); pass the returned ``next_cursor`` to
+    fetch the next page. Summaries are returned unless ``include_content`` is set.
+    """
+    query: Dict[str, Any] = {}
     if customer_email:
-        customer_data = await db.customers.find_one({"email": customer_email})
+        customer_data = await services.db.customers.find_one({"email": customer_email}, {"_id": 0, "id": 1})
         if not customer_data:
-            return []
-        orders = await db.orders.find({"customer_id": customer_data["id"]}).to_list(100)
-    else:
-        orders = await db.orders.find().to_list(100)
-    
-    return [Order(**order) for order in orders]
+            return FastJSONResponse({"orders": [], "next_cursor": None})
+        query["customer_id"] = customer_data["id"]
+
+    if cursor:
+        after = decode_order_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": after["created_at"]}},
+            {"created_at": after["created_at"], "id": {"$lt": after["id"]}}
+        ]
+
+    projection = ORDER_PROJECTION if include_content else ORDER_SUMMARY_PROJECTION
+    orders = await services.db.orders.find(query, projection) \
+        .sort([("created_at", -1), ("id", -1)]) \
+        .limit(limit + 1) \
+        .to_list(limit + 1)
+
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    orders = orders[:limit]
+    if include_content:
+        await attach_content(orders)
+    defaults = ORDER_DEFAULTS if include_content else ORDER_SUMMARY_DEFAULTS
+    return FastJSONResponse({"orders": [{**defaults, **order} for order in orders], "next_cursor": next_cursor})
 
 # Payment endpoints (Stripe integration)
+async def create_awaiting_payment_order(order_request: OrderRequest, order_reference: str) -> Order:
+    """Create (or reuse, for a retried checkout) the order a payment intent pays for.
+
+    Like Idempotency-Key on create_order, references come from clients, so
+    they are scoped to the customer and cannot be reused for a different order.
+    """
+    customer_id = await get_or_create_customer(
+        order_request.customer_email, order_request.customer_name, order_request.customer_phone
+    )
+    scoped_reference = f"order:{customer_id}:{order_reference}"
+    existing = await services.db.orders.find_one({"order_reference": scoped_reference}, {"_id": 0})
+    if existing:
+        return idempotent_replay(existing, order_request)
+
+    order = Order(
+        customer_id=customer_id,
+        service_type=order_request.service_type,
+        requirements=order_request.requirements,
+        price=SERVICE_CONFIGS[order_request.service_type].price,
+        order_reference=scoped_reference,
+        bypass_cache=order_request.bypass_cache,
+        status=OrderStatus.AWAITING_PAYMENT
+    )
+    try:
+        await services.db.orders.insert_one(order.dict())
+    except DuplicateKeyError as e:
+        # A concurrent retry of the same checkout won the insert
+        existing = await find_duplicate_order(e, {"order_reference": scoped_reference}, {"_id": 0})
+        return idempotent_replay(existing, order_request)
+    return order
+
+async def mark_order_paid(order_id: str, intent: Dict[str, Any]) -> bool:
+    """Advance an awaiting-payment order once its intent has succeeded and queue generation"""
+    order_data = await services.db.orders.find_one({"id": order_id}, {"_id": 0, "service_type": 1, "price": 1})
+    if not order_data:
+        logger.error(f"Payment {intent['id']} references unknown order {order_id}")
+        return False
+    if intent["status"] != 'succeeded' or intent["amount"] != int(order_data["price"] * 100):
+        logger.error(f"Payment {intent['id']} does not settle order {order_id}")
+        return False
+
+    # The delivery promise starts once the order is paid for
+    paid_at = datetime.utcnow()
+    service_type = ServiceType(order_data["service_type"])
+    deadline = order_deadline(service_type, paid_at)
+    previous = await services.db.orders.find_one_and_update(
+        {"id": order_id, "status": OrderStatus.AWAITING_PAYMENT},
+        {"$set": {"status": OrderStatus.PENDING, "status_changed_at": paid_at, "payment_intent_id": intent["id"],
+                  "paid_at": paid_at, "deadline": deadline}},
+        projection=STATUS_TIMING_PROJECTION,
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not previous:
+        return False
+    observe_status_exit(previous, OrderStatus.PENDING, paid_at)
+
+    await services.order_queue.enqueue(order_id, kind=service_type.value, deadline=deadline)
+    await services.order_events.publish(order_id, {"type": "status", "status": OrderStatus.PENDING.value, "attempt": None})
+    logger.info(f"Order {order_id} paid with {intent['id']}")
+    return True
+
+# How long a succeeded payment may go without an order before it is reported
+PENDING_PAYMENT_GRACE = timedelta(minutes=30)
+
+async def record_pending_payment(intent: Dict[str, Any]):
+    """Keep a succeeded intent that has no order yet until one is created for it"""
+    metadata = intent.get("metadata", {})
+    await services.db.pending_payments.update_one(
+        {"_id": intent["id"]},
+        {"$setOnInsert": {
+            "amount": intent["amount"],
+            "service_type": metadata.get("service_type"),
+            "order_reference": metadata.get("order_reference"),
+            "received_at": datetime.utcnow(),
+        }},
+        upsert=True
+    )
+
+async def sweep_pending_payments(grace: timedelta = PENDING_PAYMENT_GRACE) -> List[str]:
+    """Drop pending payments that now have an order and report those still without one.
+
+    Each payment is reported once, however many workers sweep. Returns the
+    intent ids reported by this sweep.
+    """
+    cutoff = datetime.utcnow() - grace
+    reported = []
+    async for payment in services.db.pending_payments.find({}, {"received_at": 1, "reported_at": 1}):
+        if await services.db.orders.find_one({"payment_intent_id": payment["_id"]}, {"_id": 1}):
+            await services.db.pending_payments.delete_one({"_id": payment["_id"]})
+            continue
+        if payment["received_at"] > cutoff or payment.get("reported_at"):
+            continue
+        result = await services.db.pending_payments.update_one(
+            {"_id": payment["_id"], "reported_at": None}, {"$set": {"reported_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            logger.error(f"Payment {payment['_id']} succeeded at {payment['received_at']} but has no order")
+            reported.append(payment["_id"])
+    return reported
+
 @api_router.post("/create-payment-intent")
-async def create_payment_intent(request: dict):
-    """Create Stripe payment intent"""
+async def create_payment_intent(request: dict, idempotency_key: Optional[str] = Header(None)):
+    """Create the order and its Stripe payment intent.
+
+    The order waits in ``awaiting_payment`` until Stripe's
+    ``payment_intent.succeeded`` webhook arrives. Requests without customer
+    details only create the intent, and the order is made at confirmation.
+    An ``Idempotency-Key`` header stands in for ``order_reference``.
+    """
     try:
         service_type = ServiceType(request.get("service_type"))
         service_config = SERVICE_CONFIGS[service_type]
-        
+
+        # The client sends a reference that stays fixed across retries of one
+        # checkout, so a retried request gets the same order and intent back
+        order_reference = request.get("order_reference") or idempotency_key or str(uuid.uuid4())
+        try:
+            order_request = OrderRequest(**request)
+        except ValidationError:
+            order_request = None
+
+        metadata = {
+            'service_type': service_type.value,
+            'service_name': service_config.name,
+            'order_reference': order_reference
+        }
+        order = None
+        if order_request:
+            order = await create_awaiting_payment_order(order_request, order_reference)
+            metadata['order_id'] = order.id
+            idempotency_key = f"payment-intent-{order.id}"
+        else:
+            idempotency_key = f"payment-intent-{service_type.value}-{order_reference}"
+
         # Create payment intent with Stripe
-        intent = stripe.PaymentIntent.create(
+        intent = await services.stripe_gateway.create_payment_intent(
             amount=int(service_config.price * 100),  # Convert to pence/cents
             currency='gbp',
-            metadata={
-                'service_type': service_type,
-                'service_name': service_config.name
-            }
+            metadata=metadata,
+            idempotency_key=idempotency_key
         )
-        
+        if order:
+            await services.db.orders.update_one({"id": order.id}, {"$set": {"payment_intent_id": intent["id"]}})
+
         return {
-            "client_secret": intent.client_secret,
+            "client_secret": intent["client_secret"],
             "amount": service_config.price,
             "currency": "gbp",
             "service": service_config.name,
-            "payment_intent_id": intent.id
+            "payment_intent_id": intent["id"],
+            "order_id": order.id if order else None
         }
-        
+
+    except PaymentError as e:
+        logger.error(f"Stripe error: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Payment error: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating payment intent: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating payment intent: {str(e)}")
 
 @api_router.post("/confirm-payment")
-async def confirm_payment(request: dict, background_tasks: BackgroundTasks):
-    """Confirm payment and create order"""
+async def confirm_payment(request: dict):
+    """Return the order for a payment intent.
+
+    Orders are advanced by the Stripe webhook, so this is normally a lookup
+    and the order may still be ``awaiting_payment`` for a moment. Without a
+    webhook secret configured the intent is checked with Stripe here instead.
+    """
     try:
         payment_intent_id = request.get("payment_intent_id")
+        if not payment_intent_id:
+            raise HTTPException(status_code=400, detail="payment_intent_id is required")
+
+        order_data = await services.db.orders.find_one(
+            {"payment_intent_id": payment_intent_id}, {"_id": 0, "generated_content": 0}
+        )
+        if order_data:
+            if order_data["status"] == OrderStatus.AWAITING_PAYMENT and not STRIPE_WEBHOOK_SECRET:
+                intent = await services.stripe_gateway.retrieve_payment_intent(payment_intent_id)
+                if await mark_order_paid(order_data["id"], intent):
+                    order_data["status"] = OrderStatus.PENDING
+            return Order(**order_data)
+
+        # Intents created without customer details have no order yet
         order_request = OrderRequest(**request)
-        
+
         # Retrieve the payment intent from Stripe
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        intent = await services.stripe_gateway.retrieve_payment_intent(payment_intent_id)
         
-        if intent.status != 'succeeded':
+        if intent["status"] != 'succeeded':
             raise HTTPException(status_code=400, detail="Payment not completed")
         
         # Create or get customer
-        customer_data = await db.customers.find_one({"email": order_request.customer_email})
-        if not customer_data:
-            customer = Customer(
-                email=order_request.customer_email,
-                name=order_request.customer_name,
-                phone=order_request.customer_phone
-            )
-            await db.customers.insert_one(customer.dict())
-            customer_id = customer.id
-        else:
-            customer_id = customer_data["id"]
+        customer_id = await get_or_create_customer(
+            order_request.customer_email, order_request.customer_name, order_request.customer_phone
+        )
         
         # Get service price
         service_config = SERVICE_CONFIGS[order_request.service_type]
@@ -588,50 +1608,243 @@ async def confirm_payment(request: dict, background_tasks: BackgroundTasks):
             requirements=order_request.requirements,
             price=service_config.price,
             payment_intent_id=payment_intent_id,
-            status=OrderStatus.PENDING
+            # One order per intent, however often confirmation is retried
+            idempotency_key=f"payment_intent:{payment_intent_id}",
+            bypass_cache=order_request.bypass_cache,
+            status=OrderStatus.PENDING,
+            paid_at=datetime.utcnow()
         )
+        order.deadline = order_deadline(order.service_type, order.paid_at)
         
         # Save order to database
-        await db.orders.insert_one(order.dict())
+        try:
+            await services.db.orders.insert_one(order.dict())
+        except DuplicateKeyError:
+            # A concurrent confirmation of the same intent created (and queued) the order
+            return Order(**await services.db.orders.find_one(
+                {"idempotency_key": order.idempotency_key}, ORDER_STATUS_PROJECTION
+            ))
         
-        # Start background processing
-        background_tasks.add_task(process_order, order.id)
+        # Queue content generation
+        await services.order_queue.enqueue(order.id, kind=order.service_type.value, deadline=order.deadline)
+        await services.db.pending_payments.delete_one({"_id": payment_intent_id})
         
         logger.info(f"Order {order.id} created and paid for {order_request.customer_email}")
         return order
         
-    except stripe.error.StripeError as e:
+    except HTTPException:
+        raise
+    except PaymentError as e:
         logger.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Payment error: {str(e)}")
     except Exception as e:
         logger.error(f"Error confirming payment: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing payment: {str(e)}")
 
+@api_router.post("/stripe/webhook")
+async def stripe_webhook(request: Request, stripe_signature: Optional[str] = Header(None)):
+    """Receive Stripe events; paid orders are advanced and queued for generation"""
+    if not STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Webhooks are not configured")
+
+    payload = await request.body()
+    try:
+        event = verify_webhook(payload, stripe_signature, STRIPE_WEBHOOK_SECRET)
+    except WebhookSignatureError as e:
+        logger.warning(f"Rejected Stripe webhook: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    # Record the event id first so redeliveries are acknowledged without reprocessing
+    try:
+        await services.db.stripe_events.insert_one({
+            "_id": event["id"],
+            "type": event["type"],
+            "received_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        return {"received": True, "duplicate": True}
+
+    orderless_intent = None
+    try:
+        if event["type"] == "payment_intent.succeeded":
+            intent = event["data"]["object"]
+            order_id = intent.get("metadata", {}).get("order_id")
+            if not order_id:
+                order_data = await services.db.orders.find_one({"payment_intent_id": intent["id"]}, {"_id": 0, "id": 1})
+                order_id = order_data["id"] if order_data else None
+            if order_id:
+                await mark_order_paid(order_id, intent)
+            else:
+                # Intents made without customer details get their order at
+                # confirmation, which may not have happened yet (or ever, if
+                # the browser went away). Keep the payment for the sweeper.
+                await record_pending_payment(intent)
+                orderless_intent = intent["id"]
+        elif event["type"] == "payment_intent.payment_failed":
+            intent = event["data"]["object"]
+            logger.info(f"Payment {intent['id']} failed: {intent.get('last_payment_error', {}).get('message')}")
+    except Exception as e:
+        # Forget the event so Stripe's retry is processed
+        await services.db.stripe_events.delete_one({"_id": event["id"]})
+        logger.error(f"Error handling Stripe event {event['id']}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error handling event")
+
+    if orderless_intent:
+        # Forget the event and refuse it, so Stripe redelivers it until the order exists
+        await services.db.stripe_events.delete_one({"_id": event["id"]})
+        logger.info(f"Payment {orderless_intent} has no order yet; asking Stripe to redeliver")
+        raise HTTPException(status_code=409, detail="Payment has no order yet")
+
+    return {"received": True}
+
 @api_router.get("/stripe-config")
 async def get_stripe_config():
     """Get Stripe publishable key for frontend"""
     return {
-        "publishable_key": os.environ.get('STRIPE_PUBLISHABLE_KEY')
+        "publishable_key": settings.stripe_publishable_key
     }
 
-# Include the router in the main app
-app.include_router(api_router)
+# Admin endpoints
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints are disabled unless ADMIN_API_TOKEN is set and supplied"""
+    admin_token = settings.admin_api_token
+    if not admin_token or x_admin_token != admin_token:
+        raise HTTPException(status_code=403, detail="Admin access required")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@admin_router.get("/cache")
+async def get_cache_stats():
+    """Generation and step cache hit/miss counters for this process"""
+    return {**services.generation_cache.stats(), "steps": services.step_cache.stats()["services"]}
+
+@admin_router.get("/llm")
+async def get_llm_stats():
+    """LLM call counts, hedging, circuit breaker state and per-model routing stats for this process"""
+    return {**services.llm_gateway.stats(), "models": model_router.snapshot()}
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+@admin_router.get("/indexes")
+async def get_index_report():
+    """Declared vs existing indexes, with usage counts and creation errors"""
+    return await services.index_manager.report()
+
+@admin_router.get("/orders/at-risk")
+async def get_at_risk_orders(
+    within_seconds: float = Query(SLA_RISK_WINDOW_SECONDS, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Unfinished orders due within the window (or already overdue), most urgent first"""
+    now = datetime.utcnow()
+    cursor = services.db.orders.find(
+        {
+            "status": {"$in": [OrderStatus.PENDING, OrderStatus.PROCESSING]},
+            "deadline": {"$lte": now + timedelta(seconds=within_seconds)},
+        },
+        ORDER_SUMMARY_PROJECTION
+    ).sort("deadline", ASCENDING).limit(limit)
+
+    orders = []
+    async for order in cursor:
+        slack = (order["deadline"] - now).total_seconds()
+        orders.append({**OrderSummary(**order).dict(), "slack_seconds": slack, "overdue": slack < 0})
+    return {"orders": orders, "overdue": sum(order["overdue"] for order in orders)}
+
+api_router.include_router(admin_router)
+
+# Prometheus metrics. Gauges read live in-process state when scraped (LLM
+# gauges stay empty until the gateway is first used); job counts come from
+# Mongo, so they are refreshed just before rendering.
+def read_llm_gateway(read: Callable[[Any], Any]) -> Callable[[], List]:
+    return lambda: list(read(services.llm_gateway)) if services.built("llm_gateway") else []
+
+generation_jobs_gauge = metrics_registry.gauge("generation_jobs", "Generation jobs by queue status", ("status",))
+pending_payments_gauge = metrics_registry.gauge("pending_payments", "Succeeded payments without an order yet")
+metrics_registry.gauge(
+    "generations_in_flight", "Order generations running in this process",
+    read=lambda: [((), sum(worker.active for worker in order_workers))],
 )
-logger = logging.getLogger(__name__)
+metrics_registry.gauge(
+    "llm_requests_in_flight", "LLM calls awaiting a response",
+    read=read_llm_gateway(lambda gateway: [((), gateway.in_flight)]),
+)
+metrics_registry.callback_counter(
+    "llm_hedges_total", "Hedged LLM requests sent", read=read_llm_gateway(lambda gateway: [((), gateway.hedges)]),
+)
+metrics_registry.callback_counter(
+    "llm_hedge_wins_total", "Hedged LLM requests that beat the original",
+    read=read_llm_gateway(lambda gateway: [((), gateway.hedge_wins)]),
+)
+metrics_registry.gauge(
+    "llm_circuit_open", "Whether the circuit breaker for a model is open (1) or not (0)", ("model",),
+    read=read_llm_gateway(lambda gateway: [
+        ((model,), float(breaker["state"] == "open")) for model, breaker in gateway.stats()["breakers"].items()
+    ]),
+)
+
+async def render_metrics() -> str:
+    for status, count in (await services.order_queue.counts()).items():
+        generation_jobs_gauge.set(count, status)
+    pending_payments_gauge.set(await services.db.pending_payments.count_documents({}))
+    return metrics_registry.render()
+
+async def get_metrics():
+    return Response(await render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so /orders/{order_id} is one series, not one per order
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - started, request.method, getattr(route, "path", "unmatched"), str(status)
+        )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await services.index_manager.ensure()
+
+    # Optional in-process worker for single-process deployments; production
+    # runs `python -m backend.worker` separately.
+    worker = None
+    if settings.embedded_worker_concurrency > 0:
+        worker = build_order_worker(settings.embedded_worker_concurrency)
+        app.state.embedded_worker = worker
+        app.state.embedded_worker_task = asyncio.create_task(worker.run())
+    try:
+        yield
+    finally:
+        if worker:
+            await worker.stop()
+        await services.aclose()
+
+def create_app() -> FastAPI:
+    """The API application. Clients are built on first use and closed on shutdown"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    app = FastAPI(title="AI Service Arbitrage Platform", version="1.0.0", lifespan=lifespan)
+    app.include_router(api_router)
+    app.add_api_route("/metrics", get_metrics, methods=["GET"], include_in_schema=False)
+    app.middleware("http")(time_requests)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+def __getattr__(name: str):
+    # `uvicorn server:app` keeps working, but processes that only need the
+    # generation code (workers, tools) never build the web app
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,165 @@
+import logging
+from functools import cached_property
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from artifacts import ArtifactRenderer, ArtifactStore
+from content_store import ContentStore
+from generation_cache import GenerationCache, GenerationLeases
+from indexes import CORE_INDEXES, IndexManager
+from job_queue import JobQueue
+from metrics import MongoCommandMetrics
+from order_stream import OrderEvents
+from payments import StripeGateway
+from rate_limiter import LocalBuckets, MongoBuckets, RateLimiter
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    """The backend's clients and the components built on them, each made on first use.
+
+    Nothing connects or needs credentials until it is used, so importing the
+    backend is cheap: an API process that never generates content never loads
+    the OpenAI SDK, and a worker never builds the Stripe client. Tests and
+    tools can assign any attribute (e.g. ``client``) before first use.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+    def built(self, name: str) -> bool:
+        return name in self.__dict__
+
+    @cached_property
+    def client(self) -> AsyncIOMotorClient:
+        return AsyncIOMotorClient(self.settings.require("mongo_url"), event_listeners=[MongoCommandMetrics()])
+
+    @cached_property
+    def db(self):
+        return self.client[self.settings.require("db_name")]
+
+    @cached_property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        """Provider RPM/TPM token buckets, shared through Mongo unless configured local.
+
+        Limits are scaled by the headroom so throughput stays just under the ceiling.
+        """
+        settings = self.settings
+        if settings.llm_rpm_limit <= 0 or settings.llm_tpm_limit <= 0:
+            return None
+        rpm = settings.llm_rpm_limit * settings.llm_rate_limit_headroom
+        tpm = settings.llm_tpm_limit * settings.llm_rate_limit_headroom
+        if settings.llm_rate_limit_backend == "local":
+            return RateLimiter(LocalBuckets(rpm, tpm))
+        return RateLimiter(MongoBuckets(self.db.rate_limits, "llm", rpm, tpm))
+
+    @cached_property
+    def llm_gateway(self):
+        # Imported here: the OpenAI SDK is the slowest import in the backend
+        from llm_cassette import build_transport
+        from llm_gateway import LLMGateway
+
+        settings = self.settings
+        return LLMGateway(
+            api_key=settings.require("openai_api_key"),
+            base_url=settings.openai_base_url,
+            max_concurrency=settings.llm_max_concurrency,
+            timeout=settings.llm_timeout_seconds,
+            max_connections=settings.llm_max_connections,
+            rate_limiter=self.rate_limiter,
+            hedge_percentile=settings.llm_hedge_percentile or None,
+            hedge_budget=settings.llm_hedge_budget,
+            breaker_failure_rate=settings.llm_breaker_failure_rate,
+            breaker_cooldown=settings.llm_breaker_cooldown_seconds,
+            # live, or record/replay LLM traffic for offline profiling
+            wrap_transport=build_transport(
+                settings.llm_transport_mode, settings.llm_cassette_dir, speed=settings.llm_replay_speed
+            ),
+        )
+
+    @cached_property
+    def stripe_gateway(self) -> StripeGateway:
+        settings = self.settings
+        return StripeGateway(
+            settings.stripe_secret_key,
+            api_base=settings.stripe_api_base,
+            timeout=settings.stripe_timeout_seconds,
+            max_retries=settings.stripe_max_retries,
+        )
+
+    @cached_property
+    def order_queue(self) -> JobQueue:
+        return JobQueue(
+            self.db.generation_jobs,
+            lease_seconds=self.settings.job_lease_seconds,
+            max_attempts=self.settings.job_max_attempts,
+        )
+
+    @cached_property
+    def order_events(self) -> OrderEvents:
+        """Order progress events (status transitions and streamed content)"""
+        return OrderEvents(self.db.order_events, ttl_seconds=self.settings.order_events_ttl_seconds)
+
+    @cached_property
+    def generation_cache(self) -> GenerationCache:
+        """In-process LRU in front of a TTL'd Mongo collection"""
+        return GenerationCache(
+            self.db.generation_cache,
+            enabled_services=self.settings.generation_cache_services,
+            max_entries=self.settings.generation_cache_max_entries,
+            ttl_seconds=self.settings.generation_cache_ttl_seconds,
+        )
+
+    @cached_property
+    def generation_leases(self) -> GenerationLeases:
+        """Single flight for identical generations, across this process and other workers"""
+        return GenerationLeases(self.db.generation_leases, lease_seconds=self.settings.generation_lease_seconds)
+
+    @cached_property
+    def step_cache(self) -> GenerationCache:
+        """Per-step results, so a retried order only reruns the steps that failed"""
+        return GenerationCache(
+            self.db.generation_step_cache,
+            max_entries=self.settings.step_cache_max_entries,
+            ttl_seconds=self.settings.step_cache_ttl_seconds,
+        )
+
+    @cached_property
+    def content_store(self) -> ContentStore:
+        """Generated content lives outside the orders collection (GridFS above the threshold)"""
+        return ContentStore(self.db, gridfs_threshold=self.settings.content_gridfs_threshold_bytes)
+
+    @cached_property
+    def artifact_renderer(self) -> ArtifactRenderer:
+        """PDF/DOCX deliverables, rendered once per unique content on a process pool"""
+        settings = self.settings
+        return ArtifactRenderer(
+            ArtifactStore(settings.artifact_dir), formats=settings.render_formats, max_workers=settings.render_workers
+        )
+
+    @cached_property
+    def index_manager(self) -> IndexManager:
+        """Index declarations for every collection the backend queries"""
+        return IndexManager(self.db, [
+            *CORE_INDEXES,
+            *self.order_queue.index_specs(),
+            *self.order_events.index_specs(),
+            *self.generation_cache.index_specs(),
+            *self.generation_leases.index_specs(),
+            *self.step_cache.index_specs(),
+            *self.content_store.index_specs(),
+        ])
+
+    async def aclose(self):
+        """Close whichever clients were built"""
+        if self.built("llm_gateway"):
+            await self.llm_gateway.aclose()
+        if self.built("stripe_gateway"):
+            await self.stripe_gateway.aclose()
+        if self.built("artifact_renderer"):
+            self.artifact_renderer.close()
+        if self.built("client"):
+            self.client.close()
@@ -0,0 +1,140 @@
+import os
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from scheduler import parse_shares
+
+ROOT_DIR = Path(__file__).parent
+
+
+def _names(value: str) -> Tuple[str, ...]:
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+def setting(env: str, default: Any = None, parse: Optional[Callable[[str], Any]] = None):
+    """A field read from the ``env`` variable, converted with ``parse`` (default: the field's type).
+
+    String defaults of parsed fields go through ``parse`` too.
+    """
+    metadata = {"env": env, "parse": parse}
+    if parse is not None and isinstance(default, str):
+        return field(default_factory=lambda: parse(default), metadata=metadata)
+    return field(default=default, metadata=metadata)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Backend configuration, read once from the environment (and backend/.env).
+
+    Secrets are optional here and only checked with ``require`` when the
+    client that needs them is first built, so importing the backend or running
+    a process that never talks to a service does not need its credentials.
+    """
+
+    mongo_url: Optional[str] = setting("MONGO_URL")
+    db_name: Optional[str] = setting("DB_NAME")
+
+    openai_api_key: Optional[str] = setting("OPENAI_API_KEY")
+    openai_base_url: Optional[str] = setting("OPENAI_BASE_URL")
+    llm_max_concurrency: int = setting("LLM_MAX_CONCURRENCY", 32)
+    llm_timeout_seconds: float = setting("LLM_TIMEOUT_SECONDS", 120.0)
+    llm_max_connections: int = setting("LLM_MAX_CONNECTIONS", 64)
+    llm_rpm_limit: float = setting("LLM_RPM_LIMIT", 0.0)
+    llm_tpm_limit: float = setting("LLM_TPM_LIMIT", 0.0)
+    llm_rate_limit_headroom: float = setting("LLM_RATE_LIMIT_HEADROOM", 0.9)
+    llm_rate_limit_backend: str = setting("LLM_RATE_LIMIT_BACKEND", "mongo")
+    llm_hedge_percentile: float = setting("LLM_HEDGE_PERCENTILE", 95.0)
+    llm_hedge_budget: float = setting("LLM_HEDGE_BUDGET", 0.1)
+    llm_breaker_failure_rate: float = setting("LLM_BREAKER_FAILURE_RATE", 0.5)
+    llm_breaker_cooldown_seconds: float = setting("LLM_BREAKER_COOLDOWN_SECONDS", 30.0)
+    llm_transport_mode: str = setting("LLM_TRANSPORT_MODE", "live")
+    llm_cassette_dir: Path = setting("LLM_CASSETTE_DIR", ROOT_DIR / "llm_cassettes")
+    llm_replay_speed: float = setting("LLM_REPLAY_SPEED", 1.0)
+    llm_routes: str = setting("LLM_ROUTES", "{}")
+    llm_latency_value_per_second: float = setting("LLM_LATENCY_VALUE_PER_SECOND", 0.001)
+
+    job_lease_seconds: float = setting("JOB_LEASE_SECONDS", 60.0)
+    job_max_attempts: int = setting("JOB_MAX_ATTEMPTS", 5)
+    worker_concurrency: int = setting("WORKER_CONCURRENCY", 8)
+    worker_poll_interval: float = setting("WORKER_POLL_INTERVAL", 1.0)
+    worker_metrics_port: int = setting("WORKER_METRICS_PORT", 0)
+    embedded_worker_concurrency: int = setting("EMBEDDED_WORKER_CONCURRENCY", 0)
+    service_concurrency_shares: Mapping[str, float] = setting(
+        "SERVICE_CONCURRENCY_SHARES", "business_plan=0.5,social_media=0.75", parse_shares
+    )
+    sla_risk_window_seconds: float = setting("SLA_RISK_WINDOW_SECONDS", 300.0)
+
+    order_events_ttl_seconds: int = setting("ORDER_EVENTS_TTL_SECONDS", 86400)
+    stream_checkpoint_interval: float = setting("STREAM_CHECKPOINT_INTERVAL", 0.5)
+    stream_poll_interval: float = setting("STREAM_POLL_INTERVAL", 0.5)
+
+    generation_cache_services: Tuple[str, ...] = setting(
+        "GENERATION_CACHE_SERVICES", "resume,business_plan,social_media,logo_design", _names
+    )
+    generation_cache_max_entries: int = setting("GENERATION_CACHE_MAX_ENTRIES", 1024)
+    generation_cache_ttl_seconds: int = setting("GENERATION_CACHE_TTL_SECONDS", 7 * 86400)
+    generation_fanout_services: Tuple[str, ...] = setting(
+        "GENERATION_FANOUT_SERVICES", "business_plan,social_media", _names
+    )
+    generation_lease_seconds: float = setting("GENERATION_LEASE_SECONDS", 30.0)
+    step_cache_max_entries: int = setting("STEP_CACHE_MAX_ENTRIES", 1024)
+    step_cache_ttl_seconds: int = setting("STEP_CACHE_TTL_SECONDS", 86400)
+    content_gridfs_threshold_bytes: int = setting("CONTENT_GRIDFS_THRESHOLD_BYTES", 256 * 1024)
+
+    catalog_max_age_seconds: int = setting("CATALOG_MAX_AGE_SECONDS", 300)
+
+    render_formats: Tuple[str, ...] = setting("RENDER_FORMATS", "pdf,docx", _names)
+    render_workers: int = setting("RENDER_WORKERS", 2)
+    artifact_dir: Path = setting("ARTIFACT_DIR", ROOT_DIR / "artifacts")
+    artifact_accel_redirect_prefix: Optional[str] = setting("ARTIFACT_ACCEL_REDIRECT_PREFIX")
+
+    bulk_max_rows: int = setting("BULK_MAX_ROWS", 2000)
+    bulk_default_concurrency: int = setting("BULK_DEFAULT_CONCURRENCY", 4)
+    bulk_max_concurrency: int = setting("BULK_MAX_CONCURRENCY", 16)
+
+    stripe_secret_key: Optional[str] = setting("STRIPE_SECRET_KEY")
+    stripe_publishable_key: Optional[str] = setting("STRIPE_PUBLISHABLE_KEY")
+    stripe_webhook_secret: Optional[str] = setting("STRIPE_WEBHOOK_SECRET")
+    stripe_api_base: str = setting("STRIPE_API_BASE", "https://api.stripe.com")
+    stripe_timeout_seconds: float = setting("STRIPE_TIMEOUT_SECONDS", 10.0)
+    stripe_max_retries: int = setting("STRIPE_MAX_RETRIES", 3)
+
+    admin_api_token: Optional[str] = setting("ADMIN_API_TOKEN")
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        values: Dict[str, Any] = {}
+        for spec in fields(cls):
+            raw = environ.get(spec.metadata["env"])
+            if raw is None:
+                continue
+            parse = spec.metadata["parse"] or _parser(spec.type)
+            try:
+                values[spec.name] = parse(raw)
+            except ValueError as e:
+                raise ValueError(f"Invalid {spec.metadata['env']}={raw!r}: {e}") from e
+        return cls(**values)
+
+    def require(self, name: str) -> Any:
+        """A setting that must be present for the caller to work"""
+        value = getattr(self, name)
+        if value in (None, ""):
+            env = next(spec.metadata["env"] for spec in fields(self) if spec.name == name)
+            raise RuntimeError(f"{env} must be set")
+        return value
+
+
+def _parser(annotation: Any) -> Callable[[str], Any]:
+    if annotation is Optional[str]:
+        return str
+    return annotation
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    load_dotenv(ROOT_DIR / ".env")
+    return Settings.from_env()
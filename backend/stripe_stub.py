@@ -0,0 +1,121 @@
+"""Local stand-in for the parts of the Stripe API the backend uses.
+
+Run with ``uvicorn stripe_stub:app --port 12111`` and point the backend at it
+with ``STRIPE_API_BASE=http://localhost:12111``. Payment intents succeed
+immediately unless ``STRIPE_STUB_INTENT_STATUS`` says otherwise; latency and
+transient failures can be injected to exercise retries. When
+``STRIPE_STUB_WEBHOOK_URL`` is set, a signed ``payment_intent.succeeded``
+event is delivered there for every succeeded intent.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict
+
+import httpx
+from fastapi import BackgroundTasks, FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Stripe stand-in")
+
+INTENT_STATUS = os.environ.get("STRIPE_STUB_INTENT_STATUS", "succeeded")
+LATENCY_SECONDS = float(os.environ.get("STRIPE_STUB_LATENCY_SECONDS", "0"))
+FAILURE_RATE = float(os.environ.get("STRIPE_STUB_FAILURE_RATE", "0"))
+WEBHOOK_URL = os.environ.get("STRIPE_STUB_WEBHOOK_URL")
+WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "whsec_stub")
+
+payment_intents: Dict[str, Dict[str, Any]] = {}
+idempotent_responses: Dict[str, Dict[str, Any]] = {}
+
+
+def parse_form(form) -> Dict[str, Any]:
+    """Undo Stripe's bracketed form encoding (one level of nesting is enough here)"""
+    data: Dict[str, Any] = {}
+    for key, value in form.multi_items():
+        if "[" in key:
+            name, sub_key = key.rstrip("]").split("[", 1)
+            data.setdefault(name, {})[sub_key] = value
+        else:
+            data[key] = value
+    return data
+
+
+async def simulate_network():
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"type": "api_error", "message": "Injected failure"}},
+        )
+    return None
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: int) -> str:
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+async def send_webhook(event_type: str, obj: Dict[str, Any]):
+    payload = json.dumps({
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {"object": obj},
+    }).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "Stripe-Signature": sign_payload(payload, WEBHOOK_SECRET, int(time.time())),
+    }
+    async with httpx.AsyncClient(timeout=10) as client:
+        await client.post(WEBHOOK_URL, content=payload, headers=headers)
+
+
+@app.post("/v1/payment_intents")
+async def create_payment_intent(request: Request, background_tasks: BackgroundTasks,
+                                idempotency_key: str = Header(None)):
+    failure = await simulate_network()
+    if failure:
+        return failure
+    if idempotency_key and idempotency_key in idempotent_responses:
+        return idempotent_responses[idempotency_key]
+
+    params = parse_form(await request.form())
+    intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+    intent = {
+        "id": intent_id,
+        "object": "payment_intent",
+        "amount": int(params["amount"]),
+        "currency": params.get("currency", "gbp"),
+        "metadata": params.get("metadata", {}),
+        "status": INTENT_STATUS,
+        "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:16]}",
+        "created": int(time.time()),
+    }
+    payment_intents[intent_id] = intent
+    if idempotency_key:
+        idempotent_responses[idempotency_key] = intent
+    if WEBHOOK_URL and intent["status"] == "succeeded":
+        background_tasks.add_task(send_webhook, "payment_intent.succeeded", intent)
+    return intent
+
+
+@app.get("/v1/payment_intents/{intent_id}")
+async def retrieve_payment_intent(intent_id: str):
+    failure = await simulate_network()
+    if failure:
+        return failure
+    intent = payment_intents.get(intent_id)
+    if not intent:
+        return JSONResponse(
+            status_code=404,
+            content={"error": {"type": "invalid_request_error", "code": "resource_missing",
+                               "message": f"No such payment_intent: '{intent_id}'"}},
+        )
+    return intent
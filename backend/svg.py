@@ -0,0 +1,154 @@
+"""Validation and sanitizing of generated SVG.
+
+Model output is untrusted markup that ends up in customers' browsers and
+design tools, so it is rebuilt from an allow-list rather than filtered: only
+basic shapes, paths, groups and gradients survive, with presentation
+attributes (``style`` declarations are folded into them) and local
+``url(#id)`` references. Scripts, event handlers, external references, text,
+images and anything else are dropped. The result is also what
+``logo_assets.py`` knows how to rasterize.
+"""
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+
+MAX_SVG_BYTES = 64 * 1024
+MAX_ELEMENTS = 1000
+# Rebuilding, serializing and rasterizing all recurse into nested elements
+MAX_DEPTH = 32
+
+SVG_BLOCK = re.compile(r"<svg\b.*?</svg\s*>", re.DOTALL | re.IGNORECASE)
+# Entity declarations are how XML bombs and external entities get in
+FORBIDDEN_MARKUP = re.compile(r"<!DOCTYPE|<!ENTITY|<\?xml-stylesheet", re.IGNORECASE)
+
+PRESENTATION = {
+    "fill", "fill-opacity", "fill-rule", "opacity", "stroke", "stroke-width", "stroke-opacity",
+    "stroke-linejoin", "stroke-linecap", "transform", "id",
+}
+SHAPES = {
+    "rect": {"x", "y", "width", "height", "rx", "ry"},
+    "circle": {"cx", "cy", "r"},
+    "ellipse": {"cx", "cy", "rx", "ry"},
+    "line": {"x1", "y1", "x2", "y2"},
+    "polyline": {"points"},
+    "polygon": {"points"},
+    "path": {"d"},
+}
+ELEMENTS: Dict[str, set] = {
+    "svg": {"viewBox", "width", "height", "preserveAspectRatio"} | PRESENTATION,
+    "g": PRESENTATION,
+    "defs": set(),
+    "linearGradient": {"id", "x1", "y1", "x2", "y2", "gradientUnits", "gradientTransform", "spreadMethod"},
+    "radialGradient": {"id", "cx", "cy", "r", "fx", "fy", "gradientUnits", "gradientTransform", "spreadMethod"},
+    "stop": {"offset", "stop-color", "stop-opacity"},
+    **{name: attributes | PRESENTATION for name, attributes in SHAPES.items()},
+}
+# Values that may only be numbers, lists of numbers, or transforms/path data
+NUMERIC = re.compile(r"^[\s\d.,eE+\-%a-zA-Z()]*$")
+PAINT_REFERENCE = re.compile(r"^url\(\s*#([\w.\-]+)\s*\)$")
+
+
+class InvalidSVG(ValueError):
+    pass
+
+
+def extract_svg(text: str) -> Optional[str]:
+    """The first ``<svg>...</svg>`` element in model output, if any"""
+    match = SVG_BLOCK.search(text)
+    return match.group(0) if match else None
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def style_declarations(style: str) -> Dict[str, str]:
+    declarations = {}
+    for declaration in style.split(";"):
+        name, _, value = declaration.partition(":")
+        if value.strip():
+            declarations[name.strip()] = value.strip()
+    return declarations
+
+
+def clean_value(name: str, value: str) -> Optional[str]:
+    value = value.strip()
+    if not value or len(value) > 16384:
+        return None
+    if name in ("fill", "stroke"):
+        if value.startswith("url("):
+            return value if PAINT_REFERENCE.match(value) else None
+        return value if re.match(r"^[#\w(),.%\s]+$", value) else None
+    if name in ("id", "stop-color", "fill-rule", "stroke-linejoin", "stroke-linecap", "gradientUnits",
+                "spreadMethod", "preserveAspectRatio"):
+        return value if re.match(r"^[#\w(),.%\s\-]+$", value) else None
+    return value if NUMERIC.match(value) else None
+
+
+def parse_view_box(root: ET.Element) -> List[float]:
+    try:
+        if root.get("viewBox"):
+            view_box = [float(part) for part in re.split(r"[\s,]+", root.get("viewBox").strip())]
+        else:
+            view_box = [0.0, 0.0, float(root.get("width", "").rstrip("px")), float(root.get("height", "").rstrip("px"))]
+    except ValueError:
+        raise InvalidSVG("no usable viewBox or width/height")
+    if len(view_box) != 4 or view_box[2] <= 0 or view_box[3] <= 0:
+        raise InvalidSVG("viewBox must have a positive width and height")
+    return view_box
+
+
+def sanitize_svg(markup: str) -> str:
+    """Rebuild ``markup`` from the allow-list; raises InvalidSVG if nothing drawable is left"""
+    if len(markup.encode("utf-8")) > MAX_SVG_BYTES:
+        raise InvalidSVG(f"larger than {MAX_SVG_BYTES} bytes")
+    if FORBIDDEN_MARKUP.search(markup):
+        raise InvalidSVG("document type and entity declarations are not allowed")
+    try:
+        root = ET.fromstring(markup)
+    except ET.ParseError as e:
+        raise InvalidSVG(f"not well-formed: {e}") from e
+    if local_name(root.tag) != "svg":
+        raise InvalidSVG("root element is not <svg>")
+
+    count = 0
+    drawn = 0
+
+    def rebuild(source: ET.Element, depth: int) -> Optional[ET.Element]:
+        nonlocal count, drawn
+        name = local_name(source.tag)
+        if name not in ELEMENTS:
+            return None
+        count += 1
+        if count > MAX_ELEMENTS:
+            raise InvalidSVG(f"more than {MAX_ELEMENTS} elements")
+        if depth > MAX_DEPTH:
+            raise InvalidSVG(f"elements nested more than {MAX_DEPTH} deep")
+        allowed = ELEMENTS[name]
+        attributes = {local_name(key): value for key, value in source.attrib.items() if not key.startswith("{")}
+        attributes.update(
+            (key, value) for key, value in style_declarations(attributes.pop("style", "")).items() if key in allowed
+        )
+        element = ET.Element(name)
+        for key in sorted(attributes):
+            if key in allowed:
+                value = clean_value(key, attributes[key])
+                if value is not None:
+                    element.set(key, value)
+        if name in SHAPES:
+            drawn += 1
+        for child in source:
+            rebuilt = rebuild(child, depth + 1)
+            if rebuilt is not None:
+                element.append(rebuilt)
+        return element
+
+    view_box = parse_view_box(root)
+    clean = rebuild(root, 1)
+    if not drawn:
+        raise InvalidSVG("no shapes")
+    clean.set("xmlns", SVG_NAMESPACE)
+    clean.set("viewBox", " ".join(f"{value:g}" for value in view_box))
+    return ET.tostring(clean, encoding="unicode")
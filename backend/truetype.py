@@ -0,0 +1,210 @@
+"""Just enough TrueType to embed a font in a PDF.
+
+Reads a font's Unicode cmap and advance widths, and writes subsets that keep
+only the glyphs a document uses. Subsets keep the original glyph ids, so a
+PDF can address glyphs directly (``Identity-H`` with ``/CIDToGIDMap
+/Identity``); unused glyphs are left empty rather than renumbered, and tables
+a PDF viewer does not need (names, layout features, the cmap itself) are
+dropped. Standard library only, like the rest of the rendering code.
+"""
+import struct
+from typing import Dict, Iterable, Iterator, List, Set
+
+# Tables kept in subsets, besides the rewritten head, loca and glyf
+SUBSET_TABLES = ("cvt ", "fpgm", "prep", "hhea", "hmtx", "maxp")
+
+# Composite glyph flags
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+class InvalidFont(ValueError):
+    """The data is not a TrueType font this module can read"""
+
+
+def checksum(data: bytes) -> int:
+    padded = data + b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(padded) // 4}I", padded)) & 0xFFFFFFFF
+
+
+def build_sfnt(tables: Dict[str, bytes]) -> bytes:
+    """A font file holding ``tables``, with checksums and head's checkSumAdjustment filled in"""
+    tags = sorted(tables)
+    search_range = 1
+    while search_range * 2 <= len(tags):
+        search_range *= 2
+    entry_selector = search_range.bit_length() - 1
+    header = struct.pack(">IHHHH", 0x00010000, len(tags), search_range * 16, entry_selector,
+                         len(tags) * 16 - search_range * 16)
+    offset = len(header) + 16 * len(tags)
+    records, body = [], bytearray()
+    for tag in tags:
+        data = tables[tag]
+        records.append(struct.pack(">4sIII", tag.encode("latin-1"), checksum(data), offset + len(body), len(data)))
+        body += data + b"\0" * (-len(data) % 4)
+    font = bytearray(header + b"".join(records) + body)
+    if "head" in tables:
+        head_offset = offset + sum(len(tables[tag]) + (-len(tables[tag]) % 4) for tag in tags[:tags.index("head")])
+        struct.pack_into(">I", font, head_offset + 8, (0xB1B0AFBA - checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+
+def parse_cmap(cmap: bytes) -> Dict[int, int]:
+    """Code point -> glyph id, from the best Unicode subtable (format 12, else format 4)"""
+    (count,) = struct.unpack_from(">H", cmap, 2)
+    subtables = {}
+    for index in range(count):
+        platform, encoding, offset = struct.unpack_from(">HHI", cmap, 4 + 8 * index)
+        subtables[(platform, encoding)] = offset
+    for key in ((3, 10), (0, 4), (0, 6), (3, 1), (0, 3)):
+        if key not in subtables:
+            continue
+        offset = subtables[key]
+        (fmt,) = struct.unpack_from(">H", cmap, offset)
+        if fmt == 12:
+            return _cmap_format_12(cmap, offset)
+        if fmt == 4:
+            return _cmap_format_4(cmap, offset)
+    raise InvalidFont("font has no Unicode cmap in format 4 or 12")
+
+
+def _cmap_format_12(cmap: bytes, offset: int) -> Dict[int, int]:
+    (groups,) = struct.unpack_from(">I", cmap, offset + 12)
+    mapping = {}
+    for index in range(groups):
+        start, end, glyph = struct.unpack_from(">III", cmap, offset + 16 + 12 * index)
+        for code in range(start, end + 1):
+            mapping[code] = glyph + code - start
+    return mapping
+
+
+def _cmap_format_4(cmap: bytes, offset: int) -> Dict[int, int]:
+    segments = struct.unpack_from(">H", cmap, offset + 6)[0] // 2
+    ends = struct.unpack_from(f">{segments}H", cmap, offset + 14)
+    starts_at = offset + 16 + 2 * segments
+    starts = struct.unpack_from(f">{segments}H", cmap, starts_at)
+    deltas = struct.unpack_from(f">{segments}h", cmap, starts_at + 2 * segments)
+    ranges_at = starts_at + 4 * segments
+    range_offsets = struct.unpack_from(f">{segments}H", cmap, ranges_at)
+    mapping = {}
+    for index, (start, end, delta, range_offset) in enumerate(zip(starts, ends, deltas, range_offsets)):
+        for code in range(start, min(end, 0xFFFE) + 1):
+            if range_offset == 0:
+                glyph = (code + delta) & 0xFFFF
+            else:
+                # idRangeOffset is relative to its own position in the array
+                (glyph,) = struct.unpack_from(">H", cmap, ranges_at + 2 * index + range_offset + 2 * (code - start))
+                glyph = (glyph + delta) & 0xFFFF if glyph else 0
+            if glyph:
+                mapping[code] = glyph
+    return mapping
+
+
+def composite_components(glyph: bytes) -> Iterator[int]:
+    """Glyph ids a composite glyph is assembled from"""
+    offset = 10
+    while True:
+        flags, component = struct.unpack_from(">HH", glyph, offset)
+        yield component
+        if not flags & MORE_COMPONENTS:
+            return
+        offset += 4 + (4 if flags & ARG_1_AND_2_ARE_WORDS else 2)
+        if flags & WE_HAVE_A_SCALE:
+            offset += 2
+        elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+            offset += 4
+        elif flags & WE_HAVE_A_TWO_BY_TWO:
+            offset += 8
+
+
+class Advances(dict):
+    """Character -> advance width; characters without a glyph take .notdef's"""
+
+    def __init__(self, advances: Dict[str, float], missing: float):
+        super().__init__(advances)
+        self.missing = missing
+
+    def __missing__(self, char: str) -> float:
+        return self.missing
+
+
+class TrueTypeFont:
+    """A parsed TrueType font: glyph lookup, metrics, and subsetting"""
+
+    def __init__(self, data: bytes):
+        if data[:4] not in (b"\x00\x01\x00\x00", b"true"):
+            raise InvalidFont("not a TrueType font (CFF-based and collection files are not supported)")
+        (count,) = struct.unpack_from(">H", data, 4)
+        self.tables: Dict[str, bytes] = {}
+        for index in range(count):
+            tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * index)
+            self.tables[tag.decode("latin-1")] = data[offset:offset + length]
+        missing = {"head", "hhea", "maxp", "hmtx", "loca", "glyf", "cmap"} - set(self.tables)
+        if missing:
+            raise InvalidFont(f"font is missing tables: {', '.join(sorted(missing))}")
+
+        head = self.tables["head"]
+        (self.units_per_em,) = struct.unpack_from(">H", head, 18)
+        self.bbox = struct.unpack_from(">4h", head, 36)
+        (loca_format,) = struct.unpack_from(">h", head, 50)
+        self.ascent, self.descent = struct.unpack_from(">hh", self.tables["hhea"], 4)
+        (metrics,) = struct.unpack_from(">H", self.tables["hhea"], 34)
+        (self.glyph_count,) = struct.unpack_from(">H", self.tables["maxp"], 4)
+
+        advances = list(struct.unpack_from(f">{metrics * 2}H", self.tables["hmtx"])[::2])
+        # Glyphs past the last full metric share its advance
+        self.advances: List[int] = advances + advances[-1:] * (self.glyph_count - metrics)
+        if loca_format == 0:
+            self.loca = [2 * value for value in struct.unpack_from(f">{self.glyph_count + 1}H", self.tables["loca"])]
+        else:
+            self.loca = list(struct.unpack_from(f">{self.glyph_count + 1}I", self.tables["loca"]))
+        self.cmap = parse_cmap(self.tables["cmap"])
+        self.char_advances = Advances(
+            {chr(code): self.advance(glyph) for code, glyph in self.cmap.items()}, self.advance(0)
+        )
+
+    def glyph(self, char: str) -> int:
+        """The glyph for a character; 0 (.notdef) when the font has none"""
+        return self.cmap.get(ord(char), 0)
+
+    def advance(self, glyph: int) -> float:
+        """Advance width in 1/1000 em, PDF's glyph space"""
+        return self.advances[glyph] * 1000 / self.units_per_em
+
+    def measure(self, text: str) -> float:
+        """Advance width of ``text`` in 1/1000 em; there is no kerning"""
+        return sum(map(self.char_advances.__getitem__, text))
+
+    def scaled(self, value: int) -> int:
+        return round(value * 1000 / self.units_per_em)
+
+    def subset(self, glyphs: Iterable[int]) -> bytes:
+        """A font file with only ``glyphs`` (and what they are built from) drawn; glyph ids are unchanged"""
+        glyf = self.tables["glyf"]
+        keep: Set[int] = {0}
+        pending = [0, *glyphs]
+        while pending:
+            glyph = pending.pop()
+            data = glyf[self.loca[glyph]:self.loca[glyph + 1]]
+            keep.add(glyph)
+            if len(data) >= 10 and struct.unpack_from(">h", data)[0] < 0:
+                pending.extend(component for component in composite_components(data) if component not in keep)
+
+        outlines, loca = bytearray(), []
+        for glyph in range(self.glyph_count):
+            loca.append(len(outlines))
+            if glyph in keep:
+                outlines += glyf[self.loca[glyph]:self.loca[glyph + 1]]
+                outlines += b"\0" * (-len(outlines) % 4)
+        loca.append(len(outlines))
+
+        head = bytearray(self.tables["head"])
+        struct.pack_into(">I", head, 8, 0)
+        # Always write long offsets
+        struct.pack_into(">h", head, 50, 1)
+        tables = {tag: self.tables[tag] for tag in SUBSET_TABLES if tag in self.tables}
+        tables.update(head=bytes(head), loca=struct.pack(f">{len(loca)}I", *loca), glyf=bytes(outlines))
+        return build_sfnt(tables)
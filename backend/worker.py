@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+# Backend modules import each other as top-level modules (uvicorn runs from
+# backend/), so make that work for `python -m backend.worker` too.
+ROOT_DIR = Path(__file__).parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from job_queue import JobQueue
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+FailureHandler = Callable[[Dict[str, Any], str, bool], Awaitable[None]]
+
+
+class Worker:
+    """Runs up to ``concurrency`` leased jobs at a time from a JobQueue"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: JobHandler,
+        *,
+        on_failure: Optional[FailureHandler] = None,
+        housekeeping: Optional[Callable[[], Awaitable[Any]]] = None,
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        worker_id: Optional[str] = None,
+        kind_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.on_failure = on_failure
+        # Periodic upkeep run alongside lease reaping (e.g. sweeping stuck payments)
+        self.housekeeping = housekeeping
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Most slots one kind of job may hold, so long jobs cannot crowd out short ones
+        self.kind_limits = kind_limits or {}
+        self._running_kinds: Counter = Counter()
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """Claim and run jobs until stop() is called"""
+        logger.info(f"Worker {self.worker_id} started with concurrency {self.concurrency}")
+        reaper = asyncio.create_task(self._reap_loop())
+        try:
+            while not self._stopping.is_set():
+                if len(self._tasks) >= self.concurrency:
+                    await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                saturated = [kind for kind, limit in self.kind_limits.items() if self._running_kinds[kind] >= limit]
+                try:
+                    job = await self.queue.claim(self.worker_id, exclude_kinds=saturated)
+                except Exception as e:
+                    logger.error(f"Error claiming job: {str(e)}")
+                    job = None
+
+                if job is None:
+                    await self._sleep(self.poll_interval * random.uniform(0.5, 1.5))
+                    continue
+
+                self._start(job)
+        finally:
+            reaper.cancel()
+
+    @property
+    def active(self) -> int:
+        """Jobs this worker is running right now"""
+        return len(self._tasks)
+
+    def _start(self, job: Dict[str, Any]):
+        kind = job.get("kind")
+        self._running_kinds[kind] += 1
+        task = asyncio.create_task(self._run_job(job))
+        self._tasks.add(task)
+
+        def done(task: asyncio.Task):
+            self._tasks.discard(task)
+            self._running_kinds[kind] -= 1
+
+        task.add_done_callback(done)
+
+    async def stop(self, grace_period: float = 30.0):
+        """Stop claiming and wait for in-flight jobs; unfinished ones are reaped later"""
+        self._stopping.set()
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=grace_period)
+        for task in self._tasks:
+            task.cancel()
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run_job(self, job: Dict[str, Any]):
+        work = asyncio.create_task(self.handler(job))
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job, work))
+        try:
+            await work
+        except asyncio.CancelledError:
+            logger.warning(f"Job {job['_id']} for order {job['order_id']} cancelled")
+            return
+        except Exception as e:
+            logger.error(f"Job {job['_id']} for order {job['order_id']} failed: {str(e)}")
+            will_retry = await self.queue.fail(job, str(e))
+            if self.on_failure:
+                await self.on_failure(job, str(e), will_retry)
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self.queue.complete(job)
+
+    async def _heartbeat_loop(self, job: Dict[str, Any], work: asyncio.Task):
+        interval = self.queue.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.queue.heartbeat(job):
+                    logger.warning(f"Lost lease on job {job['_id']}, cancelling")
+                    work.cancel()
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat failed for job {job['_id']}: {str(e)}")
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds * random.uniform(0.5, 1.0))
+            try:
+                for job in await self.queue.reap_expired():
+                    if self.on_failure:
+                        await self.on_failure(job, "lease expired", False)
+            except Exception as e:
+                logger.error(f"Error reaping expired jobs: {str(e)}")
+            if self.housekeeping:
+                try:
+                    await self.housekeeping()
+                except Exception as e:
+                    logger.error(f"Error running worker housekeeping: {str(e)}")
+
+
+async def serve_metrics(port: int, render: Callable[[], Awaitable[str]], content_type: str):
+    """Answer every HTTP request on ``port`` with the current metrics.
+
+    Standalone workers have no web app to scrape, so this is just enough
+    HTTP for Prometheus.
+    """
+
+    async def respond(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            body = (await render()).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(respond, port=port)
+
+
+async def main(concurrency: int, poll_interval: float, metrics_port: Optional[int] = None):
+    import metrics
+    import server
+
+    await server.services.index_manager.ensure()
+    worker = server.build_order_worker(concurrency=concurrency, poll_interval=poll_interval)
+    metrics_server = None
+    if metrics_port:
+        metrics_server = await serve_metrics(metrics_port, server.render_metrics, metrics.CONTENT_TYPE)
+        logger.info(f"Serving metrics on port {metrics_port}")
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(worker.stop()))
+
+    try:
+        await worker.run()
+    finally:
+        await worker.stop()
+        if metrics_server is not None:
+            metrics_server.close()
+        await server.services.aclose()
+
+
+if __name__ == "__main__":
+    from settings import get_settings
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Run order generation jobs from the queue")
+    parser.add_argument("--concurrency", type=int, default=settings.worker_concurrency)
+    parser.add_argument("--poll-interval", type=float, default=settings.worker_poll_interval)
+    parser.add_argument("--metrics-port", type=int, default=settings.worker_metrics_port,
+                        help="Serve Prometheus metrics on this port (0 disables)")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.poll_interval, args.metrics_port))
@@ -93,10 +93,12 @@ const App = () => {
     }
   };
 
-  const createPaymentIntent = async (serviceType) => {
+  const createPaymentIntent = async (orderRequest, orderReference) => {
     try {
+      // The backend creates the order up front; Stripe's webhook marks it paid
       const response = await axios.post(`${API}/create-payment-intent`, {
-        service_type: serviceType
+        ...orderRequest,
+        order_reference: orderReference
       }, {
         headers: { 'Content-Type': 'application/json' }
       });
@@ -252,6 +254,10 @@ const App = () => {
     const elements = useElements();
     const [isProcessing, setIsProcessing] = useState(false);
     const [paymentError, setPaymentError] = useState(null);
+    // Stable for this checkout so retried submissions reuse the same payment intent
+    const [orderReference] = useState(() => (
+      window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+    ));
 
     const handleSubmit = async (event) => {
       event.preventDefault();
@@ -265,7 +271,7 @@ const App = () => {
 
       try {
         // Create payment intent
-        const paymentIntentData = await createPaymentIntent(orderRequest.service_type);
+        const paymentIntentData = await createPaymentIntent(orderRequest, orderReference);
         
         // Confirm payment
         const result = await stripe.confirmCardPayment(paymentIntentData.client_secret, {
@@ -705,13 +711,16 @@ const App = () => {
   const SuccessPage = () => {
     const [order, setOrder] = useState(orderData);
     const [isChecking, setIsChecking] = useState(false);
+    const [streamedContent, setStreamedContent] = useState({});
 
     const checkOrderStatus = async () => {
       if (!order?.id) return;
       
       setIsChecking(true);
       try {
-        const response = await axios.get(`${API}/orders/${order.id}`);
+        const response = await axios.get(`${API}/orders/${order.id}`, {
+          params: { include_content: true }
+        });
         setOrder(response.data);
       } catch (error) {
         console.error('Error checking order status:', error);
@@ -721,12 +730,52 @@ const App = () => {
     };
 
     useEffect(() => {
-      const interval = setInterval(checkOrderStatus, 5000); // Check every 5 seconds
-      return () => clearInterval(interval);
+      if (!order?.id) return;
+
+      let interval = null;
+      const startPolling = () => {
+        interval = setInterval(checkOrderStatus, 5000); // Check every 5 seconds
+      };
+
+      if (typeof EventSource === 'undefined') {
+        startPolling();
+        return () => clearInterval(interval);
+      }
+
+      // Stream status changes and content as it is generated
+      const source = new EventSource(`${API}/orders/${order.id}/stream`);
+      source.addEventListener('status', (event) => {
+        const data = JSON.parse(event.data);
+        setOrder((prev) => ({ ...prev, status: data.status }));
+      });
+      source.addEventListener('delta', (event) => {
+        const data = JSON.parse(event.data);
+        setStreamedContent((prev) => ({
+          ...prev,
+          [data.key]: (prev[data.key] || '').slice(0, data.offset) + data.text
+        }));
+      });
+      source.addEventListener('complete', (event) => {
+        const data = JSON.parse(event.data);
+        setOrder((prev) => ({ ...prev, ...data }));
+        source.close();
+      });
+      source.onerror = () => {
+        // Fall back to polling if the stream is unavailable
+        source.close();
+        startPolling();
+      };
+
+      return () => {
+        source.close();
+        clearInterval(interval);
+      };
     }, [order?.id]);
 
     const renderGeneratedContent = () => {
-      if (!order?.generated_content) return null;
+      const content = order?.generated_content ||
+        (Object.keys(streamedContent).length > 0 ? streamedContent : null);
+      if (!content) return null;
 
       return (
         <div className="mt-8 p-6 bg-gray-50 rounded-lg">
@@ -735,7 +784,7 @@ const App = () => {
             Your Generated Content:
           </h3>
           
-          {Object.entries(order.generated_content).map(([key, value]) => (
+          {Object.entries(content).map(([key, value]) => (
             <div key={key} className="content-section">
               <h4 className="content-title">
                 {key.replace('_', ' ')}:
@@ -746,11 +795,13 @@ const App = () => {
             </div>
           ))}
           
-          <div className="mt-4 p-4 bg-blue-50 rounded-lg">
-            <p className="text-blue-800 font-semibold">
-              💾 Content is ready for download! Check your email for the formatted files.
-            </p>
-          </div>
+          {order?.generated_content && (
+            <div className="mt-4 p-4 bg-blue-50 rounded-lg">
+              <p className="text-blue-800 font-semibold">
+                💾 Content is ready for download! Check your email for the formatted files.
+              </p>
+            </div>
+          )}
         </div>
       );
     };
@@ -775,6 +826,10 @@ const App = () => {
                   <span className="bg-yellow-100 text-yellow-800 px-6 py-3 rounded-full animate-pulse">
                     🤖 AI is generating your content...
                   </span>
+                ) : order?.status === 'awaiting_payment' ? (
+                  <span className="bg-blue-100 text-blue-800 px-6 py-3 rounded-full animate-pulse">
+                    💳 Confirming your payment...
+                  </span>
                 ) : (
                   <span className="bg-blue-100 text-blue-800 px-6 py-3 rounded-full">
                     📋 Payment received - Starting processing
@@ -850,16 +905,18 @@ const App = () => {
   const Dashboard = () => {
     const [customerEmail, setCustomerEmail] = useState('');
     const [customerOrders, setCustomerOrders] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [orderContent, setOrderContent] = useState({});
     const [isLoading, setIsLoading] = useState(false);
 
-    const handleFetchOrders = async (e) => {
-      e.preventDefault();
-      if (!customerEmail) return;
-
+    const fetchOrders = async (cursor = null) => {
       setIsLoading(true);
       try {
-        const response = await axios.get(`${API}/orders?customer_email=${customerEmail}`);
-        setCustomerOrders(response.data);
+        const response = await axios.get(`${API}/orders`, {
+          params: { customer_email: customerEmail, ...(cursor ? { cursor } : {}) }
+        });
+        setCustomerOrders((prev) => cursor ? [...prev, ...response.data.orders] : response.data.orders);
+        setNextCursor(response.data.next_cursor);
       } catch (error) {
         console.error('Error fetching orders:', error);
         alert('Error fetching orders. Please try again.');
@@ -868,6 +925,24 @@ const App = () => {
       }
     };
 
+    const handleFetchOrders = async (e) => {
+      e.preventDefault();
+      if (!customerEmail) return;
+      await fetchOrders();
+    };
+
+    // Order history only lists summaries; content is loaded per order on demand
+    const loadOrderContent = async (orderId) => {
+      try {
+        const response = await axios.get(`${API}/orders/${orderId}`, {
+          params: { include_content: true }
+        });
+        setOrderContent((prev) => ({ ...prev, [orderId]: response.data.generated_content }));
+      } catch (error) {
+        console.error('Error loading order content:', error);
+      }
+    };
+
     return (
       <div className="min-h-screen bg-gray-50 pt-24 pb-16">
         <div className="max-w-6xl mx-auto px-4 sm:px-6 lg:px-8">
@@ -920,16 +995,28 @@ const App = () => {
                           {order.status === 'processing' && '⚡ '}
                           {order.status === 'failed' && '❌ '}
                           {order.status === 'pending' && '📋 '}
-                          {order.status}
+                          {order.status === 'awaiting_payment' && '💳 '}
+                          {order.status.replace('_', ' ')}
                         </span>
                       </div>
                     </div>
 
-                    {order.status === 'completed' && order.generated_content && (
+                    {order.status === 'completed' && !orderContent[order.id] && (
+                      <div className="mt-4">
+                        <button
+                          onClick={() => loadOrderContent(order.id)}
+                          className="btn-secondary"
+                        >
+                          👀 View Content
+                        </button>
+                      </div>
+                    )}
+
+                    {order.status === 'completed' && orderContent[order.id] && (
                       <div className="mt-4 p-4 bg-gray-50 rounded-lg">
                         <h4 className="font-semibold text-gray-900 mb-2">Generated Content:</h4>
                         <div className="space-y-3">
-                          {Object.entries(order.generated_content).map(([key, value]) => (
+                          {Object.entries(orderContent[order.id]).map(([key, value]) => (
                             <div key={key}>
                               <h5 className="font-medium text-gray-800 capitalize">
                                 {key.replace('_', ' ')}:
@@ -949,6 +1036,17 @@ const App = () => {
                     )}
                   </div>
                 ))}
+                {nextCursor && (
+                  <div className="text-center">
+                    <button
+                      onClick={() => fetchOrders(nextCursor)}
+                      disabled={isLoading}
+                      className="btn-secondary"
+                    >
+                      {isLoading ? 'Loading...' : 'Load More Orders'}
+                    </button>
+                  </div>
+                )}
               </div>
             ) : customerEmail && !isLoading ? (
               <div className="text-center py-8">
@@ -0,0 +1,81 @@
+"""Shared fixtures.
+
+The backend's modules import each other as top-level modules, so ``backend/``
+goes on the path. Mongo is an in-memory ``mongomock_motor`` client; async tests
+run on asyncio through anyio's pytest plugin (``@pytest.mark.anyio``).
+"""
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Read once when settings.py is imported; nothing connects to these
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    from mongomock_motor import AsyncMongoMockClient
+
+    return AsyncMongoMockClient()["test_database"]
+
+
+@pytest.fixture
+def stripe_stub():
+    import stripe_stub
+
+    stripe_stub.payment_intents.clear()
+    stripe_stub.idempotent_responses.clear()
+    return stripe_stub
+
+
+@pytest.fixture
+def stripe_gateway(stripe_stub):
+    from payments import StripeGateway
+
+    gateway = StripeGateway("sk_test", api_base="http://stripe.test", backoff_base=0.0)
+    gateway._client._transport = httpx.ASGITransport(app=stripe_stub.app)
+    return gateway
+
+
+@pytest.fixture
+async def server(monkeypatch, stripe_gateway, tmp_path):
+    """The API module with fresh services on an in-memory database, and indexes created"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+    from services import Services
+    from settings import Settings
+
+    services = Services(Settings(
+        mongo_url="mongodb://localhost:27017", db_name="test_database", openai_api_key="sk-test",
+        stripe_secret_key="sk_test", stripe_webhook_secret=WEBHOOK_SECRET, artifact_dir=tmp_path / "artifacts",
+    ))
+    services.client = AsyncMongoMockClient()
+    services.stripe_gateway = stripe_gateway
+    monkeypatch.setattr(server, "services", services)
+    monkeypatch.setattr(server, "STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    await services.index_manager.ensure()
+    yield server
+    await services.aclose()
+
+
+@pytest.fixture
+async def api(server):
+    """An HTTP client for the API app (its lifespan is not run; ``server`` stands in for it)"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.create_app()), base_url="http://test") as client:
+        yield client
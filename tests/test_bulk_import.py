@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from bulk_import import parse_bulk_rows, requirement_key
+
+pytestmark = pytest.mark.anyio
+
+SOCIAL_MEDIA_CSV = (
+    "Business Type,Target Audience,Platforms,Tone\n"
+    'Coffee shop,"Students, commuters",Instagram; TikTok,Playful\n'
+    "Bakery,Families,LinkedIn,\n"
+)
+
+
+def test_requirement_key_normalises_headers():
+    assert requirement_key(" Target Role ") == "target_role"
+    assert requirement_key("Preferred Colors (hex)") == "preferred_colors_hex"
+
+
+def test_csv_rows_become_requirements():
+    rows = parse_bulk_rows(SOCIAL_MEDIA_CSV.encode(), "text/csv; charset=utf-8", max_rows=10)
+
+    assert rows == [
+        {"business_type": "Coffee shop", "target_audience": "Students, commuters",
+         "platforms": ["Instagram", "TikTok"], "tone": "Playful"},
+        {"business_type": "Bakery", "target_audience": "Families", "platforms": ["LinkedIn"]},
+    ]
+
+
+def test_ndjson_rows_are_used_as_is():
+    body = "\n".join([
+        json.dumps({"requirements": {"platforms": ["Instagram"]}}),
+        "",
+        json.dumps({"skills": "Python; SQL"}),
+    ])
+
+    rows = parse_bulk_rows(body.encode(), "application/x-ndjson", max_rows=10)
+
+    assert rows == [{"platforms": ["Instagram"]}, {"skills": "Python; SQL"}]
+
+
+@pytest.mark.parametrize("body, content_type, message", [
+    (b"", "text/csv", "no header row"),
+    (b"name\n", "text/csv", "no rows"),
+    (b"{\n", "application/x-ndjson", "Line 1"),
+    (b"[1]\n", "application/x-ndjson", "JSON object"),
+    (b'{"name": "Ada"}\n"Ada"\n', "application/x-ndjson", "Line 2: expected a JSON object"),
+    (b'{"requirements": ["Ada"]}\n', "application/x-ndjson", "Line 1: requirements must be a JSON object"),
+    (b'{"requirements": null}\n', "application/x-ndjson", "requirements must be a JSON object"),
+    (b"name\na\nb\nc\n", "text/csv", "limit of 2 rows"),
+    (b"name\na\n", "text/plain", "Unsupported content type"),
+])
+def test_malformed_uploads_are_rejected(body, content_type, message):
+    with pytest.raises(ValueError, match=message):
+        parse_bulk_rows(body, content_type, max_rows=2)
+
+
+def test_details_accept_lists_and_strings():
+    from server import listed, social_media_details
+
+    assert listed(["Instagram", "TikTok"]) == "Instagram, TikTok"
+    assert listed("Instagram and TikTok") == "Instagram and TikTok"
+    assert "Platforms: Instagram, LinkedIn, Twitter\n" in social_media_details({})
+
+
+async def test_bulk_import_of_social_media_rows(api, server):
+    response = await api.post(
+        "/api/orders/bulk",
+        params={"service_type": "social_media", "customer_email": "b2b@example.com", "customer_name": "B2B"},
+        content=SOCIAL_MEDIA_CSV.encode(),
+        headers={"Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 202
+    assert response.json()["batch"]["total"] == 2
+    order = await server.services.db.orders.find_one({"batch_row": 1})
+    assert order["requirements"]["platforms"] == ["Instagram", "TikTok"]
+    assert "Platforms: Instagram, TikTok\n" in server.social_media_details(order["requirements"])
+    assert await server.services.db.generation_jobs.count_documents({"payload.batch_id": order["batch_id"]}) == 2
+
+
+async def test_rows_that_are_not_objects_reject_the_upload(api, server):
+    response = await api.post(
+        "/api/orders/bulk",
+        params={"service_type": "resume", "customer_email": "b2b@example.com", "customer_name": "B2B"},
+        content=b'{"requirements": {"name": "Ada"}}\n{"requirements": "Grace"}\n',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 400
+    assert "Line 2" in response.json()["detail"]
+    assert await server.services.db.orders.count_documents({}) == 0
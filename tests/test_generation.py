@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from generation_cache import GenerationCache, GenerationLeases
+
+pytestmark = pytest.mark.anyio
+
+REQUIREMENTS = {"name": "Ada Lovelace", "role": "Engineer", "industry": "Computing"}
+
+
+@pytest.fixture
+def completions(server, monkeypatch):
+    calls = []
+
+    async def run_completion(prompt, **options):
+        calls.append(options["stream_key"])
+        return f"Draft {len(calls)}"
+
+    monkeypatch.setattr(server, "run_completion", run_completion)
+    return calls
+
+
+async def test_opted_out_services_do_not_share_step_outputs(server, completions):
+    server.services.generation_cache.enabled_services.discard("resume")
+
+    first = await server.generate_content(server.ServiceType.RESUME, REQUIREMENTS)
+    second = await server.generate_content(server.ServiceType.RESUME, REQUIREMENTS)
+
+    # Both steps ran again for the second order
+    assert len(completions) == 4
+    assert first != second
+    assert server.services.step_cache.stats()["memory_entries"] == 0
+
+
+async def test_opted_in_services_reuse_step_outputs(server, completions):
+    await server.generate_content(server.ServiceType.RESUME, REQUIREMENTS)
+    # Forget the stored output, so the next order runs its pipeline and meets the step cache
+    server.services.generation_cache._entries.clear()
+    await server.services.db.generation_cache.delete_many({})
+
+    await server.generate_content(server.ServiceType.RESUME, REQUIREMENTS)
+
+    assert len(completions) == 2
+    assert server.services.step_cache.stats()["memory_entries"] == 2
+
+
+async def test_waiting_on_another_worker_counts_one_miss(db):
+    cache = GenerationCache(db.generation_cache, enabled_services=["resume"])
+    leases = GenerationLeases(db.generation_leases, poll_interval=0.01)
+    # Another worker holds the lease and stores its result after a while
+    await db.generation_leases.insert_one(
+        {"_id": "k", "owner": "other", "expires_at": datetime.utcnow() + timedelta(minutes=1)}
+    )
+
+    async def other_worker():
+        await asyncio.sleep(0.1)
+        await cache.set("resume", "k", {"text": "done"})
+
+    async def generate():
+        raise AssertionError("generated while another worker held the lease")
+
+    assert await cache.get("resume", "k") is None
+    storing = asyncio.create_task(other_worker())
+    content = await leases.run("resume", "k", generate, lambda: cache.get("resume", "k", record=False))
+    await storing
+
+    assert content == {"text": "done"}
+    assert cache.stats()["services"]["resume"]["misses"] == 1
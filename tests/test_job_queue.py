@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from job_queue import JobQueue, JobStatus
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue(db):
+    return JobQueue(db.generation_jobs, lease_seconds=60, max_attempts=2, backoff_base=0.0)
+
+
+async def expire_lease(queue, job):
+    await queue.collection.update_one(
+        {"_id": job["_id"]}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+    )
+
+
+async def test_claim_leases_a_job_once(queue):
+    job_id = await queue.enqueue("order-1", kind="resume")
+
+    job = await queue.claim("worker-a")
+
+    assert job["_id"] == job_id
+    assert job["status"] == JobStatus.LEASED
+    assert job["worker_id"] == "worker-a"
+    assert job["attempts"] == 1
+    assert job["lease_expires_at"] > datetime.utcnow()
+    assert await queue.claim("worker-b") is None
+
+
+async def test_claim_takes_priority_then_earliest_deadline(queue):
+    now = datetime.utcnow()
+    await queue.enqueue("late", deadline=now + timedelta(hours=2))
+    await queue.enqueue("soon", deadline=now + timedelta(hours=1))
+    await queue.enqueue("bulk", priority=-1, deadline=now)
+
+    claimed = [(await queue.claim("worker"))["order_id"] for _ in range(3)]
+
+    assert claimed == ["soon", "late", "bulk"]
+
+
+async def test_claim_skips_excluded_kinds(queue):
+    await queue.enqueue("logo", kind="logo_design")
+    await queue.enqueue("resume", kind="resume")
+
+    assert (await queue.claim("worker", exclude_kinds=["logo_design"]))["order_id"] == "resume"
+    assert await queue.claim("worker", exclude_kinds=["logo_design"]) is None
+
+
+async def test_group_limit_hands_back_jobs_over_the_limit(queue):
+    await queue.enqueue_many(["a", "b"], group="batch", group_limit=1)
+
+    assert (await queue.claim("worker-a"))["group"] == "batch"
+    assert await queue.claim("worker-b") is None
+    assert await queue.depth() == 1
+    assert (await queue.collection.find_one({"status": JobStatus.QUEUED}))["attempts"] == 0
+
+
+async def test_heartbeat_extends_only_a_held_lease(queue):
+    await queue.enqueue("order-1")
+    job = await queue.claim("worker-a")
+    await expire_lease(queue, job)
+
+    assert await queue.heartbeat(job)
+    assert (await queue.collection.find_one({"_id": job["_id"]}))["lease_expires_at"] > datetime.utcnow()
+    assert not await queue.heartbeat({**job, "worker_id": "worker-b"})
+
+
+async def test_reap_requeues_expired_leases(queue):
+    await queue.enqueue("order-1")
+    job = await queue.claim("worker-a")
+    await expire_lease(queue, job)
+
+    assert await queue.reap_expired() == []
+
+    stored = await queue.collection.find_one({"_id": job["_id"]})
+    assert stored["status"] == JobStatus.QUEUED
+    assert stored["worker_id"] is None
+    assert stored["last_error"] == "lease expired"
+    # The worker that lost the lease can no longer extend it
+    assert not await queue.heartbeat(job)
+    assert (await queue.claim("worker-b"))["attempts"] == 2
+
+
+async def test_reap_leaves_live_leases_alone(queue):
+    await queue.enqueue("order-1")
+    job = await queue.claim("worker-a")
+
+    assert await queue.reap_expired() == []
+    assert (await queue.collection.find_one({"_id": job["_id"]}))["status"] == JobStatus.LEASED
+
+
+async def test_reap_buries_jobs_out_of_attempts(queue):
+    await queue.enqueue("order-1")
+    for worker in ("worker-a", "worker-b"):
+        job = await queue.claim(worker)
+        await expire_lease(queue, job)
+        buried = await queue.reap_expired()
+
+    assert [job["order_id"] for job in buried] == ["order-1"]
+    assert (await queue.collection.find_one({"_id": job["_id"]}))["status"] == JobStatus.DEAD
+    assert await queue.counts() == {JobStatus.QUEUED: 0, JobStatus.LEASED: 0, JobStatus.DEAD: 1}
+
+
+async def test_fail_retries_until_attempts_run_out(queue):
+    await queue.enqueue("order-1")
+
+    assert await queue.fail(await queue.claim("worker"), "boom")
+    assert not await queue.fail(await queue.claim("worker"), "boom again")
+
+    stored = await queue.collection.find_one({})
+    assert stored["status"] == JobStatus.DEAD
+    assert stored["last_error"] == "boom again"
+
+
+async def test_complete_marks_the_job_done(queue):
+    await queue.enqueue("order-1")
+    await queue.complete(await queue.claim("worker"))
+
+    assert (await queue.collection.find_one({}))["status"] == JobStatus.DONE
+    assert await queue.claim("worker") is None
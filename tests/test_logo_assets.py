@@ -0,0 +1,214 @@
+import json
+import struct
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import logo_assets  # noqa: E402
+from logo_assets import (  # noqa: E402
+    build_logo_package, encode_png, extract_palette, rasterize, resize, to_rgba8, variant_names,
+)
+
+
+def svg(body, view_box="0 0 100 100"):
+    return f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{view_box}">{body}</svg>'
+
+
+def decode_png(data):
+    """The RGBA8 pixels of a PNG written by encode_png, checking its structure on the way"""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, offset = {}, 8
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset:offset + 4])
+        kind, body = data[offset + 4:offset + 8], data[offset + 8:offset + 8 + length]
+        (crc,) = struct.unpack(">I", data[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(kind + body)
+        chunks[kind] = body
+        offset += 12 + length
+    width, height, depth, color_type, _, _, _ = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    assert (depth, color_type) == (8, 6)
+    assert b"IEND" in chunks
+    raw = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(height, width * 4 + 1)
+    assert (raw[:, 0] == 1).all()
+    # Undo the Sub filter: each byte is stored as the difference from the byte 4 to its left
+    rows = raw[:, 1:].astype(np.int64)
+    for column in range(4, width * 4):
+        rows[:, column] = (rows[:, column] + rows[:, column - 4]) % 256
+    return rows.astype(np.uint8).reshape(height, width, 4)
+
+
+def test_encode_png_round_trips():
+    pixels = np.random.default_rng(7).integers(0, 256, size=(5, 7, 4), dtype=np.uint8)
+
+    assert (decode_png(encode_png(pixels)) == pixels).all()
+
+
+def test_to_rgba8_unpremultiplies():
+    image = np.array([[[0.25, 0.0, 0.0, 0.5], [0.0, 0.0, 0.0, 0.0]]], dtype=np.float32)
+
+    assert to_rgba8(image).tolist() == [[[128, 0, 0, 128], [0, 0, 0, 0]]]
+
+
+def test_solid_rect_fills_exactly_its_pixels():
+    image = rasterize(svg('<rect x="10" y="20" width="30" height="40" fill="#ff0000"/>'), 100)
+
+    assert np.allclose(image[20:60, 10:40], [1, 0, 0, 1])
+    assert image[..., 3].sum() == pytest.approx(30 * 40)
+
+
+def test_edges_are_antialiased():
+    image = rasterize(svg('<rect x="0" y="0" width="50.5" height="100" fill="#000"/>'), 100)
+
+    assert image[50, 49, 3] == 1
+    assert image[50, 50, 3] == pytest.approx(0.5)
+    assert image[50, 51, 3] == 0
+
+
+def test_circle_covers_its_area():
+    image = rasterize(svg('<circle cx="50" cy="50" r="30" fill="#000"/>'), 200)
+
+    assert image[..., 3].sum() == pytest.approx(np.pi * 60 ** 2, rel=0.01)
+
+
+def test_fill_rules():
+    # A square inside a square, both wound the same way
+    d = "M10 10 H90 V90 H10 Z M30 30 H70 V70 H30 Z"
+    nonzero = rasterize(svg(f'<path d="{d}" fill="#000"/>'), 100)
+    even_odd = rasterize(svg(f'<path d="{d}" fill="#000" fill-rule="evenodd"/>'), 100)
+
+    assert nonzero[50, 50, 3] == 1
+    assert even_odd[50, 50, 3] == 0
+    assert even_odd[20, 20, 3] == 1
+
+
+def test_transforms_and_strokes():
+    image = rasterize(svg(
+        '<g transform="translate(50 0)"><line x1="0" y1="10" x2="0" y2="90" stroke="#00f" stroke-width="10"/></g>'
+    ), 100)
+
+    assert np.allclose(image[50, 46:54], [0, 0, 1, 1])
+    assert image[50, 40, 3] == 0
+
+
+def test_opacity_composites_over_what_is_below():
+    image = rasterize(svg(
+        '<rect width="100" height="100" fill="#0000ff"/><rect width="100" height="100" fill="#ff0000" opacity="0.25"/>'
+    ), 10)
+
+    assert np.allclose(image[5, 5], [0.25, 0, 0.75, 1])
+
+
+GRADIENT_STOPS = '<stop offset="0" stop-color="#ff0000"/><stop offset="1" stop-color="#0000ff"/>'
+
+
+def test_linear_gradient_is_shaded_along_its_vector():
+    image = rasterize(svg(
+        f'<defs><linearGradient id="g">{GRADIENT_STOPS}</linearGradient></defs>'
+        '<rect x="0" y="0" width="100" height="100" fill="url(#g)"/>'
+    ), 100)
+
+    red, blue = image[50, :, 0], image[50, :, 2]
+    assert red[0] > 0.99 and blue[-1] > 0.99
+    assert red[50] == pytest.approx(0.5, abs=0.01)
+    assert (np.diff(red) <= 0).all() and (np.diff(blue) >= 0).all()
+    # Constant down each column
+    assert np.allclose(image[:, 25], image[0, 25])
+
+
+def test_bounding_box_gradients_follow_the_shape():
+    image = rasterize(svg(
+        f'<defs><linearGradient id="g">{GRADIENT_STOPS}</linearGradient></defs>'
+        '<rect x="50" y="0" width="50" height="100" fill="url(#g)"/>'
+    ), 100)
+
+    assert image[50, 50, 0] > 0.98
+    assert image[50, 75, 0] == pytest.approx(0.5, abs=0.02)
+    assert image[50, 99, 2] > 0.98
+
+
+def test_user_space_gradients_follow_the_canvas():
+    image = rasterize(svg(
+        f'<defs><linearGradient id="g" gradientUnits="userSpaceOnUse" x1="0" x2="100">{GRADIENT_STOPS}'
+        '</linearGradient></defs><rect x="50" y="0" width="50" height="100" fill="url(#g)"/>'
+    ), 100)
+
+    assert image[50, 50, 0] == pytest.approx(0.5, abs=0.02)
+
+
+def test_radial_gradient_and_stop_opacity():
+    image = rasterize(svg(
+        '<defs><radialGradient id="r"><stop offset="0" stop-color="#fff"/>'
+        '<stop offset="1" stop-color="#fff" stop-opacity="0"/></radialGradient></defs>'
+        '<rect width="100" height="100" fill="url(#r)"/>'
+    ), 100)
+
+    alpha = image[..., 3]
+    assert alpha[50, 50] > 0.98
+    assert alpha[50, 75] == pytest.approx(0.5, abs=0.03)
+    assert alpha[25, 50] == pytest.approx(alpha[50, 25], abs=0.01)
+    # Padded beyond the radius
+    assert alpha[0, 0] == 0
+
+
+def test_spread_methods():
+    def row(spread):
+        return rasterize(svg(
+            f'<defs><linearGradient id="g" x2="0.25" spreadMethod="{spread}">{GRADIENT_STOPS}</linearGradient></defs>'
+            '<rect width="100" height="100" fill="url(#g)"/>'
+        ), 100)[50, :, 2]
+
+    pad, repeat, reflect = row("pad"), row("repeat"), row("reflect")
+    assert np.allclose(pad[30:], 1)
+    assert repeat[26] < 0.1 and repeat[49] > 0.9
+    assert reflect[26] > 0.9 and reflect[49] < 0.1
+
+
+def test_gradient_strokes_are_shaded():
+    image = rasterize(svg(
+        f'<defs><linearGradient id="g">{GRADIENT_STOPS}</linearGradient></defs>'
+        '<rect x="10" y="10" width="80" height="80" fill="none" stroke="url(#g)" stroke-width="4"/>'
+    ), 100)
+
+    assert image[50, 10, 0] > 0.9
+    assert image[50, 90, 2] > 0.9
+    assert image[50, 50, 3] == 0
+
+
+def test_missing_gradients_paint_nothing():
+    assert rasterize(svg('<rect width="100" height="100" fill="url(#missing)"/>'), 10)[..., 3].max() == 0
+
+
+def test_resize_preserves_the_average():
+    image = rasterize(svg('<circle cx="50" cy="50" r="40" fill="#336699"/>'), 256)
+
+    for size in (128, 100, 33):
+        resized = resize(image, size)
+        assert resized.shape == (size, size, 4)
+        assert resized.mean(axis=(0, 1)) == pytest.approx(image.mean(axis=(0, 1)), abs=1e-3)
+
+
+def test_palette_comes_from_the_pixels():
+    image = rasterize(svg('<rect width="100" height="75" fill="#336699"/><rect y="75" width="100" height="25" fill="#ffcc00"/>'), 100)
+
+    palette = extract_palette(image)
+
+    assert [color["hex"] for color in palette] == ["#336699", "#ffcc00"]
+    assert palette[0]["share"] == pytest.approx(0.75, abs=0.01)
+
+
+def test_build_logo_package(tmp_path, monkeypatch):
+    monkeypatch.setattr(logo_assets, "LOGO_SIZES", {"favicon": (16, 48), "social": (100,)})
+    markup = svg('<circle cx="50" cy="50" r="40" fill="#1e3a8a"/>')
+
+    manifest = build_logo_package(markup, str(tmp_path), "abc123")
+
+    store = logo_assets.ArtifactStore(str(tmp_path))
+    assert json.loads(store.path("abc123", "json").read_bytes()) == manifest
+    assert store.path("abc123", "svg").read_text() == markup
+    assert set(manifest["png"]) == {name for name, _ in variant_names()} == {"favicon-16", "favicon-48", "social-100"}
+    favicon = decode_png(store.path(manifest["png"]["favicon-16"], "png").read_bytes())
+    assert favicon.shape == (16, 16, 4)
+    assert favicon[8, 8].tolist() == [0x1e, 0x3a, 0x8a, 255]
+    assert manifest["palette"][0]["hex"] == "#1e3a8a"
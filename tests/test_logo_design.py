@@ -0,0 +1,56 @@
+import pytest
+
+import server
+from pipeline import StepContext
+
+pytestmark = pytest.mark.anyio
+
+CONCEPTS = """## Logo concepts
+
+### Concept 1: Orbit
+A ring around a square.
+
+### Concept 2: Beacon
+A lighthouse beam.
+
+## Brand color palette
+- Navy #1e3a8a
+"""
+
+
+def drawing(number, name, body='<circle cx="256" cy="256" r="100" fill="#1e3a8a"/>'):
+    return f'### Concept {number}: **{name}**\nA {name.lower()}.\n```svg\n<svg viewBox="0 0 512 512">{body}</svg>\n```\n'
+
+
+def test_split_logo_concepts():
+    text = drawing(1, "Orbit") + "### Concept 2: Beacon\nNo markup here.\n" + drawing(3, "Wave")
+
+    assert [(name, description) for name, description, _ in server.split_logo_concepts(text)] == [
+        ("Orbit", "A orbit."), ("Wave", "A wave."),
+    ]
+
+
+def test_logo_svgs_run_after_the_concepts():
+    steps = {step.name: step for step in server.PIPELINES[server.ServiceType.LOGO_DESIGN].steps}
+
+    assert steps["logo_svgs"].depends_on == ("logo_concepts",)
+
+
+async def test_logo_svgs_draw_the_written_concepts(monkeypatch):
+    prompts = []
+
+    async def run_completion(prompt, **options):
+        prompts.append(prompt)
+        return drawing(1, "Orbit") + drawing(2, "Beacon", body='<script>alert(1)</script>')
+
+    monkeypatch.setattr(server, "run_completion", run_completion)
+    step = StepContext("logo_svgs", {"business_name": "Acme"}, {"logo_concepts": CONCEPTS}, None)
+
+    concepts = await server.logo_svgs_step(step)
+
+    user_message = prompts[0].messages[-1]["content"]
+    assert "Business: Acme" in user_message
+    assert "### Concept 2: Beacon" in user_message
+    # The concept without anything drawable is dropped
+    assert [concept["name"] for concept in concepts] == ["Orbit"]
+    assert concepts[0]["svg"].startswith("<svg")
@@ -0,0 +1,135 @@
+import pytest
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from indexes import IndexCreationError, IndexManager, IndexSpec
+
+pytestmark = pytest.mark.anyio
+
+ORDER = {
+    "customer_email": "ada@example.com",
+    "customer_name": "Ada Lovelace",
+    "service_type": "resume",
+    "requirements": {"name": "Ada Lovelace", "role": "Engineer", "industry": "Computing"},
+}
+
+
+async def place(api, key, **changes):
+    return await api.post("/api/orders", json={**ORDER, **changes}, headers={"Idempotency-Key": key})
+
+
+async def test_repeated_request_returns_the_same_order(api, server):
+    first = await place(api, "checkout-1")
+    again = await place(api, "checkout-1")
+
+    assert first.status_code == again.status_code == 200
+    assert again.json()["id"] == first.json()["id"]
+    assert await server.services.db.orders.count_documents({}) == 1
+    assert await server.services.order_queue.depth() == 1
+
+
+async def test_key_cannot_be_reused_for_a_different_order(api):
+    await place(api, "checkout-1")
+
+    response = await place(api, "checkout-1", requirements={**ORDER["requirements"], "role": "Poet"})
+
+    assert response.status_code == 422
+
+
+async def test_keys_are_scoped_to_the_customer(api):
+    first = await place(api, "checkout-1")
+    other = await place(api, "checkout-1", customer_email="grace@example.com", customer_name="Grace Hopper")
+
+    assert other.json()["id"] != first.json()["id"]
+
+
+class RacingOrders:
+    """Orders whose next lookup misses and insert collides, as when a concurrent repeat wins the insert"""
+
+    def __init__(self, orders):
+        self.orders = orders
+        self.raced = False
+
+    def __getattr__(self, name):
+        return getattr(self.orders, name)
+
+    async def find_one(self, *args, **kwargs):
+        if not self.raced:
+            self.raced = True
+            return None
+        return await self.orders.find_one(*args, **kwargs)
+
+    async def insert_one(self, document):
+        raise DuplicateKeyError("E11000 duplicate key error", 11000, {"keyPattern": {"idempotency_key": 1}})
+
+
+class RacingDb:
+    def __init__(self, db):
+        self.db = db
+        self.orders = RacingOrders(db.orders)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+async def test_losing_a_concurrent_insert_returns_the_winners_order(api, server, monkeypatch):
+    first = await place(api, "checkout-1")
+    monkeypatch.setattr(server.services, "db", RacingDb(server.services.db))
+
+    again = await place(api, "checkout-1")
+
+    assert again.status_code == 200
+    assert again.json()["id"] == first.json()["id"]
+
+
+async def test_collision_with_a_vanished_order_is_a_conflict(api, server, monkeypatch):
+    monkeypatch.setattr(server.services, "db", RacingDb(server.services.db))
+
+    response = await place(api, "checkout-1")
+
+    assert response.status_code == 409
+
+
+class FailingCollection:
+    async def create_index(self, keys, **options):
+        if options.get("unique"):
+            raise OperationFailure("E11000 duplicate key error", 11000)
+        return "ok"
+
+
+async def test_ensure_raises_when_a_unique_index_is_missing():
+    specs = [IndexSpec("orders", (("id", 1),), unique=True), IndexSpec("orders", (("status", 1),))]
+    manager = IndexManager({"orders": FailingCollection()}, specs)
+
+    with pytest.raises(IndexCreationError, match="orders"):
+        await manager.ensure()
+
+    # Every index was still tried and the failure reported
+    assert list(manager.errors) == [manager._label(specs[0])]
+
+
+def checkout(**changes):
+    return {**ORDER, "order_reference": "checkout-1", **changes}
+
+
+async def test_checkout_references_are_scoped_to_the_customer(api, server):
+    first = await api.post("/api/create-payment-intent", json=checkout())
+    again = await api.post("/api/create-payment-intent", json=checkout())
+    other = await api.post("/api/create-payment-intent", json=checkout(
+        customer_email="grace@example.com", customer_name="Grace Hopper"
+    ))
+
+    assert first.status_code == again.status_code == other.status_code == 200
+    assert again.json()["order_id"] == first.json()["order_id"]
+    assert again.json()["payment_intent_id"] == first.json()["payment_intent_id"]
+    assert other.json()["order_id"] != first.json()["order_id"]
+    assert other.json()["payment_intent_id"] != first.json()["payment_intent_id"]
+
+
+async def test_checkout_reference_cannot_be_reused_for_a_different_order(api):
+    await api.post("/api/create-payment-intent", json=checkout())
+
+    response = await api.post("/api/create-payment-intent", json=checkout(
+        requirements={**ORDER["requirements"], "role": "Poet"}
+    ))
+
+    assert response.status_code == 422
@@ -0,0 +1,197 @@
+import json
+import time
+
+import pytest
+
+from tests.conftest import WEBHOOK_SECRET
+
+pytestmark = pytest.mark.anyio
+
+ORDER = {
+    "customer_email": "ada@example.com",
+    "customer_name": "Ada Lovelace",
+    "service_type": "resume",
+    "requirements": {"name": "Ada Lovelace", "role": "Engineer", "industry": "Computing"},
+}
+
+
+def signed_event(stripe_stub, event_type, obj, *, event_id="evt_1", secret=WEBHOOK_SECRET, timestamp=None):
+    payload = json.dumps({"id": event_id, "object": "event", "type": event_type, "data": {"object": obj}}).encode()
+    signature = stripe_stub.sign_payload(payload, secret, timestamp or int(time.time()))
+    return payload, {"Content-Type": "application/json", "Stripe-Signature": signature}
+
+
+async def test_payment_intent_round_trip(stripe_gateway):
+    intent = await stripe_gateway.create_payment_intent(
+        amount=2999, currency="gbp", metadata={"order_id": "o1"}, idempotency_key="checkout-1"
+    )
+
+    assert intent["amount"] == 2999
+    assert intent["metadata"] == {"order_id": "o1"}
+    assert (await stripe_gateway.retrieve_payment_intent(intent["id"]))["id"] == intent["id"]
+
+
+async def test_idempotency_key_returns_the_same_intent(stripe_gateway):
+    first = await stripe_gateway.create_payment_intent(
+        amount=2999, currency="gbp", metadata={}, idempotency_key="checkout-1"
+    )
+    again = await stripe_gateway.create_payment_intent(
+        amount=2999, currency="gbp", metadata={}, idempotency_key="checkout-1"
+    )
+
+    assert again["id"] == first["id"]
+
+
+async def test_api_errors_raise_payment_error(stripe_gateway):
+    from payments import PaymentError
+
+    with pytest.raises(PaymentError) as error:
+        await stripe_gateway.retrieve_payment_intent("pi_missing")
+
+    assert error.value.status_code == 404
+    assert error.value.code == "resource_missing"
+
+
+async def test_server_errors_are_retried_then_raised(monkeypatch, stripe_gateway, stripe_stub):
+    from payments import PaymentError
+
+    monkeypatch.setattr(stripe_stub, "FAILURE_RATE", 1.0)
+    with pytest.raises(PaymentError) as error:
+        await stripe_gateway.create_payment_intent(amount=100, currency="gbp", metadata={}, idempotency_key="k")
+
+    assert error.value.status_code == 500
+    assert not stripe_stub.payment_intents
+
+
+def test_verify_webhook_accepts_a_valid_signature(stripe_stub):
+    from payments import verify_webhook
+
+    payload, headers = signed_event(stripe_stub, "payment_intent.succeeded", {"id": "pi_1"})
+
+    assert verify_webhook(payload, headers["Stripe-Signature"], WEBHOOK_SECRET)["id"] == "evt_1"
+
+
+@pytest.mark.parametrize("header", [None, "", "v1=abc", "t=1,v1=abc"])
+def test_verify_webhook_rejects_bad_headers(header):
+    from payments import WebhookSignatureError, verify_webhook
+
+    with pytest.raises(WebhookSignatureError):
+        verify_webhook(b"{}", header, WEBHOOK_SECRET)
+
+
+def test_verify_webhook_rejects_the_wrong_secret(stripe_stub):
+    from payments import WebhookSignatureError, verify_webhook
+
+    payload, headers = signed_event(stripe_stub, "payment_intent.succeeded", {"id": "pi_1"}, secret="whsec_other")
+
+    with pytest.raises(WebhookSignatureError, match="mismatch"):
+        verify_webhook(payload, headers["Stripe-Signature"], WEBHOOK_SECRET)
+
+
+def test_verify_webhook_rejects_stale_timestamps(stripe_stub):
+    from payments import WebhookSignatureError, verify_webhook
+
+    payload, headers = signed_event(
+        stripe_stub, "payment_intent.succeeded", {"id": "pi_1"}, timestamp=int(time.time()) - 3600
+    )
+
+    with pytest.raises(WebhookSignatureError, match="tolerance"):
+        verify_webhook(payload, headers["Stripe-Signature"], WEBHOOK_SECRET)
+
+
+async def awaiting_payment_order(server, reference="checkout-1"):
+    order = await server.create_awaiting_payment_order(server.OrderRequest(**ORDER), reference)
+    intent = await server.services.stripe_gateway.create_payment_intent(
+        amount=int(order.price * 100), currency="gbp", metadata={"order_id": order.id}, idempotency_key=reference
+    )
+    return order, intent
+
+
+async def test_webhook_rejects_an_invalid_signature(api, server, stripe_stub):
+    order, intent = await awaiting_payment_order(server)
+    payload, headers = signed_event(stripe_stub, "payment_intent.succeeded", intent, secret="whsec_other")
+
+    response = await api.post("/api/stripe/webhook", content=payload, headers=headers)
+
+    assert response.status_code == 400
+    assert (await server.services.db.orders.find_one({"id": order.id}))["status"] == "awaiting_payment"
+    assert await server.services.db.stripe_events.count_documents({}) == 0
+
+
+async def test_succeeded_webhook_marks_the_order_paid(api, server, stripe_stub):
+    order, intent = await awaiting_payment_order(server)
+    payload, headers = signed_event(stripe_stub, "payment_intent.succeeded", intent)
+
+    response = await api.post("/api/stripe/webhook", content=payload, headers=headers)
+
+    assert response.json() == {"received": True}
+    stored = await server.services.db.orders.find_one({"id": order.id})
+    assert stored["status"] == "pending"
+    assert stored["payment_intent_id"] == intent["id"]
+    assert stored["deadline"] is not None
+    assert await server.services.db.generation_jobs.count_documents({"order_id": order.id}) == 1
+
+
+async def test_duplicate_webhook_events_are_processed_once(api, server, stripe_stub):
+    order, intent = await awaiting_payment_order(server)
+    payload, headers = signed_event(stripe_stub, "payment_intent.succeeded", intent)
+
+    first = await api.post("/api/stripe/webhook", content=payload, headers=headers)
+    second = await api.post("/api/stripe/webhook", content=payload, headers=headers)
+
+    assert first.json() == {"received": True}
+    assert second.json() == {"received": True, "duplicate": True}
+    assert await server.services.db.generation_jobs.count_documents({"order_id": order.id}) == 1
+
+
+async def test_webhook_ignores_an_underpaying_intent(api, server, stripe_stub):
+    order, intent = await awaiting_payment_order(server)
+    payload, headers = signed_event(stripe_stub, "payment_intent.succeeded", {**intent, "amount": 1})
+
+    await api.post("/api/stripe/webhook", content=payload, headers=headers)
+
+    assert (await server.services.db.orders.find_one({"id": order.id}))["status"] == "awaiting_payment"
+    assert await server.services.db.generation_jobs.count_documents({}) == 0
+
+
+async def orderless_intent(server):
+    # Checkouts without customer details only get their order at confirmation
+    return await server.services.stripe_gateway.create_payment_intent(
+        amount=2999, currency="gbp", metadata={"service_type": "resume", "order_reference": "checkout-1"},
+        idempotency_key="checkout-1"
+    )
+
+
+async def test_webhook_is_redelivered_until_the_payment_has_an_order(api, server, stripe_stub):
+    intent = await orderless_intent(server)
+    payload, headers = signed_event(stripe_stub, "payment_intent.succeeded", intent)
+
+    early = await api.post("/api/stripe/webhook", content=payload, headers=headers)
+
+    assert early.status_code == 409
+    assert await server.services.db.stripe_events.count_documents({}) == 0
+    assert (await server.services.db.pending_payments.find_one({"_id": intent["id"]}))["service_type"] == "resume"
+
+    confirmed = await api.post("/api/confirm-payment", json={**ORDER, "payment_intent_id": intent["id"]})
+    redelivered = await api.post("/api/stripe/webhook", content=payload, headers=headers)
+
+    assert confirmed.status_code == 200
+    assert redelivered.json() == {"received": True}
+    assert await server.services.db.pending_payments.count_documents({}) == 0
+    assert await server.services.db.generation_jobs.count_documents({"order_id": confirmed.json()["id"]}) == 1
+
+
+async def test_sweep_reports_payments_left_without_an_order(server):
+    from datetime import datetime, timedelta
+
+    pending = server.services.db.pending_payments
+    for intent_id in ("pi_stuck", "pi_recent", "pi_confirmed"):
+        await server.record_pending_payment({"id": intent_id, "amount": 2999, "metadata": {}})
+    an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+    await pending.update_many({"_id": {"$ne": "pi_recent"}}, {"$set": {"received_at": an_hour_ago}})
+    await server.services.db.orders.insert_one({"id": "o1", "payment_intent_id": "pi_confirmed"})
+
+    assert await server.sweep_pending_payments() == ["pi_stuck"]
+    # Reported once, and kept until an order exists
+    assert await server.sweep_pending_payments() == []
+    assert sorted(await pending.distinct("_id")) == ["pi_recent", "pi_stuck"]
@@ -0,0 +1,77 @@
+import base64
+import hashlib
+
+import pytest
+
+import prompts
+from prompts import MESSAGE_OVERHEAD_TOKENS, REPLY_PRIMING_TOKENS, PromptTemplate, count_tokens
+
+
+@pytest.fixture
+def fresh_tokenizer():
+    """A tokenizer() that loads again, and is forgotten afterwards"""
+    prompts.tokenizer.cache_clear()
+    yield
+    prompts.tokenizer.cache_clear()
+
+
+def template(**changes):
+    return PromptTemplate(**{
+        "service": "resume", "step": "draft", "version": "1",
+        "system": "You are a resume writer.", "instructions": "Write a resume for the candidate below.",
+        "fields": "Name: {name}\nRole: {role}", **changes,
+    })
+
+
+def test_prefix_tokens_are_counted_when_the_template_is_built(monkeypatch):
+    built = template()
+    monkeypatch.setattr(prompts, "count_tokens", lambda text: pytest.fail("counted while rendering"))
+
+    prompt = built.render(name="Ada", role="Engineer")
+
+    assert built.prefix_tokens == (
+        count_tokens(built.system) + count_tokens(built.instructions) + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+    assert prompt.prompt_tokens == built.prefix_tokens + len("Name: Ada\nRole: Engineer") // 4 + REPLY_PRIMING_TOKENS
+    assert prompt.messages[1]["content"] == f"{built.instructions}\n\nName: Ada\nRole: Engineer"
+
+
+@pytest.mark.parametrize("fields", ["{name!r}", "{name:>10}", "{0}", "{user.name}"])
+def test_unsupported_fields_are_rejected(fields):
+    with pytest.raises(ValueError, match="unsupported field"):
+        template(fields=fields)
+
+
+def byte_encoding(path):
+    """A .tiktoken file of just the 256 single bytes, and its digest"""
+    data = b"".join(base64.b64encode(bytes([value])) + b" %d\n" % value for value in range(256))
+    path.write_bytes(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_load_ranks_checks_the_file(tmp_path):
+    path = tmp_path / "bytes.tiktoken"
+    digest = byte_encoding(path)
+
+    assert prompts.load_ranks(path, digest)[b"A"] == 65
+    with pytest.raises(ValueError, match="does not match"):
+        prompts.load_ranks(path, "0" * 64)
+
+
+def test_missing_encoding_falls_back_to_estimating(fresh_tokenizer, monkeypatch, tmp_path):
+    monkeypatch.setattr(prompts, "TOKENIZER_FILE", tmp_path / "missing.tiktoken")
+
+    assert prompts.tokenizer() is None
+    assert count_tokens("x" * 40) == 10
+
+
+def test_tokenizer_is_built_from_the_bundled_file(fresh_tokenizer, monkeypatch, tmp_path):
+    pytest.importorskip("tiktoken")
+    path = tmp_path / "bytes.tiktoken"
+    monkeypatch.setattr(prompts, "TOKENIZER_FILE", path)
+    monkeypatch.setattr(prompts, "TOKENIZER_FILE_SHA256", byte_encoding(path))
+
+    encoding = prompts.tokenizer()
+
+    # Without merges every byte is a token
+    assert encoding.encode("héllo") == list("héllo".encode())
@@ -0,0 +1,257 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import rate_limiter
+from rate_limiter import LocalBuckets, RateLimiter, estimate_prompt_tokens
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = [{"role": "user", "content": "Write a haiku about queues."}]
+PROMPT_TOKENS = estimate_prompt_tokens(MESSAGES)
+
+
+@pytest.fixture(autouse=True)
+def frozen_clock(monkeypatch):
+    """Buckets only refill when the test moves the clock"""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(LocalBuckets(requests_per_minute=10, tokens_per_minute=1000), max_wait=0.0)
+
+
+async def test_acquire_reserves_requests_and_tokens(limiter):
+    reservation = await limiter.acquire(300)
+
+    assert reservation.tokens == 300
+    assert limiter.buckets.tokens == 700
+    assert limiter.buckets.requests == 9
+
+
+async def test_acquire_caps_reservations_at_the_bucket_size(limiter):
+    assert (await limiter.acquire(5000)).tokens == 1000
+
+
+async def test_acquire_times_out_without_capacity(limiter):
+    await limiter.acquire(900)
+
+    with pytest.raises(TimeoutError):
+        await limiter.acquire(200)
+    assert limiter.buckets.tokens == 100
+
+
+async def test_buckets_refill_over_time(limiter, frozen_clock):
+    await limiter.acquire(1000)
+    frozen_clock.now += 30
+
+    assert limiter.buckets.tokens == 0
+    assert (await limiter.acquire(500)).tokens == 500
+
+
+async def test_reconcile_returns_unused_tokens(limiter):
+    reservation = await limiter.acquire(300)
+
+    await limiter.reconcile(reservation, 120)
+
+    assert limiter.buckets.tokens == 880
+
+
+async def test_reconcile_debits_overruns(limiter, frozen_clock):
+    reservation = await limiter.acquire(900)
+
+    await limiter.reconcile(reservation, 1200)
+
+    assert limiter.buckets.tokens == -200
+    # The next caller waits until the overrun has refilled
+    with pytest.raises(TimeoutError):
+        await limiter.acquire(10)
+    frozen_clock.now += 13
+    assert (await limiter.acquire(10)).tokens == 10
+
+
+async def test_reconcile_keeps_unknown_usage(limiter):
+    reservation = await limiter.acquire(300)
+
+    await limiter.reconcile(reservation, 0)
+
+    assert limiter.buckets.tokens == 700
+
+
+async def test_release_returns_the_whole_reservation(limiter):
+    await limiter.release(await limiter.acquire(300))
+
+    assert limiter.buckets.tokens == 1000
+    # The request itself was still made
+    assert limiter.buckets.requests == 9
+
+
+async def test_block_pauses_every_caller(limiter, frozen_clock):
+    await limiter.block(5)
+
+    with pytest.raises(TimeoutError):
+        await limiter.acquire(10)
+    frozen_clock.now += 6
+    assert (await limiter.acquire(10)).tokens == 10
+
+
+def completion(usage_tokens=(20, 30)):
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-test",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": usage_tokens[0], "completion_tokens": usage_tokens[1],
+                  "total_tokens": sum(usage_tokens)},
+    }
+
+
+@pytest.fixture
+def gateway(limiter):
+    from llm_gateway import LLMGateway
+
+    return LLMGateway("sk-test", base_url="http://llm.test/v1", rate_limiter=limiter, rate_limit_retries=0)
+
+
+def respond_with(gateway, handler):
+    gateway._http_client._transport = httpx.MockTransport(handler)
+
+
+async def complete(gateway, **options):
+    return await gateway.complete(MESSAGES, model="gpt-test", max_tokens=200, temperature=0, **options)
+
+
+async def test_success_reconciles_against_reported_usage(gateway, limiter):
+    respond_with(gateway, lambda request: httpx.Response(200, json=completion((20, 30))))
+
+    await complete(gateway)
+
+    assert limiter.buckets.tokens == 1000 - 50
+
+
+async def test_usage_beyond_the_reservation_is_debited(gateway, limiter):
+    respond_with(gateway, lambda request: httpx.Response(200, json=completion((400, 100))))
+
+    await complete(gateway)
+
+    assert limiter.buckets.tokens == 1000 - 500
+
+
+async def test_known_prompt_size_is_reserved(gateway, limiter):
+    reserved = []
+
+    async def handler(request):
+        reserved.append(limiter.buckets.tokens)
+        return httpx.Response(200, json=completion((20, 30)))
+
+    respond_with(gateway, handler)
+
+    await complete(gateway, prompt_tokens=600)
+
+    assert reserved == [1000 - 600 - 200]
+
+
+async def test_rate_limited_call_releases_its_reservation(gateway, limiter):
+    respond_with(gateway, lambda request: httpx.Response(429, json={"error": {"message": "slow down"}},
+                                                         headers={"retry-after": "1"}))
+
+    with pytest.raises(Exception, match="slow down"):
+        await complete(gateway)
+
+    assert limiter.buckets.tokens == 1000
+
+
+@pytest.mark.parametrize("handler", [
+    lambda request: httpx.Response(500, json={"error": {"message": "boom"}}),
+    lambda request: (_ for _ in ()).throw(httpx.ReadTimeout("timed out", request=request)),
+])
+async def test_failed_call_keeps_only_the_prompt(gateway, limiter, handler):
+    respond_with(gateway, handler)
+
+    with pytest.raises(gateway.call_errors):
+        await complete(gateway)
+
+    assert limiter.buckets.tokens == 1000 - PROMPT_TOKENS
+
+
+async def test_cancelled_call_keeps_only_the_prompt(gateway, limiter):
+    started = asyncio.Event()
+
+    async def hang(request):
+        started.set()
+        await asyncio.sleep(60)
+
+    respond_with(gateway, hang)
+    call = asyncio.create_task(complete(gateway))
+    await started.wait()
+    call.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    assert limiter.buckets.tokens == 1000 - PROMPT_TOKENS
+
+
+async def test_open_circuit_reserves_nothing(gateway, limiter):
+    from resilience import CircuitOpenError
+
+    breaker = gateway._breaker("gpt-test")
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    respond_with(gateway, lambda request: httpx.Response(200, json=completion()))
+
+    with pytest.raises(CircuitOpenError):
+        await complete(gateway)
+
+    assert limiter.buckets.tokens == 1000
+    assert limiter.buckets.requests == 10
+
+
+
+@pytest.fixture
+def hedging_gateway(limiter):
+    from llm_gateway import LLMGateway
+
+    gateway = LLMGateway("sk-test", base_url="http://llm.test/v1", rate_limiter=limiter,
+                         hedge_percentile=50, hedge_budget=1.0)
+    for _ in range(gateway.latency.min_samples):
+        gateway.latency.record("gpt-test", 0.01)
+    return gateway
+
+
+def slow_first_request(requests, delay=0.2):
+    async def handler(request):
+        requests.append(request)
+        if len(requests) == 1:
+            await asyncio.sleep(delay)
+        return httpx.Response(200, json=completion((20, 30)))
+
+    return handler
+
+
+async def test_hedge_reserves_its_own_capacity(hedging_gateway, limiter):
+    requests = []
+    respond_with(hedging_gateway, slow_first_request(requests))
+
+    await complete(hedging_gateway)
+    await asyncio.sleep(0.05)
+
+    assert len(requests) == 2
+    assert hedging_gateway.hedge_wins == 1
+    assert limiter.buckets.requests == 8
+    # The hedge's usage, plus the prompt of the cancelled original
+    assert limiter.buckets.tokens == 1000 - 50 - PROMPT_TOKENS
+
+
+async def test_hedge_is_skipped_without_free_capacity(hedging_gateway, limiter):
+    requests = []
+    respond_with(hedging_gateway, slow_first_request(requests, delay=0.05))
+    await limiter.acquire(700)
+
+    await complete(hedging_gateway)
+
+    assert len(requests) == 1
+    assert hedging_gateway.hedges == 0
+    assert limiter.buckets.tokens == 300 - 50
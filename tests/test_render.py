@@ -0,0 +1,120 @@
+import dataclasses
+import io
+import struct
+
+import pytest
+
+import render
+from render import parse_blocks, render_pdf, wrap
+from truetype import checksum, composite_components
+
+
+@pytest.fixture(scope="module")
+def fonts():
+    try:
+        return render.pdf_fonts()
+    except FileNotFoundError as e:
+        pytest.skip(str(e))
+
+
+def read_tables(font):
+    (count,) = struct.unpack_from(">H", font, 4)
+    tables = {}
+    for index in range(count):
+        tag, _, offset, length = struct.unpack_from(">4sIII", font, 12 + 16 * index)
+        tables[tag.decode()] = font[offset:offset + length]
+    return tables
+
+
+def test_parse_blocks():
+    text = "# Jane Doe\n\n## Experience\n- Built **things**\n1. First\n\nSome\nwrapped text\n---\n"
+
+    assert parse_blocks(text) == [
+        ("heading1", "Jane Doe"), ("heading2", "Experience"), ("bullet", "• Built things"),
+        ("bullet", "1. First"), ("paragraph", "Some wrapped text"),
+    ]
+
+
+def test_wrap_keeps_lines_inside_the_width(fonts):
+    text = "Résumé " * 40 + "https://example.com/" + "x" * 200
+
+    lines = wrap(text, "F1", 10.5, 300)
+
+    assert " ".join(lines).replace(" ", "") == text.replace(" ", "")
+    assert all(render.text_width(line, "F1", 10.5) <= 300 for line in lines)
+
+
+def test_non_latin_text_survives(fonts):
+    pypdf = pytest.importorskip("pypdf")
+    text = "## Опыт работы\n\n- Zoë Ångström, Ελληνικά — €1M ≥ 99.9%\n"
+
+    data = render_pdf("Zoë’s résumé", text)
+
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    extracted = reader.pages[0].extract_text()
+    assert reader.metadata.title == "Zoë’s résumé"
+    for line in ("Zoë’s résumé", "Опыт работы", "Zoë Ångström, Ελληνικά — €1M ≥ 99.9%"):
+        assert line in extracted
+    assert render_pdf("Zoë’s résumé", text) == data
+
+
+def test_subsets_keep_only_the_used_glyphs(fonts):
+    font = fonts["F1"]
+    # é is a composite of e and the acute accent
+    accented = font.glyph("é")
+    unused = font.glyph("Ж")
+
+    subset = font.subset([accented])
+
+    assert checksum(subset) == 0xB1B0AFBA
+    tables = read_tables(subset)
+    assert "cmap" not in tables and "name" not in tables
+    loca = struct.unpack(f">{font.glyph_count + 1}I", tables["loca"])
+
+    def outline(glyph):
+        return tables["glyf"][loca[glyph]:loca[glyph + 1]].rstrip(b"\0")
+
+    original = font.tables["glyf"]
+    for glyph in [accented, *composite_components(original[font.loca[accented]:font.loca[accented + 1]])]:
+        assert outline(glyph) == original[font.loca[glyph]:font.loca[glyph + 1]].rstrip(b"\0")
+    assert outline(unused) == b""
+
+
+@pytest.fixture
+def missing_fonts(monkeypatch, tmp_path):
+    monkeypatch.setenv("RENDER_FONT_DIR", str(tmp_path))
+    monkeypatch.setattr(render, "FONT_DIRS", ())
+    render.pdf_fonts.cache_clear()
+    yield
+    render.pdf_fonts.cache_clear()
+
+
+def test_missing_fonts_fail_the_render(missing_fonts):
+    with pytest.raises(FileNotFoundError, match="DejaVuSans.ttf"):
+        render_pdf("Title", "Text")
+
+
+@pytest.mark.anyio
+async def test_workers_do_not_start_without_fonts(missing_fonts, server, monkeypatch):
+    monkeypatch.setattr(server, "order_workers", [])
+    monkeypatch.setattr(server, "settings", dataclasses.replace(server.settings, render_formats=("pdf",)))
+    with pytest.raises(FileNotFoundError, match="DejaVuSans.ttf"):
+        server.build_order_worker(concurrency=1)
+
+    # Without PDFs the fonts are not needed
+    monkeypatch.setattr(server, "settings", dataclasses.replace(server.settings, render_formats=("docx",)))
+    assert server.build_order_worker(concurrency=1)
+
+
+@pytest.mark.anyio
+async def test_missing_fonts_fail_the_order_job(server, monkeypatch):
+    async def render(documents):
+        raise FileNotFoundError("PDF font DejaVuSans.ttf not found")
+
+    monkeypatch.setattr(server.services.artifact_renderer, "render", render)
+    order = server.Order(
+        customer_id="c1", service_type=server.ServiceType.RESUME, requirements={"name": "Ada"}, price=1
+    )
+
+    with pytest.raises(FileNotFoundError):
+        await server.render_deliverables(order, {"resume": "# Ada"})
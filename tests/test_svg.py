@@ -0,0 +1,87 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from svg import MAX_DEPTH, MAX_ELEMENTS, MAX_SVG_BYTES, InvalidSVG, extract_svg, sanitize_svg
+
+CIRCLE = '<circle cx="256" cy="256" r="100" fill="#1e3a8a"/>'
+
+
+def svg(body, attributes='viewBox="0 0 512 512"'):
+    return f'<svg xmlns="http://www.w3.org/2000/svg" {attributes}>{body}</svg>'
+
+
+def parse(markup):
+    return ET.fromstring(markup)
+
+
+def test_extract_svg_finds_the_first_block():
+    text = f"Here it is:\n```svg\n{svg(CIRCLE)}\n```\nand another {svg(CIRCLE)}"
+
+    assert extract_svg(text) == svg(CIRCLE)
+    assert extract_svg("no markup") is None
+
+
+def test_clean_markup_survives():
+    body = (
+        '<defs><linearGradient id="g" x2="1"><stop offset="0" stop-color="#fff"/>'
+        '<stop offset="1" stop-color="#000"/></linearGradient></defs>'
+        '<g transform="translate(10 10)"><rect width="100" height="50" rx="8" fill="url(#g)"/>'
+        '<path d="M0 0 L10 10 Z" stroke="#f59e0b" stroke-width="4" fill="none"/></g>'
+    )
+
+    root = parse(sanitize_svg(svg(body)))
+
+    assert root.get("viewBox") == "0 0 512 512"
+    assert [child.tag.rsplit("}", 1)[-1] for child in root.iter()] == [
+        "svg", "defs", "linearGradient", "stop", "stop", "g", "rect", "path",
+    ]
+    assert root.find(".//{*}rect").get("fill") == "url(#g)"
+
+
+def test_dangerous_markup_is_dropped():
+    body = (
+        '<script>alert(1)</script>'
+        '<circle cx="1" cy="1" r="1" onclick="alert(1)" fill="url(https://evil.test/x#y)" stroke="javascript:x"/>'
+        '<image href="https://evil.test/x.png"/><text>Hi</text><foreignObject><div/></foreignObject>'
+        '<rect width="1" height="1" style="fill: #f00; behavior: url(x.htc)"/>'
+    )
+
+    cleaned = sanitize_svg(svg(body))
+
+    for fragment in ("script", "onclick", "evil", "javascript", "image", "text", "foreignObject", "behavior"):
+        assert fragment not in cleaned
+    assert parse(cleaned).find(".//{*}rect").get("fill") == "#f00"
+
+
+def test_width_and_height_stand_in_for_a_missing_view_box():
+    assert parse(sanitize_svg(svg(CIRCLE, 'width="64px" height="32"'))).get("viewBox") == "0 0 64 32"
+
+
+@pytest.mark.parametrize("markup, message", [
+    (svg("<g/>"), "no shapes"),
+    (svg(CIRCLE, ""), "viewBox"),
+    (svg(CIRCLE, 'viewBox="0 0 0 10"'), "positive"),
+    ("<html><body/></html>", "root element"),
+    (svg("<circle"), "not well-formed"),
+    ('<!DOCTYPE svg [<!ENTITY x "y">]>' + svg(CIRCLE), "entity"),
+    (svg(CIRCLE * (MAX_ELEMENTS + 1)), f"more than {MAX_ELEMENTS} elements"),
+    (svg(" " * MAX_SVG_BYTES + CIRCLE), "larger than"),
+])
+def test_unusable_markup_is_rejected(markup, message):
+    with pytest.raises(InvalidSVG, match=message):
+        sanitize_svg(markup)
+
+
+def test_nesting_is_capped():
+    # The <svg> element and the circle are two of the levels
+    allowed = svg("<g>" * (MAX_DEPTH - 2) + CIRCLE + "</g>" * (MAX_DEPTH - 2))
+    too_deep = svg("<g>" * (MAX_DEPTH - 1) + CIRCLE + "</g>" * (MAX_DEPTH - 1))
+    # As deep as the default recursion limit, yet within MAX_ELEMENTS
+    hostile = svg("<g>" * (MAX_ELEMENTS - 1) + "</g>" * (MAX_ELEMENTS - 1))
+
+    assert sanitize_svg(allowed)
+    with pytest.raises(InvalidSVG, match="nested"):
+        sanitize_svg(too_deep)
+    with pytest.raises(InvalidSVG, match="nested"):
+        sanitize_svg(hostile)